@@ -17,6 +17,9 @@ DATATAG_ENTRY_POINTS = "entry_points"
 DATATAG_CALL_TREES = "call_trees"
 DATATAG_NODE_SUMMARY = "node_summary_table"
 DATATAG_LINENUMBER_TABLE = "linenumber_table"
+DATATAG_PARSE_CACHE_RUN_ID = "parse_cache_run_id"
+DATATAG_INVERTED_INDEX = "inverted_index"
+DATATAG_TERM_TRIGRAMS = "term_trigrams"
 
 
 def init_ansi_color():
@@ -5,6 +5,8 @@ VERSION = "0.6.0"
 default_calltree_path = 'agoat.calltree'
 default_linenumbertable_path = 'agoat.linenumbertable'
 default_summary_path = 'agoat.summarytable'
+default_parsecache_path = 'agoat.parsecache'
+default_server_socket_path = 'agoat.socket'
 default_javap_dir_path = 'javapOutput'
 default_soot_dir_path = 'sootOutput'
 default_max_depth_of_subtree = 5
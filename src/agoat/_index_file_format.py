@@ -0,0 +1,756 @@
+# coding: utf-8
+
+"""
+Binary format of index files (call trees, node summary table and line-number table).
+
+A file is a header followed by sections:
+  header: MAGIC, format version (uint16) and number of sections (uint16)
+  section: tag length (uint8), tag, flags (uint8), data length (uint32), data
+      where data is zlib-compressed when flags has FLAG_ZLIB.
+Integers are little endian.
+
+Section "sigs" is a string table of method signatures (ClzMethodSig), and
+section "strs" is a string table of the other strings (literals, location info, etc.).
+A string table is: string count, offsets (count + 1 entries, int32), concatenated strings.
+The other sections are arrays of int32, which refer to the strings by index
+(-1 stands for None). Each of them is stored under the data tag of the index data:
+
+  entry_points: sig, ...
+  call_trees: node count, node records..., root count, root node index, ...
+      where a node record is one of
+      K_ORDERED_AND or K_ORDERED_OR, sub-node count, sub-node index, ...
+      K_CALL_NODE, invoked node index, recursive_cxt sig, body node index
+      K_INVOKED, cmd str, callee sig, literal count, literal str, ..., locinfo str
+      and nodes are stored in post order, so that a node refers only to the preceding
+      nodes. A node shared by two or more parents is stored once.
+  node_summary_table: entry count, (callee sig, recursive_cxt sig, record position), ...,
+      records, where a record is: own callee count, callee sig, ..., own literal count, literal str, ...,
+      sub-summary count, record position, ... (see Summary).
+      The entries are sorted by label (callee, recursive_cxt) and a record position
+      is an index of the int32 array, so that a summary is found by binary search
+      and decoded without reading the others than its sub-summaries (see NodeSummaryTableView).
+      A record refers only to the preceding records. A summary shared by two or more
+      labels or summaries is stored once.
+  inverted_index: label count, (callee sig, recursive_cxt sig), ...,
+      callee count, (callee sig, posting position, posting length), ...,
+      literal count, (literal str, posting position, posting length), ...,
+      postings, where a posting is a sorted array of label indices.
+      A posting is decoded on its first access (see InvertedIndexView).
+  term_trigrams: callee trigram count, (trigram, posting position, posting length), ...,
+      literal trigram count, (trigram, posting position, posting length), ...,
+      postings, where a posting is a sorted array of callee sigs or literal strs.
+      A trigram (3 bytes) is stored as an int32 of value (b0 << 16 | b1 << 8 | b2).
+  linenumber_table: entry count, (sig, pair count, jimp line, source line, ...), ...
+  parse_cache_run_id: str
+
+Index files of older versions (gzip'ed pickles) are still read by load_index_data.
+"""
+
+import array
+import mmap
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import zlib
+
+from . import jimp_parser as jp
+from . import calltree as ct
+from .calltree_summary import Summary, InvertedIndex, TermTrigramIndex
+from ._utilities import open_gziped_file_when_available, replace_file
+from ._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_CALL_TREES, DATATAG_NODE_SUMMARY, \
+    DATATAG_LINENUMBER_TABLE, DATATAG_PARSE_CACHE_RUN_ID, DATATAG_INVERTED_INDEX, DATATAG_TERM_TRIGRAMS
+
+MAGIC = "AGOATIDX"
+FORMAT_VERSION = 3
+
+FLAG_ZLIB = 0x01
+
+K_ORDERED_AND = 0
+K_ORDERED_OR = 1
+K_CALL_NODE = 2
+K_INVOKED = 3
+
+_SECTION_SIGS = "sigs"
+_SECTION_STRS = "strs"
+
+_GZIP_MAGIC = "\x1f\x8b"
+
+
+class InvalidIndexFile(ValueError):
+    pass
+
+
+def _int_array(values=()):
+    a = array.array('i', values)
+    assert a.itemsize == 4
+    return a
+
+
+def _array_to_bytes(a):
+    if sys.byteorder != 'little':
+        a = array.array(a.typecode, a)
+        a.byteswap()
+    return a.tostring()
+
+
+def _bytes_to_list(b):
+    a = _int_array()
+    a.fromstring(b)
+    if sys.byteorder != 'little':
+        a.byteswap()
+    return a.tolist()
+
+
+def _unpack_ints(buf, pos, count):
+    return struct.unpack_from('<%di' % count, buf, pos)
+
+
+class _Section(object):
+    """
+    A region [base, end) of a buffer (a str or a mmap object) holding the data of a section.
+    """
+
+    __slots__ = ('buf', 'base', 'end')
+
+    def __init__(self, buf, base, end):
+        self.buf = buf
+        self.base = base
+        self.end = end
+
+    def to_list(self):
+        return _bytes_to_list(self.buf[self.base:self.end])
+
+    def int_at(self, i):
+        return struct.unpack_from('<i', self.buf, self.base + 4 * i)[0]
+
+    def ints_at(self, i, count):
+        return _unpack_ints(self.buf, self.base + 4 * i, count)
+
+
+class _StringTable(object):
+    def __init__(self):
+        self.str_to_id = {}
+        self.strs = []
+
+    def id_of(self, s):
+        if s is None:
+            return -1
+        i = self.str_to_id.get(s)
+        if i is None:
+            if not isinstance(s, str):
+                raise TypeError("string expected: %s" % repr(s))
+            i = self.str_to_id[s] = len(self.strs)
+            self.strs.append(s)
+        return i
+
+    def to_bytes(self):
+        offsets = _int_array([0])
+        o = 0
+        for s in self.strs:
+            o += len(s)
+            offsets.append(o)
+        return struct.pack('<I', len(self.strs)) + _array_to_bytes(offsets) + ''.join(self.strs)
+
+
+def _decode_string_table(sec):
+    count = sec.int_at(0)
+    p = sec.base + 4 + 4 * (count + 1)
+    b = sec.buf[p:sec.end]
+    offsets = _bytes_to_list(sec.buf[sec.base + 4:p])
+    return [b[offsets[i]:offsets[i + 1]] for i in xrange(count)]
+
+
+class _StringTableView(object):
+    """
+    A string table, whose strings are extracted on each access.
+    With conv, each string is converted on its first access and the converted
+    one is kept, e.g. to share a ClzMethodSig among the accesses.
+    """
+
+    def __init__(self, sec, conv=None):
+        self.sec = sec
+        self.count = sec.int_at(0)
+        self.data_base = sec.base + 4 + 4 * (self.count + 1)
+        self.conv = conv
+        self._converted = {}  # int -> converted string
+
+    def raw(self, i):
+        if not 0 <= i < self.count:
+            raise IndexError("string table index out of range: %d" % i)
+        o, o_next = self.sec.ints_at(1 + i, 2)
+        return self.sec.buf[self.data_base + o:self.data_base + o_next]
+
+    def __getitem__(self, i):
+        if self.conv is None:
+            return self.raw(i)
+        c = self._converted.get(i)
+        if c is None:
+            c = self._converted[i] = self.conv(self.raw(i))
+        return c
+
+
+def _encode_call_trees(call_trees, sigs, strs):
+    buf = _int_array([0])  # buf[0] is node count
+    node_index = {}  # id(node) -> int
+
+    def index_of(node):
+        return node_index[id(node)] if node is not None else -1
+
+    for call_tree in call_trees:
+        stack = [(call_tree, False)]
+        while stack:
+            node, subs_stored = stack.pop()
+            if id(node) in node_index:
+                continue  # while stack
+            if isinstance(node, ct.Invoked):
+                buf.extend((K_INVOKED, strs.id_of(node.cmd), sigs.id_of(node.callee), len(node.literals)))
+                buf.extend(strs.id_of(lit) for lit in node.literals)
+                buf.append(strs.id_of(node.locinfo))
+            elif not subs_stored:
+                stack.append((node, True))
+                if isinstance(node, list):
+                    assert node[0] in (ct.ORDERED_AND, ct.ORDERED_OR)
+                    subs = node[1:]
+                    assert None not in subs
+                elif isinstance(node, ct.CallNode):
+                    subs = [node.invoked] if node.body is None else [node.invoked, node.body]
+                else:
+                    raise TypeError("unexpected node in call tree: %s" % repr(node))
+                for subn in reversed(subs):
+                    if id(subn) not in node_index:
+                        stack.append((subn, False))
+                continue  # while stack
+            elif isinstance(node, list):
+                buf.extend((K_ORDERED_AND if node[0] == ct.ORDERED_AND else K_ORDERED_OR, len(node) - 1))
+                buf.extend(node_index[id(subn)] for subn in node[1:])
+            else:
+                buf.extend((K_CALL_NODE, index_of(node.invoked), sigs.id_of(node.recursive_cxt), index_of(node.body)))
+            node_index[id(node)] = len(node_index)
+    buf[0] = len(node_index)
+    buf.append(len(call_trees))
+    buf.extend(index_of(call_tree) for call_tree in call_trees)
+    return buf
+
+
+def _decode_call_trees(a, sigs, strs):
+    Invoked, CallNode = ct.Invoked, ct.CallNode
+    ORDERED_AND, ORDERED_OR = ct.ORDERED_AND, ct.ORDERED_OR
+    nodes = []
+    p = 1
+    for _ in xrange(a[0]):
+        k = a[p]
+        if k == K_INVOKED:
+            n = a[p + 3]
+            q = p + 4 + n
+            locinfo = a[q]
+            nodes.append(Invoked(strs[a[p + 1]], sigs[a[p + 2]], tuple([strs[i] for i in a[p + 4:q]]),
+                    strs[locinfo] if locinfo >= 0 else None))
+            p = q + 1
+        elif k == K_CALL_NODE:
+            rc, body = a[p + 2], a[p + 3]
+            nodes.append(CallNode(nodes[a[p + 1]], sigs[rc] if rc >= 0 else None, nodes[body] if body >= 0 else None))
+            p += 4
+        else:
+            q = p + 2 + a[p + 1]
+            n = [ORDERED_AND if k == K_ORDERED_AND else ORDERED_OR]
+            n.extend([nodes[i] for i in a[p + 2:q]])
+            nodes.append(n)
+            p = q
+    return [nodes[i] for i in a[p + 1:p + 1 + a[p]]]
+
+
+def _encode_node_summary_table(node_summary_table, sigs, strs):
+    labels = sorted(node_summary_table.iterkeys())
+    entries = _int_array([len(labels)])
+    records = _int_array()
+    record_base = 1 + 3 * len(labels)
+    record_pos_of = {}  # id of Summary -> position, for shared summaries to be written once
+
+    def write_record(sumry):
+        # sub-summaries are written before the summary, with an explicit work list
+        # in order not to hit the recursion limit
+        work = [(sumry, False)]
+        while work:
+            s, subs_written = work.pop()
+            if id(s) in record_pos_of:
+                continue  # while work
+            if not subs_written:
+                work.append((s, True))
+                work.extend((ss, False) for ss in s.sub_summaries if id(ss) not in record_pos_of)
+                continue  # while work
+            record_pos_of[id(s)] = record_base + len(records)
+            records.append(len(s.own_callees))
+            records.extend(sigs.id_of(c) for c in s.own_callees)
+            records.append(len(s.own_literals))
+            records.extend(strs.id_of(lit) for lit in s.own_literals)
+            records.append(len(s.sub_summaries))
+            records.extend(record_pos_of[id(ss)] for ss in s.sub_summaries)
+        return record_pos_of[id(sumry)]
+
+    for callee, rc in labels:
+        pos = write_record(node_summary_table[callee, rc])
+        entries.extend((sigs.id_of(callee), sigs.id_of(rc), pos))
+    entries.extend(records)
+    return entries
+
+
+def _decode_summary_record(ints_at, p, summary_at, sigs, strs):
+    # decode the record at position p, and its sub-summaries unless in summary_at (position -> Summary)
+    work = [p]
+    while work:
+        p = work[-1]
+        if p in summary_at:
+            work.pop()
+            continue  # while work
+        n = ints_at(p, 1)[0]
+        q = p + 1 + n
+        m = ints_at(q, 1)[0]
+        r = q + 1 + m
+        sub_positions = ints_at(r + 1, ints_at(r, 1)[0])
+        undecoded = [sp for sp in sub_positions if sp not in summary_at]
+        if undecoded:
+            work.extend(undecoded)
+            continue  # while work
+        sumry = Summary.__new__(Summary)  # the callees and literals are already sorted
+        sumry.own_callees = [sigs[i] for i in ints_at(p + 1, n)]
+        sumry.own_literals = [strs[i] for i in ints_at(q + 1, m)]
+        sumry.sub_summaries = tuple(summary_at[sp] for sp in sub_positions)
+        sumry._callees = sumry._literals = None
+        summary_at[p] = sumry
+        work.pop()
+    return summary_at[p]
+
+
+def _decode_node_summary_table(a, sigs, strs):
+    def ints_at(p, n):
+        return a[p:p + n]
+
+    node_summary_table = {}
+    summary_at = {}  # record position -> Summary
+    for i in xrange(a[0]):
+        callee, rc, p = a[1 + 3 * i:4 + 3 * i]
+        sumry = _decode_summary_record(ints_at, p, summary_at, sigs, strs)
+        node_summary_table[sigs[callee], sigs[rc] if rc >= 0 else None] = sumry
+    return node_summary_table
+
+
+class NodeSummaryTableView(object):
+    """
+    A read-only, dict-like view of a node summary table in an index file,
+    which decodes a summary on its first access.
+    Labels are looked up by binary search over the sorted entries.
+    """
+
+    def __init__(self, sec, sigs, strs):
+        self._sec = sec
+        self._sigs = sigs
+        self._strs = strs
+        self._count = sec.int_at(0)
+        self._decoded = {}  # entry index -> Summary
+        self._summary_at = {}  # record position -> Summary, including sub-summaries
+
+    def _label_at(self, i):
+        callee, rc = self._sec.ints_at(1 + 3 * i, 2)
+        return self._sigs[callee], self._sigs[rc] if rc >= 0 else None
+
+    def _raw_label_at(self, i):
+        callee, rc = self._sec.ints_at(1 + 3 * i, 2)
+        return self._sigs.raw(callee), self._sigs.raw(rc) if rc >= 0 else None
+
+    def _index_of(self, label):
+        callee, rc = label
+        label = str(callee), str(rc) if rc is not None else None
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._raw_label_at(mid) < label:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and self._raw_label_at(lo) == label:
+            return lo
+        return -1
+
+    def _summary_of_entry(self, i):
+        sumry = self._decoded.get(i)
+        if sumry is None:
+            sec = self._sec
+            sumry = self._decoded[i] = _decode_summary_record(sec.ints_at, sec.int_at(3 + 3 * i),
+                    self._summary_at, self._sigs, self._strs)
+        return sumry
+
+    def decoded_count(self):
+        return len(self._decoded)
+
+    def get(self, label, default=None):
+        i = self._index_of(label)
+        return self._summary_of_entry(i) if i >= 0 else default
+
+    def __getitem__(self, label):
+        i = self._index_of(label)
+        if i < 0:
+            raise KeyError(label)
+        return self._summary_of_entry(i)
+
+    def __contains__(self, label):
+        return self._index_of(label) >= 0
+
+    def __len__(self):
+        return self._count
+
+    def iterkeys(self):
+        for i in xrange(self._count):
+            yield self._label_at(i)
+
+    __iter__ = iterkeys
+
+    def keys(self):
+        return list(self.iterkeys())
+
+    def itervalues(self):
+        for i in xrange(self._count):
+            yield self._summary_of_entry(i)
+
+    def iteritems(self):
+        for i in xrange(self._count):
+            yield self._label_at(i), self._summary_of_entry(i)
+
+
+def _encode_postings_tables(buf, postings_tables):
+    # postings_tables: list of (dict: key -> list of values, key to int, value to int)
+    postings = _int_array()
+    postings_base = len(buf) + sum(1 + 3 * len(key_to_values) for key_to_values, _, _ in postings_tables)
+    for key_to_values, key_id_of, value_id_of in postings_tables:
+        buf.append(len(key_to_values))
+        for key in sorted(key_to_values.iterkeys()):
+            values = key_to_values[key]
+            buf.extend((key_id_of(key), postings_base + len(postings), len(values)))
+            if value_id_of is not None:
+                postings.extend(value_id_of(v) for v in values)
+            else:
+                postings.extend(values)
+    buf.extend(postings)
+    return buf
+
+
+def _decode_postings_tables(a, p, key_value_tables):
+    postings_tables = []
+    for key_table, value_table in key_value_tables:
+        key_to_values = {}
+        for _ in xrange(a[p]):
+            k, q, n = a[p + 1:p + 4]
+            vs = a[q:q + n]
+            key_to_values[key_table[k]] = [value_table[v] for v in vs] if value_table is not None else vs
+            p += 3
+        p += 1
+        postings_tables.append(key_to_values)
+    return postings_tables
+
+
+def _encode_inverted_index(inverted_index, sigs, strs):
+    buf = _int_array([len(inverted_index.labels)])
+    for callee, rc in inverted_index.labels:
+        buf.extend((sigs.id_of(callee), sigs.id_of(rc)))
+    return _encode_postings_tables(buf, [
+            (inverted_index.callee_postings, sigs.id_of, None),
+            (inverted_index.literal_postings, strs.id_of, None)])
+
+
+def _decode_inverted_index(a, sigs, strs):
+    label_count = a[0]
+    labels = [(sigs[a[p]], sigs[a[p + 1]] if a[p + 1] >= 0 else None) for p in xrange(1, 1 + 2 * label_count, 2)]
+    callee_postings, literal_postings = _decode_postings_tables(a, 1 + 2 * label_count, [(sigs, None), (strs, None)])
+    return InvertedIndex(labels, callee_postings, literal_postings)
+
+
+def _trigram_to_int(tg):
+    return ord(tg[0]) << 16 | ord(tg[1]) << 8 | ord(tg[2])
+
+
+class _TrigramsOfInt(object):
+    # int -> trigram, in the interface of a string table
+    def __getitem__(self, i):
+        return chr(i >> 16 & 0xff) + chr(i >> 8 & 0xff) + chr(i & 0xff)
+
+
+_trigrams_of_int = _TrigramsOfInt()
+
+
+def _encode_term_trigrams(term_trigram_index, sigs, strs):
+    return _encode_postings_tables(_int_array(), [
+            (term_trigram_index.callee_trigrams, _trigram_to_int, sigs.id_of),
+            (term_trigram_index.literal_trigrams, _trigram_to_int, strs.id_of)])
+
+
+def _decode_term_trigrams(a, sigs, strs):
+    callee_trigrams, literal_trigrams = _decode_postings_tables(a, 0, [(_trigrams_of_int, sigs), (_trigrams_of_int, strs)])
+    return TermTrigramIndex(callee_trigrams, literal_trigrams)
+
+
+class _LabelsView(object):
+    def __init__(self, sec, sigs):
+        self._sec = sec
+        self._sigs = sigs
+        self._count = sec.int_at(0)
+
+    def __getitem__(self, i):
+        if not 0 <= i < self._count:
+            raise IndexError("label index out of range: %d" % i)
+        callee, rc = self._sec.ints_at(1 + 2 * i, 2)
+        return self._sigs[callee], self._sigs[rc] if rc >= 0 else None
+
+    def __len__(self):
+        return self._count
+
+
+class _PostingsView(object):
+    # a dict-like view from keys to postings, which decodes a posting on each access
+    def __init__(self, sec, p, key_table, value_table=None):
+        self._sec = sec
+        self._value_table = value_table
+        count = sec.int_at(p)
+        a = sec.ints_at(p + 1, 3 * count)
+        self._key_to_pos = dict((key_table[a[i]], (a[i + 1], a[i + 2])) for i in xrange(0, 3 * count, 3))
+        self.end = p + 1 + 3 * count
+
+    def __getitem__(self, key):
+        q, n = self._key_to_pos[key]
+        vs = self._sec.ints_at(q, n)
+        if self._value_table is not None:
+            return [self._value_table[v] for v in vs]
+        return list(vs)
+
+    def get(self, key, default=None):
+        return self[key] if key in self._key_to_pos else default
+
+    def __contains__(self, key):
+        return key in self._key_to_pos
+
+    def __len__(self):
+        return len(self._key_to_pos)
+
+    def iterkeys(self):
+        return self._key_to_pos.iterkeys()
+
+    __iter__ = iterkeys
+
+    def keys(self):
+        return self._key_to_pos.keys()
+
+    def iteritems(self):
+        for key in self._key_to_pos:
+            yield key, self[key]
+
+
+class InvertedIndexView(object):
+    """
+    A read-only view of an inverted index in an index file, which has the same
+    attributes as calltree_summary.InvertedIndex. The terms (callees and literals)
+    are decoded at the creation, and the labels and postings on each access.
+    """
+
+    def __init__(self, sec, sigs, strs):
+        self.labels = _LabelsView(sec, sigs)
+        self.callee_postings = _PostingsView(sec, 1 + 2 * len(self.labels), sigs)
+        self.literal_postings = _PostingsView(sec, self.callee_postings.end, strs)
+
+
+class TermTrigramIndexView(object):
+    """
+    A read-only view of a term trigram index in an index file, which has the same
+    attributes as calltree_summary.TermTrigramIndex. The trigrams are decoded
+    at the creation, and the postings (lists of terms) on each access.
+    """
+
+    def __init__(self, sec, sigs, strs):
+        self.callee_trigrams = _PostingsView(sec, 0, _trigrams_of_int, sigs)
+        self.literal_trigrams = _PostingsView(sec, self.callee_trigrams.end, _trigrams_of_int, strs)
+
+
+def _encode_linenumber_table(clz_msig2conversion, sigs):
+    buf = _int_array([len(clz_msig2conversion)])
+    for clzmsig, conversion in sorted(clz_msig2conversion.iteritems()):
+        buf.extend((sigs.id_of(clzmsig), len(conversion)))
+        for jimp_linenum, src_linenum in sorted(conversion.iteritems()):
+            buf.extend((jimp_linenum, src_linenum))
+    return buf
+
+
+def _decode_linenumber_table(a, sigs):
+    clz_msig2conversion = {}
+    p = 1
+    for _ in xrange(a[0]):
+        q = p + 2 + 2 * a[p + 1]
+        clz_msig2conversion[sigs[a[p]]] = dict(zip(a[p + 2:q:2], a[p + 3:q:2]))
+        p = q
+    return clz_msig2conversion
+
+
+def dumps_index_data(data, compress=True):
+    """
+    Encode index data. With compress=False, sections are stored as is,
+    so that a reader can access them in a mmap'ed file (see load_index_data).
+    """
+
+    sigs = _StringTable()
+    strs = _StringTable()
+    sections = []
+    for tag, value in sorted(data.iteritems()):
+        if tag == DATATAG_ENTRY_POINTS:
+            a = _int_array(sigs.id_of(e) for e in value)
+        elif tag == DATATAG_CALL_TREES:
+            a = _encode_call_trees(value, sigs, strs)
+        elif tag == DATATAG_NODE_SUMMARY:
+            a = _encode_node_summary_table(value, sigs, strs)
+        elif tag == DATATAG_INVERTED_INDEX:
+            a = _encode_inverted_index(value, sigs, strs)
+        elif tag == DATATAG_TERM_TRIGRAMS:
+            a = _encode_term_trigrams(value, sigs, strs)
+        elif tag == DATATAG_LINENUMBER_TABLE:
+            a = _encode_linenumber_table(value, sigs)
+        elif tag == DATATAG_PARSE_CACHE_RUN_ID:
+            a = _int_array([strs.id_of(value)])
+        else:
+            raise ValueError("unknown data tag: %s" % tag)
+        sections.append((tag, _array_to_bytes(a)))
+    sections[:0] = [(_SECTION_SIGS, sigs.to_bytes()), (_SECTION_STRS, strs.to_bytes())]
+
+    flags = FLAG_ZLIB if compress else 0
+    chunks = [MAGIC, struct.pack('<HH', FORMAT_VERSION, len(sections))]
+    for tag, b in sections:
+        if compress:
+            b = zlib.compress(b)
+        chunks.append(struct.pack('<B', len(tag)) + tag + struct.pack('<BI', flags, len(b)))
+        chunks.append(b)
+    return ''.join(chunks)
+
+
+def _read_sections(b):
+    if b[:len(MAGIC)] != MAGIC:
+        raise InvalidIndexFile("not an index file")
+    p = len(MAGIC)
+    version, section_count = struct.unpack_from('<HH', b, p)
+    if version != FORMAT_VERSION:
+        raise InvalidIndexFile("unsupported index file format version: %d (re-generate the index)" % version)
+    p += 4
+    sections = {}
+    for _ in xrange(section_count):
+        tag_len = struct.unpack_from('<B', b, p)[0]
+        tag = b[p + 1:p + 1 + tag_len]
+        p += 1 + tag_len
+        flags, data_len = struct.unpack_from('<BI', b, p)
+        p += 5
+        if flags & FLAG_ZLIB:
+            d = zlib.decompress(b[p:p + data_len])
+            sections[tag] = _Section(d, 0, len(d))
+        else:
+            sections[tag] = _Section(b, p, p + data_len)
+        p += data_len
+    return sections
+
+
+def _decode_sections(sections, lazy=False):
+    if lazy:
+        sigs = _StringTableView(sections.pop(_SECTION_SIGS), jp.clzmsig_from_str)
+        strs = _StringTableView(sections.pop(_SECTION_STRS))
+    else:
+        sigs = [jp.clzmsig_from_str(s) for s in _decode_string_table(sections.pop(_SECTION_SIGS))]
+        strs = _decode_string_table(sections.pop(_SECTION_STRS))
+    data = {}
+    for tag, sec in sections.iteritems():
+        if tag == DATATAG_NODE_SUMMARY and lazy:
+            data[tag] = NodeSummaryTableView(sec, sigs, strs)
+            continue  # for tag
+        if tag == DATATAG_INVERTED_INDEX and lazy:
+            data[tag] = InvertedIndexView(sec, sigs, strs)
+            continue  # for tag
+        if tag == DATATAG_TERM_TRIGRAMS and lazy:
+            data[tag] = TermTrigramIndexView(sec, sigs, strs)
+            continue  # for tag
+        a = sec.to_list()
+        if tag == DATATAG_ENTRY_POINTS:
+            data[tag] = [sigs[i] for i in a]
+        elif tag == DATATAG_CALL_TREES:
+            data[tag] = _decode_call_trees(a, sigs, strs)
+        elif tag == DATATAG_NODE_SUMMARY:
+            data[tag] = _decode_node_summary_table(a, sigs, strs)
+        elif tag == DATATAG_INVERTED_INDEX:
+            data[tag] = _decode_inverted_index(a, sigs, strs)
+        elif tag == DATATAG_TERM_TRIGRAMS:
+            data[tag] = _decode_term_trigrams(a, sigs, strs)
+        elif tag == DATATAG_LINENUMBER_TABLE:
+            data[tag] = _decode_linenumber_table(a, sigs)
+        elif tag == DATATAG_PARSE_CACHE_RUN_ID:
+            data[tag] = strs[a[0]]
+        else:
+            raise InvalidIndexFile("unknown section: %s" % tag)
+    return data
+
+
+def loads_index_data(b):
+    with jp.clzmsig_interning():
+        return _decode_sections(_read_sections(b))
+
+
+def save_index_data(filename, data, compress=True):
+    """
+    Write an index file. The data is written to a temporary file in the same directory,
+    which is renamed to filename, so that a reader which has mmap'ed the previous file
+    (load_index_data(lazy=True)) keeps reading the previous data.
+    On windows, the previous file is removed before the rename, which fails while
+    the file is mmap'ed.
+    The temporary file is removed when the writing fails.
+    """
+
+    b = dumps_index_data(data, compress=compress)
+    fd, temp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)),
+            prefix=os.path.basename(filename) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            out.write(b)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_file, 0o666 & ~umask)  # same permission as a file created by open()
+        replace_file(temp_file, filename)
+    except:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+def load_index_data(filename, lazy=False):
+    """
+    Read an index file. When the file is not found, reads its gzip'ed version
+    (filename + ".gz") of older versions.
+    With lazy=True, the file is mmap'ed and the node summary table, the inverted
+    index and the term trigram index, if any, are returned as a NodeSummaryTableView,
+    an InvertedIndexView and a TermTrigramIndexView.
+    The views read the data directly from the mmap'ed file in case the file was
+    saved with compress=False.
+    The method signatures in the data are interned while loading.
+    """
+
+    with jp.clzmsig_interning():
+        return _load_index_data(filename, lazy)
+
+
+def _load_index_data(filename, lazy):
+    if os.path.exists(filename):
+        with open(filename, "rb") as inp:
+            if lazy:
+                head = inp.read(len(MAGIC))
+                if head == MAGIC:
+                    m = mmap.mmap(inp.fileno(), 0, access=mmap.ACCESS_READ)
+                    return _decode_sections(_read_sections(m), lazy=True)
+                inp.seek(0)
+            b = inp.read()
+        if b.startswith(MAGIC):
+            return loads_index_data(b)
+        if b.startswith(_GZIP_MAGIC):
+            b = zlib.decompress(b, 16 + zlib.MAX_WBITS)
+        return pickle.loads(b)
+    with open_gziped_file_when_available(filename, "rb") as inp:
+        # data = pickle.load(inp)  # very very slow in pypy
+        return pickle.loads(inp.read())
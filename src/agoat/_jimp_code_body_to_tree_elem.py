@@ -19,7 +19,7 @@ from ._jimp_code_box_generator import BOX, BLOCK
 from . import _jimp_code_box_generator
 
 def clzmethodsig_intern(msig):
-    return intern(msig)
+    return jp.clzmsig_from_str(msig)
 
 
 _pat_class = re.compile(r"(\w|[.])+")
@@ -0,0 +1,140 @@
+# coding: utf-8
+
+import binascii
+import hashlib
+import os
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from . import _config as _c
+from . import jimp_parser as jp
+from . import _jimp_code_body_to_tree_elem as jcbte
+
+
+CACHE_TAG = "agoat.parsecache"
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+class ParseCache(object):
+    """
+    On-disk cache of parsed jimp files.
+    An entry is keyed on a jimp file name and is valid while the file has the same
+    content hash (a file having the same size and mtime is regarded as unchanged
+    without re-hashing it).
+    An entry keeps the parsed ClassData and, once converted, the ClassData
+    having and-or trees as method code.
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.soot_dir = None
+        self.prev_run_id = None  # id of the run which saved the loaded cache
+        self.run_id = binascii.hexlify(os.urandom(8))  # id of this run
+        self.entries = {}  # file name -> [(size, mtime), digest, class_name, ClassData, and-or-tree ClassData or None]
+        self.changed_classes = set()  # classes parsed, converted or removed in this run
+        self._class_to_entry = {}  # str -> entry
+
+    def load(self):
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, "rb") as inp:
+                data = pickle.load(inp)
+        except Exception:
+            return  # a broken cache is just ignored
+        if not isinstance(data, dict) or data.get("tag") != CACHE_TAG or data.get("version") != _c.VERSION:
+            return
+        self.soot_dir = data["soot_dir"]
+        self.prev_run_id = data.get("run_id")
+        self.entries = data["entries"]
+
+    def save(self):
+        data = {"tag": CACHE_TAG, "version": _c.VERSION, "soot_dir": self.soot_dir,
+                "run_id": self.run_id, "entries": self.entries}
+        with open(self.cache_file, "wb") as out:
+            pickle.dump(data, out, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def read_class_table(self, soot_dir, jobs=1):
+        """
+        Returns a class table (str -> ClassData) of the jimp files in soot_dir.
+        Only new or modified files are parsed.
+        """
+
+        soot_dir_abs = os.path.abspath(soot_dir)
+        if soot_dir_abs != self.soot_dir:
+            self.entries = {}
+            self.soot_dir = soot_dir_abs
+
+        stale_entries = self.entries
+        self.entries = {}
+        paths_to_parse = []
+        digests = {}
+        for f in sorted(os.listdir(soot_dir)):
+            if not f.endswith(".jimp"):
+                continue
+            p = os.path.join(soot_dir, f)
+            st = os.stat(p)
+            stat_key = (st.st_size, st.st_mtime)
+            e = stale_entries.pop(f, None)
+            if e is not None:
+                if e[0] == stat_key:
+                    self.entries[f] = e
+                    continue
+                d = file_digest(p)
+                if e[1] == d:
+                    e[0] = stat_key
+                    self.entries[f] = e
+                    continue
+                if e[2]:
+                    self.changed_classes.add(e[2])
+            else:
+                d = None
+            digests[f] = stat_key, d
+            paths_to_parse.append(p)
+
+        for e in stale_entries.itervalues():  # removed files
+            if e[2]:
+                self.changed_classes.add(e[2])
+
+        for p, (clz, cd) in zip(paths_to_parse, jp.read_class_table_from_files_iter(paths_to_parse, jobs=jobs)):
+            f = os.path.basename(p)
+            stat_key, d = digests[f]
+            self.entries[f] = [stat_key, d if d is not None else file_digest(p), clz, cd, None]
+            if clz:
+                self.changed_classes.add(clz)
+
+        class_table = {}
+        self._class_to_entry = {}
+        for e in self.entries.itervalues():
+            clz, cd = e[2], e[3]
+            if clz is None:
+                continue
+            class_table[clz] = cd
+            self._class_to_entry[clz] = e
+        return class_table
+
+    def inss_to_tree_in_class_table(self, class_table):
+        """
+        Same as _jimp_code_body_to_tree_elem.inss_to_tree_in_class_table,
+        but reuses and-or trees of the classes which are not modified since the last run.
+        """
+
+        new_tbl = {}  # str -> ClassData
+        for clz, cd in class_table.iteritems():
+            e = self._class_to_entry.get(clz)
+            if e is not None and e[3] is cd and e[4] is not None:
+                new_tbl[clz] = e[4]
+                continue
+            new_cd = jcbte.inss_to_tree_in_class_table({clz: cd})[clz]
+            if e is not None and e[3] is cd:
+                e[4] = new_cd
+            self.changed_classes.add(clz)
+            new_tbl[clz] = new_cd
+        return new_tbl
@@ -0,0 +1,60 @@
+# coding: utf-8
+
+"""
+Protocol between the query server (ags.py serve) and its clients (ags.py query --server).
+
+A request and a response are JSON objects, each of which is written in a line.
+Byte strings (query words, output text) are carried as JSON strings by decoding them as latin-1.
+
+  request: {"query_words": [...], "ignore_case_query_words": [...], "max_depth": int,
+      "output_form": str, "fully_qualified_package_name": bool, "ansi_color": bool,
+      "max_paths": int, "timeout": float or null, "top": int or null}
+  response: {"output": str, "warnings": str, "error": str or null}
+"""
+
+import json
+import socket
+
+
+def encode_bytes(b):
+    return b.decode('latin-1')
+
+
+def decode_bytes(u):
+    return u.encode('latin-1')
+
+
+def write_message(out, obj):
+    out.write(json.dumps(obj) + "\n")
+    out.flush()
+
+
+def read_message(inp):
+    line = inp.readline()
+    if not line:
+        return None
+    return json.loads(line)
+
+
+def connect(socket_path):
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        s.connect(socket_path)
+    except:
+        s.close()
+        raise
+    return s
+
+
+def request_query(socket_path, request):
+    s = connect(socket_path)
+    try:
+        f = s.makefile('r+b')
+        write_message(f, request)
+        response = read_message(f)
+        f.close()
+    finally:
+        s.close()
+    if response is None:
+        raise IOError("no response from query server: %s" % socket_path)
+    return response
@@ -1,6 +1,8 @@
 # coding: utf-8
 
+from bisect import bisect_left
 import gzip
+import os
 import re
 import sys
 
@@ -40,6 +42,40 @@ def sort_uniq(lst, key=None):
     return t
 
 
+def sorted_uniq_union(sorted_uniq_seqs, items=()):
+    """
+    Union of sequences, each of which is sorted and has no duplicates, and other items,
+    as a sorted list without duplicates.
+    The longest sequence is returned as is (when a list), if it includes all the other items.
+    """
+
+    if not sorted_uniq_seqs:
+        return sort_uniq(items)
+    base = max(sorted_uniq_seqs, key=len)
+    len_base = len(base)
+    if (sum(len(seq) for seq in sorted_uniq_seqs) - len_base + len(items)) * 8 > len_base:
+        # many other items, for which merging with set is faster than looking up each of them
+        u = set(items)
+        u.update(*sorted_uniq_seqs)
+        if len(u) == len_base and isinstance(base, list):
+            return base
+        return sorted(u)
+    absent = []
+    for seq in sorted_uniq_seqs + [items]:
+        if seq is base:
+            continue  # for seq
+        for item in seq:
+            i = bisect_left(base, item)
+            if i == len_base or base[i] != item:
+                absent.append(item)
+    if not absent:
+        return base if isinstance(base, list) else list(base)
+    merged = list(base)
+    merged.extend(sort_uniq(absent))
+    merged.sort()  # merges two sorted runs
+    return merged
+
+
 def list_flatten_iter(L):
     if isinstance(L, list):
         for li in L:
@@ -63,3 +99,12 @@ else:
     STDOUT = "/dev/stdout"
     STDIN = "/dev/stdin"
 
+if sys.platform == "win32":
+    def replace_file(src, dst):
+        # os.rename fails on windows when dst exists
+        if os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+else:
+    replace_file = os.rename
+
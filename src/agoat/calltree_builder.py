@@ -3,7 +3,6 @@
 import sys
 import collections
 
-from . import _utilities
 from . import jimp_parser as jp
 from . import _jimp_code_body_to_tree_elem as jcbte
 from . import calltree as ct
@@ -26,17 +25,21 @@ def extract_class_hierarchy(class_table, include_indirect_decendants=True):
                 class_to_descendants[interf][clz] = 1
 
     if include_indirect_decendants:
-        while True:
-            added_dds = []
-            for clz, d_depths in class_to_descendants.iteritems():
-                for d, d_dep in d_depths.iteritems():
-                    for dd, dd_dep in class_to_descendants.get(d, {}).iteritems():
+        # breadth-first search from each class over the direct descendants,
+        # so that each descendant gets the shortest distance
+        direct_descendants = dict((clz, list(ds)) for clz, ds in class_to_descendants.iteritems())
+        for clz, d_depths in class_to_descendants.iteritems():
+            frontier = direct_descendants[clz]
+            dep = 1
+            while frontier:
+                dep += 1
+                next_frontier = []
+                for d in frontier:
+                    for dd in direct_descendants.get(d, ()):
                         if dd not in d_depths:
-                            added_dds.append((clz, dd, d_dep + dd_dep))
-            if not added_dds:
-                break  # while True
-            for clz, dd, dd_dep in added_dds:
-                class_to_descendants[clz][dd] = dd_dep
+                            d_depths[dd] = dep
+                            next_frontier.append(dd)
+                frontier = next_frontier
 
     return class_to_descendants
 
@@ -59,12 +62,18 @@ def make_dispatch_table(class_to_methods, class_to_descendants):
 
     recv_method_to_defs = {}  # recv_method_to_defs  # (clz, mnamc) -> [ClzMethodSig]
 
+    class_to_mnamc_to_clzmsigs = {}  # str -> (str, int) -> [ClzMethodSig]
+    class_to_msig_set = {}  # str -> set of MethodSig
+    for clz, clzmsigs in class_to_methods.iteritems():
+        mnamc_to_clzmsigs = class_to_mnamc_to_clzmsigs[clz] = {}
+        for clzmsig in clzmsigs:
+            mnamc_to_clzmsigs.setdefault(clzmsig_mnamc(clzmsig), []).append(clzmsig)
+        class_to_msig_set[clz] = set(jp.clzmsig_methodsig(clzmsig) for clzmsig in clzmsigs)
+
     # expand towards descendants
     # Overriding methods (child class's methods) are possible to be dispatched
     # in case of parent class's method call.
-    for clz_mtds in class_to_methods.iteritems():
-        clz, clzmsigs = clz_mtds
-        mnamcs = _utilities.sort_uniq([clzmsig_mnamc(clzmsig) for clzmsig in clzmsigs])
+    for clz, mnamc_to_clzmsigs in class_to_mnamc_to_clzmsigs.iteritems():
         assert clz
 
         cands = [clz]  # clz and its all descendant classes
@@ -73,32 +82,27 @@ def make_dispatch_table(class_to_methods, class_to_descendants):
             cands.extend(descends.keys())
 
         for d in cands:
-            for mnamc in mnamcs:
-                for dclzmsig in class_to_methods.get(d, []):
-                    if clzmsig_mnamc(dclzmsig) == mnamc:
-                        recv_method_to_defs.setdefault((clz, mnamc), []).append(dclzmsig)
+            d_mnamc_to_clzmsigs = class_to_mnamc_to_clzmsigs.get(d)
+            if not d_mnamc_to_clzmsigs:
+                continue  # for d
+            for mnamc, dclzmsigs in d_mnamc_to_clzmsigs.iteritems():
+                if mnamc in mnamc_to_clzmsigs:
+                    recv_method_to_defs.setdefault((clz, mnamc), []).extend(dclzmsigs)
 
     # expand towards ascendants
     # When methods are defined in a class but not in its child class,
     # such methods are possible to be dispatched in case of child class's method call
-    depth = 0
-    max_depth = 1
-    while depth < max_depth:
-        depth += 1
-        for clz, d_deps in class_to_descendants.iteritems():
-            for des, d in d_deps.iteritems():
-                if d != depth: 
-                    if d > max_depth:
-                        max_depth = d  # found deeper inheritance
-                    continue  # for des, d
-                clz_clzmsigs = class_to_methods.get(clz, [])
-                if not clz_clzmsigs: continue  # for des, d
-                des_clzmsigs = set(class_to_methods.get(des, []))
-                des_msigs = map(jp.clzmsig_methodsig, des_clzmsigs)
-                for clz_clzmsig in clz_clzmsigs:
-                    clz_msig = jp.clzmsig_methodsig(clz_clzmsig)
-                    if clz_msig not in des_msigs:  # if method defined in clz but not in des
-                        recv_method_to_defs.setdefault((des, clzmsig_mnamc(clz_clzmsig)), []).append(clz_clzmsig)
+    for clz, d_deps in class_to_descendants.iteritems():
+        clz_mnamc_to_clzmsigs = class_to_mnamc_to_clzmsigs.get(clz)
+        if not clz_mnamc_to_clzmsigs:
+            continue  # for clz, d_deps
+        clz_msig_items = [(jp.clzmsig_methodsig(clz_clzmsig), mnamc, clz_clzmsig) \
+                for mnamc, clz_clzmsigs in clz_mnamc_to_clzmsigs.iteritems() for clz_clzmsig in clz_clzmsigs]
+        for des in d_deps:
+            des_msigs = class_to_msig_set.get(des, ())
+            for clz_msig, mnamc, clz_clzmsig in clz_msig_items:
+                if clz_msig not in des_msigs:  # if method defined in clz but not in des
+                    recv_method_to_defs.setdefault((des, mnamc), []).append(clz_clzmsig)
 
     for cms in recv_method_to_defs.itervalues():
         cms.sort()
@@ -125,10 +129,35 @@ def java_is_a(type_a, type_b, class_to_descendants):
     return dis if dis is not None else -1
 
 
-def gen_method_dispatch_resolver(class_table, class_to_descendants, recv_method_to_defs):
+DispatchCacheInfo = collections.namedtuple('DispatchCacheInfo', 'hits misses maxsize currsize')
+
+DISPATCH_CACHE_SIZE = 100000
+
+
+def gen_method_dispatch_resolver(class_table, class_to_descendants, recv_method_to_defs,
+        cache_size=DISPATCH_CACHE_SIZE):
     # class_table  # str -> ClassData
     # recv_method_to_defs  # recv_method_to_defs  # (clz, mnamc) -> [ClzMethodSig]
+    # The returned function memorizes up to cache_size results (all of them are
+    # dropped when the memo gets full), and has an attribute cache_info,
+    # a function which returns the memo's statistics as a DispatchCacheInfo.
+    cache = {}  # (str, ClzMethodSig) -> tuple of MethodData
+    hits_misses = [0, 0]
+
     def resolve_dispatch(invoke_cmd, clzmsig):
+        key = (invoke_cmd, clzmsig)
+        resolved = cache.get(key)
+        if resolved is not None:
+            hits_misses[0] += 1
+            return resolved
+        hits_misses[1] += 1
+        resolved = tuple(resolve_dispatch_i(invoke_cmd, clzmsig))
+        if len(cache) >= cache_size:
+            cache.clear()
+        cache[key] = resolved
+        return resolved
+
+    def resolve_dispatch_i(invoke_cmd, clzmsig):
         static_method = invoke_cmd == jp.SPECIALINVOKE
         resolved = []
         recv = jp.clzmsig_clz(clzmsig)
@@ -169,83 +198,114 @@ def gen_method_dispatch_resolver(class_table, class_to_descendants, recv_method_
                 if md:
                     resolved.append(md)
         return resolved
+
+    def cache_info():
+        return DispatchCacheInfo(hits_misses[0], hits_misses[1], cache_size, len(cache))
+
+    resolve_dispatch.cache_info = cache_info
     return resolve_dispatch
 
 
-def find_methods_involved_in_recursive_call_chain(entry_point, resolve_dispatch,
+def find_methods_involved_in_recursive_call_chains(entry_points, resolve_dispatch,
           include_direct_recursive_calls=False):
+    """
+    Find methods involved in recursive call chains, that is, methods in a strongly
+    connected component of the call graph which are reachable from the entry points.
+    A call graph of all the entry points is explored at once, with Tarjan's algorithm.
+    """
     # entry_points  # list of ClzMethodSig
 
-    methods_searched = set()
-    # set of ClzMethodSig # methods involved in recursive call chain
-    methods_ircc = set()
-
-    e = resolve_dispatch(jp.SPECIALINVOKE, entry_point)
-    if not e:
-        raise ValueError("entry_point not found")
-    md0 = e[0]
-    aot = md0.code if md0 else None
-    if aot is None:
-        raise ValueError("entry_point not found")
-
-    def dig_node(node, stack):
-        len_stack0 = len(stack)
-        try:
+    def called_methods(md):
+        clzmsig = md.clzmsig
+        mds = []
+        nodes = [md.code]
+        while nodes:
+            node = nodes.pop()
             if isinstance(node, tuple):
                 assert node
                 cmd = node[0]
                 if cmd in (jp.SPECIALINVOKE, jp.INVOKE):
                     called_clzmsig = node[1]
-                    if not include_direct_recursive_calls and called_clzmsig == stack[-1]:
+                    if not include_direct_recursive_calls and called_clzmsig == clzmsig:
                         pass
                     else:
-                        r = resolve_dispatch(cmd, called_clzmsig)
-                        for md in r:
-                            dig_call(md, stack)
+                        mds.extend(m for m in resolve_dispatch(cmd, called_clzmsig) if m.code)
                 elif cmd in (jp.LABEL, jp.RETURN, jp.THROW):
                     pass
                 else:
-                    # sys.stderr.write("node = %s\n" % repr(node))
                     assert False
             elif isinstance(node, list):
                 assert node
                 assert node[0] in (jcbte.ORDERED_AND, jcbte.ORDERED_OR)
-                for item in node[1:]:
-                    dig_node(item, stack)
-        finally:
-            if len(stack) > len_stack0:
-                stack[:] = stack[:len_stack0]
+                nodes.extend(node[1:])
+        return mds
+
+    index = {}  # ClzMethodSig -> int, order of visit
+    lowlink = {}  # ClzMethodSig -> int
+    component_stack = []  # list of ClzMethodSig
+    on_component_stack = set()
+    self_calling = set()
+    # set of ClzMethodSig # methods involved in recursive call chain
+    methods_ircc = set()
 
-    def dig_call(md, stack):
+    def visit(md):
         clzmsig = md.clzmsig
-        len_stack0 = len(stack)
-        try:
-            aot = md.code
-            if not aot:
-                return
-            try:
-                i = stack.index(clzmsig)
-                methods_ircc.update(stack[i:])
-                return
-            except:
-                pass
-            if clzmsig in methods_searched:
-                return
-            methods_searched.add(clzmsig)
-            stack.append(clzmsig)
-            dig_node(aot, stack)
-        finally:
-            if len(stack) > len_stack0:
-                stack[:] = stack[:len_stack0]
-
-    stack_sentinel = None
-    dig_call(md0, [stack_sentinel])
+        index[clzmsig] = lowlink[clzmsig] = len(index)
+        component_stack.append(clzmsig)
+        on_component_stack.add(clzmsig)
+        return (clzmsig, iter(called_methods(md)))
+
+    for entry_point in entry_points:
+        e = resolve_dispatch(jp.SPECIALINVOKE, entry_point)
+        if not e:
+            raise ValueError("entry_point not found")
+        md0 = e[0]
+        aot = md0.code if md0 else None
+        if aot is None:
+            raise ValueError("entry_point not found")
+        if not aot or md0.clzmsig in index:
+            continue  # for entry_point
+
+        work = [visit(md0)]
+        while work:
+            clzmsig, called_iter = work[-1]
+            for cmd in called_iter:
+                cclzmsig = cmd.clzmsig
+                if cclzmsig not in index:
+                    work.append(visit(cmd))
+                    break  # for cmd
+                if cclzmsig == clzmsig:
+                    self_calling.add(clzmsig)
+                if cclzmsig in on_component_stack:
+                    lowlink[clzmsig] = min(lowlink[clzmsig], index[cclzmsig])
+            else:
+                work.pop()
+                if work:
+                    pclzmsig = work[-1][0]
+                    lowlink[pclzmsig] = min(lowlink[pclzmsig], lowlink[clzmsig])
+                if lowlink[clzmsig] == index[clzmsig]:
+                    component = []
+                    while True:
+                        c = component_stack.pop()
+                        on_component_stack.discard(c)
+                        component.append(c)
+                        if c == clzmsig:
+                            break  # while True
+                    if len(component) >= 2 or clzmsig in self_calling:
+                        methods_ircc.update(component)
 
     s = list(methods_ircc)
     s.sort()
     return s
 
 
+def find_methods_involved_in_recursive_call_chain(entry_point, resolve_dispatch,
+          include_direct_recursive_calls=False):
+    # entry_point  # ClzMethodSig
+    return find_methods_involved_in_recursive_call_chains([entry_point], resolve_dispatch,
+            include_direct_recursive_calls=include_direct_recursive_calls)
+
+
 def find_entry_points(class_table, target_class_names=None):
     # class_table  # str -> ClassData
     entrypoint_retv_method_params = set([
@@ -267,28 +327,66 @@ def find_entry_points(class_table, target_class_names=None):
     return sorted(entry_points)
 
 
+class _AndOrNodeFrame(object):
+    # a frame of build_call_andor_tree, building a node from an and-or tree node of method code
+    __slots__ = ('aot', 'index', 'node', 'has_empty_subs', 'recursive_context', 'clzmsig')
+
+    def __init__(self, aot, recursive_context, clzmsig):
+        self.aot = aot
+        self.index = 1
+        self.node = [aot[0]]
+        self.has_empty_subs = False
+        self.recursive_context = recursive_context
+        self.clzmsig = clzmsig
+
+    def add(self, v):
+        if v is None:
+            self.has_empty_subs = True
+        else:
+            self.node.append(v)
+
+    def result(self):
+        n = self.node
+        if n[0] == ct.ORDERED_OR and self.has_empty_subs:
+            n.insert(1, [ct.ORDERED_AND])
+        len_n = len(n)
+        return None if len_n == 1 else n[1] if len_n == 2 else n
+
+
+class _DispatchFrame(object):
+    # a frame of build_call_andor_tree, building a node from the methods dispatched by an invocation
+    __slots__ = ('cmd', 'literals', 'loc_info', 'cand_methods', 'index', 'node', 'recursive_context', 'digging')
+
+    def __init__(self, cmd, literals, loc_info, cand_methods, recursive_context):
+        self.cmd = cmd
+        self.literals = literals
+        self.loc_info = loc_info
+        self.cand_methods = cand_methods
+        self.index = 0
+        self.node = [ct.ORDERED_OR]
+        self.recursive_context = recursive_context
+        self.digging = None  # (invoked, recursive_context, node_label) of the method being dug
+
+    def result(self):
+        n = self.node
+        len_n = len(n)
+        return None if len_n == 1 else n[1] if len_n == 2 else n
+
+
 def build_call_andor_tree(entry_point, resolve_dispatch, methods_ircc, call_node_memo={}):
     # entry_point  # ClzMethodSig
     # methods_ircc  # set of ClzMethodSig
     # call_node_memo = {}  # (ClzMethodSig, recursive_context) -> node
 
-    def dig_node(aot, recursive_context, clzmsig):
+    # The tree is built with an explicit stack of frames (_AndOrNodeFrame or _DispatchFrame),
+    # not with recursive calls, in order not to hit the recursion limit with deep call chains.
+
+    def start_node(aot, recursive_context, clzmsig):
+        # returns a tuple (node, None) when the node is built at once, otherwise (None, frame)
         if isinstance(aot, list):
             assert aot
-            aot0 = aot[0]
-            if aot0 in (ct.ORDERED_AND, ct.ORDERED_OR, jcbte.BLOCK):
-                has_empty_subs = False
-                n = [aot0]
-                for item in aot[1:]:
-                    v = dig_node(item, recursive_context, clzmsig)
-                    if v is None:
-                        has_empty_subs = True
-                    else:
-                        n.append(v)
-                if aot0 == ct.ORDERED_OR and has_empty_subs:
-                    n.insert(1, [ct.ORDERED_AND])
-                len_n = len(n)
-                return None if len_n == 1 else n[1] if len_n == 2 else n
+            if aot[0] in (ct.ORDERED_AND, ct.ORDERED_OR, jcbte.BLOCK):
+                return None, _AndOrNodeFrame(aot, recursive_context, clzmsig)
             else:
                 assert False
         elif isinstance(aot, tuple):
@@ -297,54 +395,198 @@ def build_call_andor_tree(entry_point, resolve_dispatch, methods_ircc, call_node
             if cmd in (jp.SPECIALINVOKE, jp.INVOKE):
                 recv_clzmsig = aot[1]
                 if recv_clzmsig == clzmsig or recv_clzmsig == recursive_context:
-                    return None
+                    return None, None
                 loc_info = '\n'.join([clzmsig, "%d" % aot[3]])
-                v = dig_dispatch(cmd, recv_clzmsig, recursive_context, aot[2], loc_info)
-                if v: 
-                    return v
-                return ct.Invoked(cmd, recv_clzmsig, aot[2], loc_info)
+                return start_dispatch(cmd, recv_clzmsig, recursive_context, aot[2], loc_info)
             else:
-                return None
+                return None, None
         else:
-            return None
+            return None, None
 
-    digging_calls = []
-    def dig_dispatch(cmd, recv_clzmsig, recursive_context, literals, loc_info):
+    def start_dispatch(cmd, recv_clzmsig, recursive_context, literals, loc_info):
         cand_methods = resolve_dispatch(cmd, recv_clzmsig)
         if not cand_methods:
             recv = jp.clzmsig_clz(recv_clzmsig)
             if recv.endswith("[]"):
                 recv_clzmsig = jp.ClzMethodSig("[]", jp.clzmsig_retv_str(recv_clzmsig), jp.clzmsig_method(recv_clzmsig), jp.clzmsig_params(recv_clzmsig))
-                return ct.Invoked(cmd, recv_clzmsig, literals, loc_info)
-            return ct.Invoked(cmd, recv_clzmsig, literals, loc_info)
-        dispatch_node = [ct.ORDERED_OR]
-        for md in cand_methods:
-            clzmsig = md.clzmsig
-            rc = recursive_context
-            if clzmsig in digging_calls:
-                # a recursive call is always a leaf node
-                dispatch_node.append(ct.Invoked(cmd, clzmsig, literals, loc_info))
-            else:
+                return ct.Invoked(cmd, recv_clzmsig, literals, loc_info), None
+            return ct.Invoked(cmd, recv_clzmsig, literals, loc_info), None
+        return None, _DispatchFrame(cmd, literals, loc_info, cand_methods, recursive_context)
+
+    digging_calls = set()
+    v, frame = start_dispatch(jp.SPECIALINVOKE, entry_point, None, (), None)
+    frames = [frame] if frame is not None else []
+    while frames:
+        f = frames[-1]
+        sub_frame = None
+        if isinstance(f, _AndOrNodeFrame):
+            if f.index > 1:
+                f.add(v)  # result of the last sub-node
+            aot = f.aot
+            while f.index < len(aot):
+                item = aot[f.index]
+                f.index += 1
+                v, sub_frame = start_node(item, f.recursive_context, f.clzmsig)
+                if sub_frame is not None:
+                    break  # while f.index
+                f.add(v)
+        else:
+            if f.digging is not None:  # v is the body of the method being dug
+                invoked, rc, node_label = f.digging
+                f.digging = None
+                digging_calls.remove(invoked.callee)
+                call_node_memo[node_label] = v
+                f.node.append(ct.CallNode(invoked, rc, v))
+            cmd, literals, loc_info = f.cmd, f.literals, f.loc_info
+            cand_methods = f.cand_methods
+            while f.index < len(cand_methods):
+                md = cand_methods[f.index]
+                f.index += 1
+                clzmsig = md.clzmsig
+                rc = f.recursive_context
+                if clzmsig in digging_calls:
+                    # a recursive call is always a leaf node
+                    f.node.append(ct.Invoked(cmd, clzmsig, literals, loc_info))
+                    continue  # while f.index
                 if rc is None and clzmsig in methods_ircc:
                     rc = clzmsig
                 invoked = ct.Invoked(cmd, clzmsig, literals, loc_info)
                 node_label = callnode_label(ct.CallNode(invoked, rc, None))
                 v = call_node_memo.get(node_label)
                 if v is None:
-                    assert clzmsig not in digging_calls  # assert this call is not a recursive one
-                    digging_calls.append(clzmsig)
-                    v = dig_node(md.code, rc, clzmsig)
-                    digging_calls.pop()
+                    digging_calls.add(clzmsig)
+                    v, sub_frame = start_node(md.code, rc, clzmsig)
+                    if sub_frame is not None:
+                        f.digging = (invoked, rc, node_label)
+                        break  # while f.index
+                    digging_calls.remove(clzmsig)
                     call_node_memo[node_label] = v
-                cn = ct.CallNode(invoked, rc, v)
-                dispatch_node.append(cn)
-        len_dispatch_node = len(dispatch_node)
-        return None if len_dispatch_node == 1 else dispatch_node[1] if len_dispatch_node == 2 else dispatch_node
+                f.node.append(ct.CallNode(invoked, rc, v))
+        if sub_frame is not None:
+            frames.append(sub_frame)
+        else:
+            v = f.result()
+            frames.pop()
+    return v
+
+
+def _resolved_callees_of_site(cmd, recv_clzmsig, resolve_dispatch):
+    # callees of the node(s) which build_call_andor_tree generates for an invocation
+    cand_methods = resolve_dispatch(cmd, recv_clzmsig)
+    if cand_methods:
+        return set(md.clzmsig for md in cand_methods)
+    if jp.clzmsig_clz(recv_clzmsig).endswith("[]"):
+        recv_clzmsig = jp.ClzMethodSig("[]", jp.clzmsig_retv_str(recv_clzmsig), jp.clzmsig_method(recv_clzmsig), jp.clzmsig_params(recv_clzmsig))
+    return set([recv_clzmsig])
+
+
+def find_reusable_call_nodes(prev_call_trees, class_table, resolve_dispatch, methods_ircc, changed_classes):
+    """
+    Find call nodes of previously built call trees, which are not affected by changes of classes.
+    Returns a call-node memo, that is, (ClzMethodSig, recursive_context) -> body.
+    A call node is affected when its method is defined in a changed class,
+    when an invocation in its method is dispatched differently from the previous call trees,
+    when it directly invokes a method of a changed class without a body,
+    when a recursive context of its sub call node is changed,
+    or when any of its sub call nodes is affected.
+    """
+
+    methods_ircc = set(methods_ircc)
+    label_to_body = {}
+    label_to_parents = collections.defaultdict(set)
+    site_to_callees = collections.defaultdict(set)  # loc_info -> set of ClzMethodSig
+    affected = set()
+
+    def scan(label, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            if isinstance(node, list):
+                stack.extend(node[1:])
+            elif isinstance(node, ct.CallNode):
+                invoked = node.invoked
+                if invoked.locinfo is not None:
+                    site_to_callees[invoked.locinfo].add(invoked.callee)
+                sub_label = callnode_label(node)
+                sub_clzmsig, sub_rc = sub_label
+                if label is not None:
+                    label_to_parents[sub_label].add(label)
+                    if sub_rc is None and sub_clzmsig in methods_ircc or \
+                            sub_rc == sub_clzmsig and sub_clzmsig not in methods_ircc:
+                        affected.add(label)
+                if sub_label not in label_to_body:
+                    label_to_body[sub_label] = node.body
+                    pending.append((sub_label, node.body))
+            elif isinstance(node, ct.Invoked):
+                if node.locinfo is not None:
+                    site_to_callees[node.locinfo].add(node.callee)
+                if label is not None and jp.clzmsig_clz(node.callee) in changed_classes:
+                    affected.add(label)
+            else:
+                assert False
 
-    return dig_dispatch(jp.SPECIALINVOKE, entry_point, None, (), None)
+    pending = []
+    for call_tree in prev_call_trees:
+        scan(None, call_tree)
+        while pending:
+            scan(*pending.pop())
 
+    method_to_redispatched_recvs = {}
+    def redispatched_recvs(md):
+        clzmsig = md.clzmsig
+        recvs = method_to_redispatched_recvs.get(clzmsig)
+        if recvs is None:
+            recvs = set()
+            stack = [md.code]
+            while stack:
+                node = stack.pop()
+                if isinstance(node, list):
+                    stack.extend(node[1:])
+                elif isinstance(node, tuple) and node[0] in (jp.SPECIALINVOKE, jp.INVOKE):
+                    cmd, recv_clzmsig, literals, linenum = node
+                    if recv_clzmsig == clzmsig:
+                        continue  # not a node of call tree
+                    loc_info = '\n'.join([clzmsig, "%d" % linenum])
+                    if site_to_callees.get(loc_info) != _resolved_callees_of_site(cmd, recv_clzmsig, resolve_dispatch):
+                        recvs.add(recv_clzmsig)
+            method_to_redispatched_recvs[clzmsig] = recvs
+        return recvs
+
+    for label in label_to_body:
+        if label in affected:
+            continue
+        clzmsig, rc = label
+        clz = jp.clzmsig_clz(clzmsig)
+        cd = class_table.get(clz)
+        md = cd.methods.get(clzmsig) if cd is not None else None
+        if clz in changed_classes or md is None:
+            affected.add(label)
+            continue
+        if any(recv != rc for recv in redispatched_recvs(md)):
+            affected.add(label)
+
+    stack = list(affected)
+    while stack:
+        label = stack.pop()
+        for parent in label_to_parents.get(label, ()):
+            if parent not in affected:
+                affected.add(parent)
+                stack.append(parent)
+
+    return dict((label, body) for label, body in label_to_body.iteritems() if label not in affected)
+
+
+def extract_call_andor_trees(class_table, entry_points, prev_call_trees=None, changed_classes=None,
+        reused_call_node_labels=None):
+    """
+    Build call and-or trees of entry points.
+    When prev_call_trees and changed_classes are given, rebuild incrementally, that is,
+    reuse the call nodes of prev_call_trees that are not affected by changed_classes.
+    Labels of the reused call nodes are added to reused_call_node_labels, if given.
+    """
 
-def extract_call_andor_trees(class_table, entry_points):
     class_to_methods = dict((claz, cd.methods.keys()) for claz, cd in class_table.iteritems())
     # class_to_methods  # str -> [ClzMethodSig]
 
@@ -354,17 +596,18 @@ def extract_call_andor_trees(class_table, entry_points):
 
     resolve_dispatch = gen_method_dispatch_resolver(class_table, class_to_descendants, recv_method_to_defs)
 
-    methods_ircc = set()
-    for entry_point in entry_points:
-        ms = find_methods_involved_in_recursive_call_chain(entry_point, resolve_dispatch)
-        methods_ircc.update(ms)
-    methods_ircc = sorted(methods_ircc)
+    methods_ircc = find_methods_involved_in_recursive_call_chains(entry_points, resolve_dispatch)
     # out.write("methods involved in recursive chain:\n")
     # for mtd in methods_ircc:
     #     out.write("  %s\n" % repr(mtd))
 
     call_trees = []
     call_node_memo = {}
+    if prev_call_trees is not None:
+        call_node_memo = find_reusable_call_nodes(prev_call_trees, class_table, resolve_dispatch,
+                methods_ircc, changed_classes or set())
+        if reused_call_node_labels is not None:
+            reused_call_node_labels.update(call_node_memo.iterkeys())
     for entry_point in entry_points:
         call_tree = build_call_andor_tree(entry_point, resolve_dispatch, methods_ircc, call_node_memo=call_node_memo)
         call_trees.append(call_tree)
@@ -440,6 +683,7 @@ def main(argv, out=sys.stdout, logout=sys.stderr):
 
     logout and logout.write("> build call and-or tree\n")
     call_tree = build_call_andor_tree(entry_point, resolver, methods_ircc)
+    logout and logout.write("> dispatch cache: hits=%d, misses=%d\n" % resolver.cache_info()[:2])
 
     out.write("call and-or tree:\n")
     pp = pprint.PrettyPrinter(indent=4, stream=out)
@@ -1,6 +1,9 @@
 #coding: utf-8
 
+import itertools
 import re
+import sre_constants
+import sre_parse
 import sys
 
 from ._utilities import quote, sort_uniq
@@ -11,6 +14,41 @@ from . import calltree_builder as cb
 from . import calltree_summary as cs
 from .calltree_summary import Summary  # re-export
 
+def _required_literal_runs(parsed_pattern, runs):
+    # appends to runs the literal strings which any match of the pattern includes
+    run = []
+    for op, av in parsed_pattern:
+        if op == sre_constants.LITERAL and av < 256:
+            run.append(chr(av))
+            continue  # for op
+        if run:
+            runs.append(''.join(run))
+            run = []
+        if op == sre_constants.SUBPATTERN:
+            _required_literal_runs(av[-1], runs)
+        elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT):
+            min_count, _, sub_pattern = av
+            if min_count >= 1:
+                _required_literal_runs(sub_pattern, runs)
+    if run:
+        runs.append(''.join(run))
+
+
+def required_trigrams(regexes):
+    """
+    Trigrams (in lower case) which a string includes when it matches all of the regexes.
+    Returns an empty set when no such trigrams are found, e.g. for the regex "a|b".
+    """
+
+    trigrams = set()
+    for regex in regexes:
+        runs = []
+        _required_literal_runs(sre_parse.parse(regex.pattern, regex.flags), runs)
+        for r in runs:
+            trigrams.update(cs.trigrams_of(r))
+    return trigrams
+
+
 class QueryPattern(object):
     def __init__(self, word, ignore_case=False):
         uw = word.decode('utf-8')
@@ -20,6 +58,14 @@ class QueryPattern(object):
             re.compile(backslash_doubled)
         self.word = word
 
+    def callee_regexes(self):
+        # regexes, all of which match a callee matching this pattern (None when no callee matches)
+        return None
+
+    def literal_regexes(self):
+        # regexes, all of which match a literal matching this pattern (None when no literal matches)
+        return None
+
     def matches_type(self, typ):
         return False
 
@@ -34,6 +80,9 @@ class QueryPattern(object):
 
 
 class TypeQueryPattern(QueryPattern):
+    def callee_regexes(self):
+        return [self.regex]
+
     def matches_type(self, typ):
         return bool(self.regex.search(typ))
 
@@ -67,25 +116,38 @@ class MethodQueryPattern(QueryPattern):
             self.regex_param = comp(fields[3]) if len(fields) >= 4 and fields[3] else None
         self.word = word
 
+    def callee_regexes(self):
+        return [r for r in (self.regex_clz, self.regex_retv, self.regex_method, self.regex_param) if r is not None]
+
     def matches_method(self, method, callee=None):
         if callee is not None:
             return self.matches_callee(callee)
         return bool(self.regex_method is not None and self.regex_method.search(method))
 
     def matches_callee(self, callee):
-        fields = callee.split('\t') # clz, retv, method, param, ...
-        return bool((self.regex_clz is None or self.regex_clz.search(fields[0])) and \
-                (self.regex_retv is None or self.regex_retv.search(fields[1])) and \
-                (self.regex_method is None or self.regex_method.search(fields[2])) and \
-                (self.regex_param is None or any(self.regex_param.search(p) for p in fields[3:])))
+        if callee.__class__ is not jp.ClzMethodSig:
+            callee = jp.clzmsig_from_str(callee)
+        return bool((self.regex_clz is None or self.regex_clz.search(callee.clz)) and \
+                (self.regex_retv is None or self.regex_retv.search(callee.retv_str)) and \
+                (self.regex_method is None or self.regex_method.search(callee.method)) and \
+                (self.regex_param is None or any(self.regex_param.search(p) for p in callee.params)))
 
 
 class LiteralQueryPattern(QueryPattern):
+    def literal_regexes(self):
+        return [self.regex]
+
     def matches_literal(self, w):
         return bool(self.regex.search(w))
 
 
 class AnyQueryPattern(QueryPattern):
+    def callee_regexes(self):
+        return [self.regex]
+
+    def literal_regexes(self):
+        return [self.regex]
+
     def matches_type(self, typ):
         return bool(self.regex.search(typ))
 
@@ -96,11 +158,9 @@ class AnyQueryPattern(QueryPattern):
         return bool(self.regex.search(w))
 
     def matches_callee(self, callee):
-        for t in callee.split('\t'):  # clz, retv, method, param, ...
-            if self.regex.search(t):
-                return True
-        else:
-            return False
+        if callee.__class__ is not jp.ClzMethodSig:
+            callee = jp.clzmsig_from_str(callee)
+        return any(itertools.imap(self.regex.search, callee.fields))  # clz, retv, method, param, ...
 
 def compile_query(query_word, ignore_case=False):
     def _compile_i(target, query_word, ignore_case):
@@ -124,61 +184,174 @@ def compile_query(query_word, ignore_case=False):
 
 
 class Query(object):
+    """
+    A conjunction of query patterns.
+    Each distinct callee or literal is matched against the patterns once, and
+    the result is memorized as a bitset (an int, whose i-th bit is set when the
+    i-th pattern matches), so that a summary is checked by OR-ing the bitsets
+    of its callees and literals.
+    The bitset of a summary is also memorized, so that a summary shared by
+    other summaries (see Summary.sub_summaries) is checked once.
+    """
+
     def __init__(self, query_patterns):
         self._patterns = query_patterns
+        self._all_patterns_mask = (1 << len(query_patterns)) - 1
+        self._callee_masks = {}  # callee -> int
+        self._literal_masks = {}  # literal -> int
+        self._summary_masks = {}  # id of Summary -> (Summary, int), the summary is kept not to reuse the id
+        # (callee_postings of inverted index, sets of callees matched by each pattern), set by fulfilling_labels
+        self._callee_dictionary = None
+        self._literal_dictionary = None
 
     def count(self):
         return len(self._patterns)
 
+    def _mask(self, term, masks, dictionary, matches):
+        mask = 0
+        if dictionary is not None and term in dictionary[0]:
+            for i, mts in enumerate(dictionary[1]):
+                if term in mts:
+                    mask |= 1 << i
+        else:
+            for i, p in enumerate(self._patterns):
+                if matches(p, term):
+                    mask |= 1 << i
+        masks[term] = mask
+        return mask
+
+    def callee_mask(self, callee):
+        mask = self._callee_masks.get(callee)
+        if mask is None:
+            mask = self._mask(callee, self._callee_masks, self._callee_dictionary,
+                    lambda p, callee: p.matches_callee(callee))
+        return mask
+
+    def literal_mask(self, literal):
+        mask = self._literal_masks.get(literal)
+        if mask is None:
+            mask = self._mask(literal, self._literal_masks, self._literal_dictionary,
+                    lambda p, literal: p.matches_literal(literal))
+        return mask
+
+    def terms_mask(self, callee, literals):
+        mask = self.callee_mask(callee)
+        if literals:
+            for w in literals:
+                mask |= self.literal_mask(w)
+        return mask
+
+    def is_fulfilled_by_mask(self, mask):
+        return mask == self._all_patterns_mask
+
+    def _own_terms_mask(self, sumry):
+        all_mask = self._all_patterns_mask
+        mask = 0
+        for callee in sumry.own_callees:
+            mask |= self.callee_mask(callee)
+            if mask == all_mask:
+                return mask
+        for w in sumry.own_literals:
+            mask |= self.literal_mask(w)
+            if mask == all_mask:
+                return mask
+        return mask
+
+    def summary_mask(self, sumry):
+        summary_masks = self._summary_masks
+        e = summary_masks.get(id(sumry))
+        if e is not None:
+            return e[1]
+
+        all_mask = self._all_patterns_mask
+        # an item of the work list is a pair of a summary and the mask of its own terms
+        # (None until calculated), where the summary is revisited after its sub-summaries
+        work = [(sumry, None)]
+        while work:
+            s, mask = work.pop()
+            if id(s) in summary_masks:
+                continue  # while work
+            if mask is None:
+                mask = self._own_terms_mask(s)
+                if mask != all_mask:
+                    subs = [ss for ss in s.sub_summaries if id(ss) not in summary_masks]
+                    if subs:
+                        work.append((s, mask))
+                        work.extend((ss, None) for ss in subs)
+                        continue  # while work
+            if mask != all_mask:
+                for ss in s.sub_summaries:
+                    mask |= summary_masks[id(ss)][1]
+            summary_masks[id(s)] = (s, mask)
+        return summary_masks[id(sumry)][1]
+
     def is_fulfilled_by(self, sumry):
-        return not self.unmatched_patterns(sumry)
+        return self.summary_mask(sumry) == self._all_patterns_mask
 
     def is_partially_filled_by(self, sumry):
-        for suminv in sumry.callees:
-            for p in self._patterns:
-                if p.matches_callee(suminv):
-                    return True
-        for w in sumry.literals:
-            for p in self._patterns:
-                if p.matches_literal(w):
-                    return True
-        return False
+        return self.summary_mask(sumry) != 0
 
     def has_matching_pattern_in(self, clzmsig, literals):
-        for p in self._patterns:
-            if p.matches_callee(clzmsig):
-                return True
-            for w in literals:
-                if p.matches_literal(w):
-                    return True
-        return False
+        return bool(self.callee_mask(clzmsig)) or any(self.literal_mask(w) for w in literals)
 
     def unmatched_patterns(self, sumry):
-        remaining_patterns = self._patterns[:]
-        for callee in sumry.callees:
-            remaining_patterns = [p for p in remaining_patterns if \
-                    not p.matches_callee(callee)]
-            if not remaining_patterns:
-                return []
-        remaining_patterns = [p for p in remaining_patterns if \
-                not any(p.matches_literal(w) for w in sumry.literals)]
-        return remaining_patterns
+        mask = self.summary_mask(sumry)
+        return [p for i, p in enumerate(self._patterns) if not mask & (1 << i)]
 
     def matched_patterns(self, sumry):
-        remaining_patterns = self._patterns[:]
-        rems = []
-        matcheds = []
-        for callee in sumry.callees:
-            for p in remaining_patterns:
-                (rems if not p.matches_callee(callee) else \
-                    matcheds).append(p)
-            if not remaining_patterns:
-                return matcheds
-            remaining_patterns = rems
-        for p in remaining_patterns:
-            if any(p.matches_literal(w) for w in sumry.literals):
-                matcheds.append(p)
-        return matcheds
+        mask = self.summary_mask(sumry)
+        return [p for i, p in enumerate(self._patterns) if mask & (1 << i)]
+
+    def fulfilling_labels(self, inverted_index, term_trigram_index=None):
+        """
+        Returns a set of labels of the summaries fulfilling the query.
+        Each pattern is matched once against each distinct callee and literal
+        in the inverted index, and the postings of the matched ones are intersected.
+        With term_trigram_index, a pattern is matched only against the terms
+        including the trigrams required by the pattern.
+        The matched terms are used for the bitsets of the terms afterwards.
+        """
+
+        callee_trigrams = literal_trigrams = None
+        if term_trigram_index is not None:
+            callee_trigrams = term_trigram_index.callee_trigrams
+            literal_trigrams = term_trigram_index.literal_trigrams
+        callee_term_sets = []  # i-th item is a set of the callees matched by the i-th pattern
+        literal_term_sets = []
+        label_ids = None
+        for p in self._patterns:
+            ids = set()
+            callee_term_sets.append(set())
+            literal_term_sets.append(set())
+            targets = [
+                (inverted_index.callee_postings, callee_trigrams, p.callee_regexes(), p.matches_callee, callee_term_sets[-1]),
+                (inverted_index.literal_postings, literal_trigrams, p.literal_regexes(), p.matches_literal, literal_term_sets[-1])]
+            for postings, trigram_to_terms, regexes, matches, matched_terms in targets:
+                if regexes is None:
+                    continue  # for postings
+                terms = None
+                if trigram_to_terms is not None:
+                    for tg in required_trigrams(regexes):
+                        tg_terms = trigram_to_terms.get(tg, ())
+                        terms = set(tg_terms) if terms is None else terms.intersection(tg_terms)
+                        if not terms:
+                            break  # for tg
+                if terms is None:
+                    terms = postings.iterkeys()  # no trigrams to narrow the terms, goes w/ full scan
+                for term in terms:
+                    if matches(term):
+                        matched_terms.add(term)
+                        ids.update(postings[term])
+            label_ids = ids if label_ids is None else label_ids & ids
+            if not label_ids:
+                return set()
+        # terms in the inverted index are not matched against the patterns again
+        self._callee_dictionary = (inverted_index.callee_postings, callee_term_sets)
+        self._literal_dictionary = (inverted_index.literal_postings, literal_term_sets)
+        labels = inverted_index.labels
+        if label_ids is None:
+            return set(labels[i] for i in xrange(len(labels)))
+        return set(labels[i] for i in label_ids)
 
     def matches_method(self, method, callee=None):
         return any(p.matches_method(method, callee=callee) for p in self._patterns)
@@ -230,44 +403,76 @@ def gen_callnode_fulfills_query_predicate_w_memo(query, node_summary_table):
     return predicate
 
 
+def gen_callnode_fulfills_query_predicate_w_inverted_index(query, inverted_index, term_trigram_index=None):
+    fulfilling_labels = query.fulfilling_labels(inverted_index, term_trigram_index)
+    def predicate(call_node):
+        assert isinstance(call_node, ct.CallNode)
+        return cb.callnode_label(call_node) in fulfilling_labels
+
+    return predicate
+
+
 def get_lower_bound_call_nodes(call_trees, predicate):
-    already_searched_call_node_labels = set()
-    lower_call_nodes = []
+    return list(gen_lower_bound_call_nodes(call_trees, predicate))
+
+
+def gen_lower_bound_call_nodes(call_trees, predicate, already_searched_call_node_labels=None):
+    """
+    Generates lower-bound call nodes, that is, call nodes fulfilling the predicate and
+    not having any sub-call-node fulfilling it, each as soon as it is found.
+    A call node whose label is in already_searched_call_node_labels is not searched again,
+    and the set is updated with the labels of searched call nodes.
+    """
+
+    if already_searched_call_node_labels is None:
+        already_searched_call_node_labels = set()
     def search_i(call_node):
-        node_label = cb.callnode_label(call_node)
-        if node_label in already_searched_call_node_labels:
-            return
-        subcs = get_direct_sub_callnodes_of_body_node(call_node.body)
-        any_subc_fulfill_query = False
-        for subc in subcs:
-            if predicate(subc):
-                any_subc_fulfill_query = True
-                search_i(subc)
-        if not any_subc_fulfill_query:
-            lower_call_nodes.append(call_node)
-        already_searched_call_node_labels.add(node_label)
+        # an item of the work list is a call node, its label, an iterator of its
+        # sub-call-nodes, and a flag whether any of them fulfills the predicate
+        work = [[call_node, None, None, False]]
+        while work:
+            w = work[-1]
+            call_node, label, subc_iter, any_subc_fulfill_query = w
+            if subc_iter is None:
+                label = w[1] = cb.callnode_label(call_node)
+                if label in already_searched_call_node_labels:
+                    work.pop()
+                    continue  # while work
+                subc_iter = w[2] = iter(get_direct_sub_callnodes_of_body_node(call_node.body))
+            for subc in subc_iter:
+                if predicate(subc):
+                    w[3] = True
+                    work.append([subc, None, None, False])
+                    break  # for subc
+            else:
+                if not w[3]:
+                    yield call_node
+                already_searched_call_node_labels.add(label)
+                work.pop()
 
     for call_tree in call_trees:
         assert isinstance(call_tree, ct.CallNode)
         if predicate(call_tree):
-            search_i(call_tree)
-
-    return lower_call_nodes
+            for call_node in search_i(call_tree):
+                yield call_node
 
 
 def treecut_with_callnode_depth(node, depth, has_deeper_nodes=None):
     if has_deeper_nodes is None:
         has_deeper_nodes = [None]
     callnode_body_memo = {}
+
+    # The tree is traversed with an explicit stack, in order not to hit the recursion limit.
+    # A frame of the stack is either of:
+    #   [list node, index of the next sub-node, cut list node, remaining_depth]
+    #   [call node, node label, remaining_depth, whether its body is being cut]
     def treecut_i(node, remaining_depth):
+        # returns a tuple (cut node, None) when cut at once, otherwise (None, frame)
         if isinstance(node, list):
             assert node
             n0 = node[0]
             if n0 in (ct.ORDERED_AND, ct.ORDERED_OR):
-                t = [n0]
-                for subn in node[1:]:
-                    t.append(treecut_i(subn, remaining_depth))
-                return t
+                return None, [node, 1, [n0], remaining_depth]
             else:
                 assert False
         elif isinstance(node, ct.CallNode):
@@ -275,31 +480,102 @@ def treecut_with_callnode_depth(node, depth, has_deeper_nodes=None):
                 node_label = (node.invoked.callee, remaining_depth)
                 cb = callnode_body_memo.get(node_label)
                 if cb is None:
-                    callnode_body_memo[node_label] = \
-                    cb = treecut_i(node.body, remaining_depth - 1)
-                cn = ct.CallNode(node.invoked, remaining_depth, cb)
-                return cn
+                    return None, [node, node_label, remaining_depth, False]
+                return ct.CallNode(node.invoked, remaining_depth, cb), None
             else:
                 has_deeper_nodes[0] = True
-                return node.invoked
+                return node.invoked, None
+        else:
+            return node, None
+
+    v, f = treecut_i(node, depth)
+    stack = [f] if f is not None else []
+    while stack:
+        f = stack[-1]
+        sub_f = None
+        if isinstance(f[0], list):
+            n, i, t, remaining_depth = f
+            if i > 1:
+                t.append(v)  # cut node of the last sub-node
+            while i < len(n):
+                v, sub_f = treecut_i(n[i], remaining_depth)
+                i += 1
+                if sub_f is not None:
+                    break  # while i
+                t.append(v)
+            f[1] = i
+            if sub_f is None:
+                v = t
         else:
-            return node
-    return treecut_i(node, depth)
+            call_node, node_label, remaining_depth, body_being_cut = f
+            if not body_being_cut:
+                f[3] = True
+                v, sub_f = treecut_i(call_node.body, remaining_depth - 1)
+            if sub_f is None:
+                callnode_body_memo[node_label] = v
+                v = ct.CallNode(call_node.invoked, remaining_depth, v)
+        if sub_f is not None:
+            stack.append(sub_f)
+        else:
+            stack.pop()
+    return v
 
 
-def extract_shallowest_treecut(call_node, query, max_depth=-1):
+def gen_treecut_depth_checks(call_node, query, max_depth=-1):
+    """
+    Generates (depth, whether the tree cut of the depth fulfills the query) for depth = 1, 2, ...,
+    until the tree cut fulfills the query, the depth reaches max_depth, or no deeper call node remains.
+    Bodies of the call nodes are expanded breadth first, a level of depth at a time,
+    accumulating the patterns matched by the callees and literals appearing in them,
+    without making tree cuts.
+    """
+
     assert isinstance(call_node, ct.CallNode)
 
+    def invoked_mask(invoked):
+        return query.terms_mask(invoked.callee, invoked.literals)
+
+    mask = invoked_mask(call_node.invoked)
+    expanded = set()  # ids of call nodes, whose bodies have been expanded
+    level = [call_node]  # call nodes whose bodies are included in the tree cut of the next depth
     depth = 1
     while max_depth < 0 or depth < max_depth:
-        has_further_deep_nodes = [False]
-        tc = treecut_with_callnode_depth(call_node, depth, has_further_deep_nodes)
-        sumry = cs.node_summary_treecut(tc)
-        if query.is_fulfilled_by(sumry):
-            return tc
-        assert has_further_deep_nodes[0]
+        next_level = []
+        for cn in level:
+            if id(cn) in expanded:
+                continue  # for cn
+            expanded.add(id(cn))
+            work = [cn.body]
+            while work:
+                node = work.pop()
+                if node is None:
+                    pass
+                elif isinstance(node, list):
+                    work.extend(node[1:])
+                elif isinstance(node, ct.CallNode):
+                    mask |= invoked_mask(node.invoked)
+                    next_level.append(node)
+                else:
+                    mask |= invoked_mask(node)
+        fulfilled = query.is_fulfilled_by_mask(mask)
+        yield depth, fulfilled
+        if fulfilled or not next_level:
+            return
+        level = next_level
         depth += 1
 
+
+def extract_shallowest_treecut(call_node, query, max_depth=-1):
+    """
+    Returns the tree cut of the call node with the smallest call-node depth,
+    whose summary fulfills the query, or None when not found within max_depth.
+    The tree cut is made once, of the depth found by gen_treecut_depth_checks.
+    """
+
+    for depth, fulfilled in gen_treecut_depth_checks(call_node, query, max_depth):
+        if fulfilled:
+            return treecut_with_callnode_depth(call_node, depth)
+
     # not found
     return None
 
@@ -333,7 +609,13 @@ def update_cont_items_by_invoked(cont_items, invoked, query):
     return invoked_cont
 
 
-def extract_node_contribution(call_node, query):
+def extract_node_contribution(call_node, query, node_id_to_coverage=None):
+    """
+    Returns a dict from ids of nodes to whether each of the nodes contributes to the query.
+    In case of node_id_to_coverage parameter (a dict) given, it is updated with coverage of
+    each node, a bitset of query patterns matched by callees and literals in the node (see Query).
+    """
+
     node_id_to_cont = {}
     cont_types = set()
     cont_method_names = set()
@@ -341,30 +623,87 @@ def extract_node_contribution(call_node, query):
     cont_callees = set()
     cont_items = cont_types, cont_method_names, cont_literals, cont_callees
 
+    if node_id_to_coverage is not None:
+        def coverage_of_invoked(invoked):
+            cov = node_id_to_coverage[id(invoked)] = query.terms_mask(invoked.callee, invoked.literals)
+            return cov
+        coverage_of = lambda node: node_id_to_coverage[id(node)]
+    else:
+        coverage_of = coverage_of_invoked = lambda node: 0
+
+    # The tree is traversed with an explicit stack, in order not to hit the recursion limit.
+    # A frame of the stack is [node, index of the next sub-node, whether any sub-node contributes,
+    # coverage of the sub-nodes], where the sub-nodes of a call node are its invoked and its body.
     def mark_i(node):
         if node is None:
             return False  # None is always uncontributing
         node_cont = node_id_to_cont.get(id(node))
-        if node_cont is None:
+        if node_cont is not None:
+            return node_cont
+        stack = [[node, 0, False, 0]]
+        while stack:
+            f = stack[-1]
+            node, i, node_cont, node_cov = f
+            sub_node = None
             if isinstance(node, list):
-                assert node
-                n0 = node[0]
-                assert n0 in (ct.ORDERED_AND, ct.ORDERED_OR)
-                node_cont = False
-                for item in node[1:]:
-                    if mark_i(item):
+                if i == 0:
+                    assert node
+                    n0 = node[0]
+                    assert n0 in (ct.ORDERED_AND, ct.ORDERED_OR)
+                    i = 1
+                while i < len(node):
+                    item = node[i]
+                    i += 1
+                    if item is None:
+                        continue  # while i; None is always uncontributing
+                    item_cont = node_id_to_cont.get(id(item))
+                    if item_cont is None:
+                        if isinstance(item, ct.Invoked):
+                            item_cont = node_id_to_cont[id(item)] = update_cont_items_by_invoked(cont_items, item, query)
+                            node_cov |= coverage_of_invoked(item)
+                        else:
+                            sub_node = item
+                            break  # while i
+                    else:
+                        node_cov |= coverage_of(item)
+                    if item_cont:
                         node_cont = True
                         #  don't break for item
             elif isinstance(node, ct.CallNode):
-                invoked = node.invoked
-                invoked_cont = update_cont_items_by_invoked(cont_items, invoked, query)
-                body_cont = mark_i(node.body)
-                node_cont = invoked_cont or body_cont
+                if i == 0:
+                    i = 1
+                    node_cont = update_cont_items_by_invoked(cont_items, node.invoked, query)
+                    node_cov = coverage_of_invoked(node.invoked)
+                    body = node.body
+                    if body is not None:
+                        body_cont = node_id_to_cont.get(id(body))
+                        if body_cont is None and isinstance(body, ct.Invoked):
+                            body_cont = node_id_to_cont[id(body)] = update_cont_items_by_invoked(cont_items, body, query)
+                            coverage_of_invoked(body)
+                        if body_cont is None:
+                            sub_node = body
+                        else:
+                            node_cov |= coverage_of(body)
+                            if body_cont:
+                                node_cont = True
             elif isinstance(node, ct.Invoked):
                 node_cont = update_cont_items_by_invoked(cont_items, node, query)
+                node_cov = coverage_of_invoked(node)
             else:
                 assert False
+            if sub_node is not None:
+                f[1], f[2], f[3] = i, node_cont, node_cov
+                stack.append([sub_node, 0, False, 0])
+                continue  # while stack
             node_id_to_cont[id(node)] = node_cont
+            if node_id_to_coverage is not None:
+                node_id_to_coverage[id(node)] = node_cov
+            stack.pop()
+            if stack:
+                pf = stack[-1]
+                if node_cont:
+                    pf[2] = True
+                pf[3] |= node_cov
         return node_cont
 
     mark_i(call_node)
@@ -3,12 +3,7 @@
 import sys
 import pprint
 
-try:
-    from sys import intern  # py3k
-except:
-    pass
-
-from ._utilities import sort_uniq
+from ._utilities import sort_uniq, sorted_uniq_union
 
 from . import calltree as ct
 from . import calltree_builder as cb
@@ -16,17 +11,65 @@ from . import jimp_parser as jp
 
 
 class Summary(object):
-    __slots__ = ('callees', 'literals')
+    """
+    Callees and literals of a call node, as sorted lists without duplicates.
+    A summary shares the summaries of its sub-call-nodes (sub_summaries) rather than
+    copying their callees and literals, and has only the rest of them (own_callees and
+    own_literals), so that summaries of a call tree are built in linear time and space.
+    Attributes callees and literals are merged from the shared summaries on the first
+    access, and kept; the query of a search uses only the own_* attributes.
+    Pickling keeps the sharing (a deep summary may need a raised recursion limit, as call trees).
+    """
+
+    __slots__ = ('own_callees', 'own_literals', 'sub_summaries', '_callees', '_literals')
 
     def __getstate__(self):
-        return self.callees, self.literals
+        return self.own_callees, self.own_literals, self.sub_summaries
 
     def __setstate__(self, tpl):
-        self.callees, self.literals = tpl
+        if len(tpl) == 2:  # pickled by an older version, callees and literals merged
+            self.own_callees, self.own_literals = tpl
+            self.sub_summaries = ()
+        else:
+            self.own_callees, self.own_literals, self.sub_summaries = tpl
+        self._callees = self._literals = None
 
     def __init__(self, callees=(), literals=()):
-        self.callees = sort_uniq(callees)
-        self.literals = sort_uniq(literals)
+        self.own_callees = sort_uniq(callees)
+        self.own_literals = sort_uniq(literals)
+        self.sub_summaries = ()
+        self._callees = self._literals = None
+
+    def iter_summaries(self):
+        """
+        Iterate the summary and the ones shared by it, directly or indirectly, each once.
+        """
+
+        visited = set([id(self)])
+        stack = [self]
+        while stack:
+            s = stack.pop()
+            yield s
+            for ss in s.sub_summaries:
+                if id(ss) not in visited:
+                    visited.add(id(ss))
+                    stack.append(ss)
+
+    @property
+    def callees(self):
+        if not self.sub_summaries:
+            return self.own_callees
+        if self._callees is None:
+            self._callees = sorted_uniq_union([s.own_callees for s in self.iter_summaries() if s.own_callees])
+        return self._callees
+
+    @property
+    def literals(self):
+        if not self.sub_summaries:
+            return self.own_literals
+        if self._literals is None:
+            self._literals = sorted_uniq_union([s.own_literals for s in self.iter_summaries() if s.own_literals])
+        return self._literals
 
     def __eq__(self, other):
         return isinstance(other, Summary) and \
@@ -43,9 +86,17 @@ class Summary(object):
 
 
 class SummaryBuilder(object):
+    """
+    Appended summaries are kept as sub-summaries of the built summary, not copied,
+    so that a summary is built in time of its own callees and literals and
+    the count of its sub-summaries.
+    """
+
     def __init__(self):
         self.callees = []
         self.literals = []
+        self.sub_summaries = []
+        self.sub_summary_ids = set()
         self.already_appended_callnodes = set()
 
     def append_callee(self, callee):
@@ -61,13 +112,64 @@ class SummaryBuilder(object):
         self.literals.extend(literals)
 
     def append_summary(self, sumry, callnode_label=None):
-        self.callees.extend(sumry.callees)
-        self.literals.extend(sumry.literals)
+        if isinstance(sumry, Summary):
+            if id(sumry) not in self.sub_summary_ids and \
+                    (sumry.own_callees or sumry.own_literals or sumry.sub_summaries):
+                self.sub_summary_ids.add(id(sumry))
+                self.sub_summaries.append(sumry)
+        else:
+            self.callees.extend(sumry.callees)
+            self.literals.extend(sumry.literals)
         if callnode_label is not None:
             self.already_appended_callnodes.add(callnode_label)
 
     def to_summary(self):
-        return Summary(self.callees, self.literals)
+        sub_summaries = self.sub_summaries
+        if not self.callees and not self.literals and len(sub_summaries) == 1:
+            return sub_summaries[0]
+        sumry = Summary(self.callees, self.literals)
+        sumry.sub_summaries = tuple(sub_summaries)
+        return sumry
+
+
+class SummaryInternTable(object):
+    """
+    Hash-consing table of summaries.
+    Equal own callee lists, own literal lists, and summaries of the same structure
+    (equal own callees and literals, and the same sub-summaries) are shared, by replacing
+    a summary with the registered one equal to it.
+    Summaries are assumed to be interned bottom up, so that their sub-summaries
+    have been interned.
+    """
+
+    def __init__(self):
+        self.callee_lists = {}  # hash -> [list]
+        self.literal_lists = {}  # hash -> [list]
+        self.summaries = {}  # (id of callee list, id of literal list, ids of sub-summaries) -> Summary
+
+    @staticmethod
+    def _intern_list(lst, lists):
+        h = hash(tuple(lst))  # not to keep the tuple, lists are looked up by the hash and compared
+        bucket = lists.get(h)
+        if bucket is None:
+            lists[h] = [lst]
+            return lst
+        for b in bucket:
+            if b is lst or b == lst:
+                return b
+        bucket.append(lst)
+        return lst
+
+    def intern(self, sumry):
+        callees = self._intern_list(sumry.own_callees, self.callee_lists)
+        literals = self._intern_list(sumry.own_literals, self.literal_lists)
+        key = (id(callees), id(literals), tuple(id(ss) for ss in sumry.sub_summaries))
+        s = self.summaries.get(key)
+        if s is None:
+            sumry.own_callees = callees
+            sumry.own_literals = literals
+            s = self.summaries[key] = sumry
+        return s
 
 
 # def _extract_callnode_labels_in_calltree(call_tree, label_set):
@@ -100,22 +202,19 @@ class SummaryBuilder(object):
 #     return sort_uniq(label_set)
 
 
-def get_node_summary(node, summary_table, use_callnode_label_with_depth=False):
+def get_node_summary(node, summary_table, use_callnode_label_with_depth=False, intern_table=None):
     """
     Get summary of a node.
     In case of summary_table parameter given, calculate summary with memorization.
     Otherwise (without memorization), if two child nodes of a node is the same node,
     then calculate the summary twice (for each child node).
+    Summaries of call nodes are hash-consed with intern_table (SummaryInternTable),
+    which is created for the call unless given.
     """
 
     # summary_table = {}  # (ClzMethodSig, recursive_context) -> Summary
 
-    def intern_literals(lits, lits_pool):
-        for plits in lits_pool:
-            if plits == lits:
-                return plits
-        else:
-            return lits
+    intern_summary = (intern_table if intern_table is not None else SummaryInternTable()).intern
 
     stack = []
 
@@ -126,58 +225,68 @@ def get_node_summary(node, summary_table, use_callnode_label_with_depth=False):
     else:
         callnode_label = cb.callnode_label
 
-    def dig_node(node, parent_summary_builder, child_literals_holder):
-        if node is None:
-            return
-        elif isinstance(node, list):
-            n0 = node[0]
-            assert n0 in (ct.ORDERED_AND, ct.ORDERED_OR)
-            for subn in node[1:]:
-                dig_node(subn, parent_summary_builder, child_literals_holder)
-            return
-        elif isinstance(node, ct.CallNode):
-            invoked = node.invoked
-            lits = invoked.literals
-            lits and parent_summary_builder.extend_literal(lits)
-            lbl = callnode_label(node)
-            if lbl not in parent_summary_builder.already_appended_callnodes:
-                stack.append(lbl)
-                nodesum = summary_table.get(lbl)
-                if nodesum is None:
+    # The tree is traversed with an explicit work list, in order not to hit the recursion limit.
+    # An item of the work list is either of:
+    #   (node, parent_summary_builder)  # a node to be visited
+    #   (call_node_label, invoked, SummaryBuilder, parent_summary_builder)  # a call node whose body has been visited
+    def finish_call_node(lbl, invoked, nodesum, parent_summary_builder):
+        parent_summary_builder.append_summary(nodesum, lbl)
+        parent_summary_builder.append_callee(invoked.callee)
+        stack.pop()
+
+    def dig_node(node, parent_summary_builder):
+        work = [(node, parent_summary_builder)]
+        while work:
+            w = work.pop()
+            if len(w) == 4:
+                lbl, invoked, sb, parent_summary_builder = w
+                nodesum = intern_summary(sb.to_summary())
+                summary_table[lbl] = nodesum
+                finish_call_node(lbl, invoked, nodesum, parent_summary_builder)
+                continue  # while work
+            node, parent_summary_builder = w
+            if node is None:
+                pass
+            elif isinstance(node, list):
+                n0 = node[0]
+                assert n0 in (ct.ORDERED_AND, ct.ORDERED_OR)
+                for subn in reversed(node[1:]):
+                    work.append((subn, parent_summary_builder))
+            elif isinstance(node, ct.CallNode):
+                invoked = node.invoked
+                lits = invoked.literals
+                lits and parent_summary_builder.extend_literal(lits)
+                lbl = callnode_label(node)
+                if lbl not in parent_summary_builder.already_appended_callnodes:
+                    stack.append(lbl)
+                    nodesum = summary_table.get(lbl)
+                    if nodesum is not None:
+                        finish_call_node(lbl, invoked, nodesum, parent_summary_builder)
+                        continue  # while work
                     sb = SummaryBuilder()
-                    clh = []
+                    work.append((lbl, invoked, sb, parent_summary_builder))
                     subnode = node.body
                     if subnode is None:
                         pass
                     elif isinstance(subnode, (list, ct.CallNode)):
-                        dig_node(subnode, sb, clh)
+                        work.append((subnode, sb))
                     elif isinstance(subnode, ct.Invoked):
-                        sb.append_callee(intern(subnode.callee))
+                        sb.append_callee(jp.clzmsig_from_str(subnode.callee))
                         lits = subnode.literals
                         if lits:
                             sb.extend_literal(lits)
-                            clh.append(lits)
                     else:
                         assert False
-                    nodesum = sb.to_summary()
-                    nodesum.literals = intern_literals(nodesum.literals, clh)
-                    summary_table[lbl] = nodesum
-                parent_summary_builder.append_summary(nodesum, lbl)
-                parent_summary_builder.append_callee(invoked.callee)
-                child_literals_holder.append(nodesum.literals)
-                stack.pop()
-            return
-        elif isinstance(node, ct.Invoked):
-            parent_summary_builder.append_callee(intern(node.callee))
-            if node.literals:
-                parent_summary_builder.extend_literal(node.literals)
-                child_literals_holder.append(node.literals)
-        else:
-            assert False
+            elif isinstance(node, ct.Invoked):
+                parent_summary_builder.append_callee(jp.clzmsig_from_str(node.callee))
+                if node.literals:
+                    parent_summary_builder.extend_literal(node.literals)
+            else:
+                assert False
 
     try:
         sb = SummaryBuilder()
-        dig_node(node, sb, [])
+        dig_node(node, sb)
         sumry = sb.to_summary()
     except:
         sys.stderr.write("> warning: exception raised in get_node_summary:\n")
@@ -194,13 +303,190 @@ def node_summary_treecut(node):
     return get_node_summary(node, {}, use_callnode_label_with_depth=True)
 
 
-def extract_node_summary_table(nodes):
-    summary_table = {}  # (ClzMethodSig, recursive_context) -> Summary
+def extract_node_summary_table(nodes, summary_table=None):
+    """
+    Calculate summaries of call nodes in the given trees.
+    Summaries in the summary_table parameter, if given, are reused (e.g. ones of
+    call nodes that are reused in incremental rebuild of call trees).
+    Equal summaries are shared in the table, by hash-consing them through the whole run.
+    """
+
+    if summary_table is None:
+        summary_table = {}  # (ClzMethodSig, recursive_context) -> Summary
+    intern_table = SummaryInternTable()
     for node in nodes:
-        get_node_summary(node, summary_table)
+        get_node_summary(node, summary_table, intern_table=intern_table)
     return summary_table
 
 
+class InvertedIndex(object):
+    """
+    Inverted index of a node summary table, from callees and literals to the
+    summaries including them. A posting is a sorted list of indices of labels.
+    """
+
+    __slots__ = ('labels', 'callee_postings', 'literal_postings')
+
+    def __getstate__(self):
+        return self.labels, self.callee_postings, self.literal_postings
+
+    def __setstate__(self, tpl):
+        self.labels, self.callee_postings, self.literal_postings = tpl
+
+    def __init__(self, labels, callee_postings, literal_postings):
+        self.labels = labels  # list of (ClzMethodSig, recursive_context)
+        self.callee_postings = callee_postings  # ClzMethodSig -> list of int
+        self.literal_postings = literal_postings  # str -> list of int
+
+    def __eq__(self, other):
+        return isinstance(other, InvertedIndex) and \
+            self.labels == other.labels and \
+            self.callee_postings == other.callee_postings and \
+            self.literal_postings == other.literal_postings
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def _gen_term_sets_of_summaries(summaries):
+    """
+    Generates (summary, callee set, literal set) for each of the given summaries and
+    the ones shared by them, where a summary comes after its sub-summaries.
+    The sets of a summary are updated into the ones of the last parent which uses them,
+    rather than copied, so use the sets before getting the next item.
+    """
+
+    parent_counts = {}  # id of Summary -> count of summaries sharing it
+    post_order = []
+    visited = set()
+    for sumry in summaries:
+        work = [(sumry, False)]
+        while work:
+            s, subs_visited = work.pop()
+            if subs_visited:
+                post_order.append(s)
+                continue  # while work
+            if id(s) in visited:
+                continue  # while work
+            visited.add(id(s))
+            work.append((s, True))
+            for ss in s.sub_summaries:
+                parent_counts[id(ss)] = parent_counts.get(id(ss), 0) + 1
+                if id(ss) not in visited:
+                    work.append((ss, False))
+
+    term_sets = {}  # id of Summary -> (callee set, literal set), of summaries whose parents remain
+    for s in post_order:
+        # the largest sets of the sub-summaries which no other parents will use are reused
+        reused = None
+        for ss in s.sub_summaries:
+            if parent_counts[id(ss)] == 1 and \
+                    (reused is None or len(term_sets[id(ss)][0]) > len(term_sets[id(reused)][0])):
+                reused = ss
+        if reused is not None:
+            callees, literals = term_sets.pop(id(reused))
+        else:
+            callees, literals = set(), set()
+        callees.update(s.own_callees)
+        literals.update(s.own_literals)
+        for ss in s.sub_summaries:
+            c = parent_counts[id(ss)] = parent_counts[id(ss)] - 1
+            if ss is not reused:
+                sub_callees, sub_literals = term_sets[id(ss)] if c > 0 else term_sets.pop(id(ss))
+                callees.update(sub_callees)
+                literals.update(sub_literals)
+        yield s, callees, literals
+        if parent_counts.get(id(s)):
+            term_sets[id(s)] = callees, literals
+
+
+def build_inverted_index(node_summary_table):
+    """
+    Build an inverted index of a node summary table.
+    Labels are numbered in the order that the sets of callees and literals of their summaries
+    are made by merging the ones of sub-summaries, so that postings are sorted as they are made.
+    """
+
+    summaries = []
+    labels_of = {}  # id of Summary -> labels
+    for lbl in sorted(node_summary_table.iterkeys()):
+        sumry = node_summary_table[lbl]
+        lbls = labels_of.get(id(sumry))
+        if lbls is None:
+            lbls = labels_of[id(sumry)] = []
+            summaries.append(sumry)
+        lbls.append(lbl)
+
+    labels = []
+    callee_postings = {}
+    literal_postings = {}
+    for sumry, callees, literals in _gen_term_sets_of_summaries(summaries):
+        lbls = labels_of.get(id(sumry))
+        if lbls is None:
+            continue  # for sumry
+        if len(lbls) == 1:
+            i = len(labels)
+            for callee in callees:
+                callee_postings.setdefault(callee, []).append(i)
+            for lit in literals:
+                literal_postings.setdefault(lit, []).append(i)
+        else:
+            indices = range(len(labels), len(labels) + len(lbls))
+            for callee in callees:
+                callee_postings.setdefault(callee, []).extend(indices)
+            for lit in literals:
+                literal_postings.setdefault(lit, []).extend(indices)
+        labels.extend(lbls)
+    return InvertedIndex(labels, callee_postings, literal_postings)
+
+
+def trigrams_of(s):
+    """
+    Trigrams (substrings of length 3) of a string, in lower case.
+    """
+
+    s = s.lower()
+    return set(s[i:i + 3] for i in xrange(len(s) - 2))
+
+
+class TermTrigramIndex(object):
+    """
+    Trigram index of the terms (callees and literals) of an inverted index,
+    from a trigram in lower case to a sorted list of the terms including it.
+    """
+
+    __slots__ = ('callee_trigrams', 'literal_trigrams')
+
+    def __getstate__(self):
+        return self.callee_trigrams, self.literal_trigrams
+
+    def __setstate__(self, tpl):
+        self.callee_trigrams, self.literal_trigrams = tpl
+
+    def __init__(self, callee_trigrams, literal_trigrams):
+        self.callee_trigrams = callee_trigrams  # str -> list of ClzMethodSig
+        self.literal_trigrams = literal_trigrams  # str -> list of str
+
+    def __eq__(self, other):
+        return isinstance(other, TermTrigramIndex) and \
+            self.callee_trigrams == other.callee_trigrams and \
+            self.literal_trigrams == other.literal_trigrams
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+def build_term_trigram_index(inverted_index):
+    tables = []
+    for terms in (inverted_index.callee_postings.iterkeys(), inverted_index.literal_postings.iterkeys()):
+        trigram_to_terms = {}
+        for term in sorted(terms):
+            for tg in trigrams_of(term):
+                trigram_to_terms.setdefault(tg, []).append(term)
+        tables.append(trigram_to_terms)
+    return TermTrigramIndex(tables[0], tables[1])
+
+
 def extract_entry_points(call_trees):
     entry_points = []
     for call_tree in call_trees:
@@ -2,9 +2,8 @@
 
 import argparse
 import sys
-import pickle
 
-from _utilities import STDOUT, open_gziped_file_when_available
+from _utilities import STDOUT
 from . import _config as _c
 from . import jimp_parser as jp
 from . import jimp_code_term_extractor as jcte
@@ -13,12 +12,11 @@ from . import calltree as ct
 from . import calltree_summary as cs
 from ._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_NODE_SUMMARY, DATATAG_CALL_TREES
 from ._calltree_data_formatter import pretty_print_raw_data
+from ._index_file_format import load_index_data
 
 
 def pretty_print_raw_data_file(data_file, out=sys.stdout):
-    with open_gziped_file_when_available(data_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(data_file)
     pretty_print_raw_data(data, out)
 
 
@@ -59,9 +57,7 @@ def list_literals(soot_dir, output_file):
 
 
 def list_entry_points_from_node_summary(node_summary_file, output_file, option_method_sig=False):
-    with open_gziped_file_when_available(node_summary_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(node_summary_file)
     entry_points = data[DATATAG_ENTRY_POINTS]
 
     with open(output_file, "wb") as out:
@@ -73,9 +69,7 @@ def list_entry_points_from_node_summary(node_summary_file, output_file, option_m
 
 
 def list_methods_from_node_summary(node_summary_file, output_file):
-    with open_gziped_file_when_available(node_summary_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(node_summary_file, lazy=True)
     entry_points = data[DATATAG_ENTRY_POINTS]
     summary_table = data[DATATAG_NODE_SUMMARY]
     del data
@@ -86,8 +80,7 @@ def list_methods_from_node_summary(node_summary_file, output_file):
         for ep_w_rc in ep_with_possible_recursive_cxts:
             sumry = summary_table.get(ep_w_rc)
             if sumry:
-                sumry.literals = ()
-                sb.append_summary(sumry)
+                sb.extend_callee(sumry.callees)
     callees = sb.to_summary().callees
 
     with open(output_file, "wb") as out:
@@ -96,9 +89,7 @@ def list_methods_from_node_summary(node_summary_file, output_file):
 
 
 def list_literals_from_node_summary(node_summary_file, output_file):
-    with open_gziped_file_when_available(node_summary_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(node_summary_file, lazy=True)
     entry_points = data[DATATAG_ENTRY_POINTS]
     summary_table = data[DATATAG_NODE_SUMMARY]
     del data
@@ -109,8 +100,7 @@ def list_literals_from_node_summary(node_summary_file, output_file):
         for ep_w_rc in ep_with_possible_recursive_cxts:
             sumry = summary_table.get(ep_w_rc)
             if sumry:
-                sumry.callees = ()
-                sb.append_summary(sumry)
+                sb.extend_literal(sumry.literals)
     literals = sb.to_summary().literals
 
     with open(output_file, "wb") as out:
@@ -168,9 +158,7 @@ def measure_tree(node):
     return measure_tree_i(node)
 
 def get_calltree_staistics(call_tree_file, output_file):
-    with open_gziped_file_when_available(call_tree_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(call_tree_file)
     call_trees = data[DATATAG_CALL_TREES]
     #ce = data[DATATAG_ENTRY_POINTS]
     del data
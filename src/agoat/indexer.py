@@ -1,64 +1,131 @@
 #coding: utf-8
 
 import argparse
-import gzip
 import os
 import sys
-import pickle
 
-from _utilities import STDIN, STDOUT, open_gziped_file_when_available
+from _utilities import STDIN, STDOUT
 
 from . import _config as _c
 from . import jimp_parser as jp
 from . import calltree_builder as cb
 from . import calltree_summary as cs
 from . import src_linenumber_converter as slc
+from ._parse_cache import ParseCache
+from ._index_file_format import save_index_data, load_index_data
 from ._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_CALL_TREES, DATATAG_NODE_SUMMARY, DATATAG_LINENUMBER_TABLE
-
-
-def generate_call_trees(entry_point_classes, soot_dir, output_file):
-    class_table = dict((clz, cd) \
-            for clz, cd in jp.read_class_table_from_dir_iter(soot_dir))
+from ._calltree_data_formatter import DATATAG_PARSE_CACHE_RUN_ID, DATATAG_INVERTED_INDEX, DATATAG_TERM_TRIGRAMS
+
+
+def read_class_table(soot_dir, jobs=1, parse_cache=None):
+    if parse_cache is not None:
+        return parse_cache.read_class_table(soot_dir, jobs=jobs)
+    return dict((clz, cd) \
+            for clz, cd in jp.read_class_table_from_dir_iter(soot_dir, jobs=jobs))
+
+
+def load_prev_index_data(index_file, parse_cache):
+    """
+    Load index data generated in the previous run, which also saved the parse cache.
+    Returns None when such data is not available.
+    """
+
+    if parse_cache is None or parse_cache.prev_run_id is None:
+        return None
+    try:
+        data = load_index_data(index_file)
+    except (IOError, ValueError):
+        return None
+    if data.get(DATATAG_PARSE_CACHE_RUN_ID) != parse_cache.prev_run_id:
+        return None
+    return data
+
+
+def generate_call_trees(entry_point_classes, soot_dir, output_file, jobs=1, class_table=None,
+        parse_cache=None, incremental=False, reused_call_node_labels=None):
+    # class_table  # str -> ClassData, a parsed (not yet converted to and-or trees) one, if already read
+    if class_table is None:
+        class_table = read_class_table(soot_dir, jobs=jobs, parse_cache=parse_cache)
     entry_points = cb.find_entry_points(class_table, target_class_names=entry_point_classes)
 
-    class_table = cb.inss_to_tree_in_class_table(class_table)
-    call_trees = cb.extract_call_andor_trees(class_table, entry_points)
+    if parse_cache is not None:
+        class_table = parse_cache.inss_to_tree_in_class_table(class_table)
+    else:
+        class_table = cb.inss_to_tree_in_class_table(class_table)
+
+    prev_data = load_prev_index_data(output_file, parse_cache) if incremental else None
+    if prev_data is not None:
+        call_trees = cb.extract_call_andor_trees(class_table, entry_points,
+                prev_call_trees=prev_data[DATATAG_CALL_TREES], changed_classes=parse_cache.changed_classes,
+                reused_call_node_labels=reused_call_node_labels)
+    else:
+        call_trees = cb.extract_call_andor_trees(class_table, entry_points)
+    del prev_data
 
-    with gzip.open(output_file + ".gz", "wb") as out:
-        pickle.dump({DATATAG_CALL_TREES: call_trees, DATATAG_ENTRY_POINTS: entry_points}, out,
-                protocol=1)
+    data = {DATATAG_CALL_TREES: call_trees, DATATAG_ENTRY_POINTS: entry_points}
+    if parse_cache is not None:
+        data[DATATAG_PARSE_CACHE_RUN_ID] = parse_cache.run_id
+    save_index_data(output_file, data)
     return entry_points, call_trees
 
 
-def generate_node_summary(call_tree_file, output_file, call_trees_data=None):
+def generate_node_summary(call_tree_file, output_file, call_trees_data=None,
+        parse_cache=None, reused_call_node_labels=None):
     if call_trees_data is not None:
         entry_points, call_trees = call_trees_data
     else:
-        with open_gziped_file_when_available(call_tree_file, "rb") as inp:
-            # data = pickle.load(inp)  # very very slow in pypy
-            data = pickle.loads(inp.read())
+        data = load_index_data(call_tree_file)
         entry_points = data[DATATAG_ENTRY_POINTS]
         call_trees = data[DATATAG_CALL_TREES]
 
-    node_summary_table = cs.extract_node_summary_table(call_trees)
-
-    with gzip.open(output_file + ".gz", "wb") as out:
-        pickle.dump({DATATAG_NODE_SUMMARY: node_summary_table, DATATAG_ENTRY_POINTS: entry_points}, out,
-                protocol=1)
-
-
-def generate_linenumber_table(soot_dir, javap_dir, output_file):
-    assert os.path.isdir(soot_dir)
+    summary_table = None
+    if reused_call_node_labels:
+        prev_data = load_prev_index_data(output_file, parse_cache)
+        if prev_data is not None:
+            prev_table = prev_data[DATATAG_NODE_SUMMARY]
+            summary_table = dict((lbl, prev_table[lbl]) for lbl in reused_call_node_labels if lbl in prev_table)
+        del prev_data
+    node_summary_table = cs.extract_node_summary_table(call_trees, summary_table=summary_table)
+
+    inverted_index = cs.build_inverted_index(node_summary_table)
+    data = {DATATAG_NODE_SUMMARY: node_summary_table, DATATAG_ENTRY_POINTS: entry_points,
+            DATATAG_INVERTED_INDEX: inverted_index, DATATAG_TERM_TRIGRAMS: cs.build_term_trigram_index(inverted_index)}
+    if parse_cache is not None:
+        data[DATATAG_PARSE_CACHE_RUN_ID] = parse_cache.run_id
+    save_index_data(output_file, data, compress=False)  # to be mmap'ed by queries
+
+
+def generate_linenumber_table(soot_dir, javap_dir, output_file, jobs=1, class_table=None,
+        parse_cache=None):
     assert os.path.isdir(javap_dir)
 
-    class_table = dict((clz, cd) \
-            for clz, cd in jp.read_class_table_from_dir_iter(soot_dir))
+    if class_table is None:
+        assert os.path.isdir(soot_dir)
+        class_table = read_class_table(soot_dir, jobs=jobs, parse_cache=parse_cache)
     claz_msig2invocationindex2linenum = slc.make_invocationindex_to_src_linenum_table(javap_dir)
     clz_msig2conversion = slc.jimp_linnum_to_src_linenum_table(class_table, claz_msig2invocationindex2linenum)
 
-    with gzip.open(output_file + ".gz", "wb") as out:
-        pickle.dump({DATATAG_LINENUMBER_TABLE: clz_msig2conversion}, out,
-                protocol=1)
+    save_index_data(output_file, {DATATAG_LINENUMBER_TABLE: clz_msig2conversion})
+
+
+def add_jobs_argument(psr):
+    psr.add_argument('--jobs', action='store', type=int, metavar='N',
+            help="parse jimp files with N worker processes. (default 1)",
+            default=1)
+
+
+def add_parse_cache_argument(psr):
+    psr.add_argument('--parse-cache', action='store', nargs='?', metavar='FILE',
+            const=_c.default_parsecache_path,
+            help="reuse parsed jimp files of the previous run, which are stored in FILE. (default '%s')" % \
+                    _c.default_parsecache_path,
+            default=None)
+
+
+def add_incremental_argument(psr):
+    psr.add_argument('--incremental', action='store_true',
+            help="rebuild only call trees (and summaries) affected by classes changed since the previous run. requires --parse-cache",
+            default=False)
 
 
 def build_argument_parser(psr):
@@ -70,6 +137,9 @@ def build_argument_parser(psr):
     psr_index.add_argument("--progress", action='store_true',
             help="show progress to standard output",
             default=False)
+    add_jobs_argument(psr_index)
+    add_parse_cache_argument(psr_index)
+    add_incremental_argument(psr_index)
 
     psr_sl = subpsrs.add_parser('linenumber', help='generate line number table')
     psr_sl.add_argument('-s', '--soot-dir', action='store', help='soot directory', default=_c.default_soot_dir_path)
@@ -77,6 +147,8 @@ def build_argument_parser(psr):
     psr_sl.add_argument('-o', '--output', action='store',
             help="output file. (default '%s')" % _c.default_linenumbertable_path,
             default=_c.default_linenumbertable_path)
+    add_jobs_argument(psr_sl)
+    add_parse_cache_argument(psr_sl)
 
     psr_ct = subpsrs.add_parser('calltree', help='generate call tree')
     psr_ct.add_argument('-e', '--entry-point', action='store', nargs='*', dest='entrypointclasses',
@@ -85,6 +157,9 @@ def build_argument_parser(psr):
     psr_ct.add_argument('-o', '--output', action='store',
             help="output file. (default '%s')" % _c.default_calltree_path,
             default=_c.default_calltree_path)
+    add_jobs_argument(psr_ct)
+    add_parse_cache_argument(psr_ct)
+    add_incremental_argument(psr_ct)
 
     psr_gs = subpsrs.add_parser('nodesummary', help='generate node summary table')
     psr_gs.add_argument('-c', '--call-tree', action='store', help='call-tree file', default=_c.default_calltree_path)
@@ -98,22 +173,52 @@ def main(argv):
     build_argument_parser(psr)
 
     args = psr.parse_args(argv[1:])
-    if args.subcommand == 'linenumber':
-        generate_linenumber_table(args.soot_dir, args.javap_dir, args.output)
-    elif args.subcommand == 'calltree':
-        generate_call_trees(args.entrypointclasses, args.soot_dir, args.output)
-    elif args.subcommand == 'nodesummary':
-        generate_node_summary(args.call_tree, args.output)
-    elif args.subcommand == "all":
-        if args.progress:
-            sys.stderr.write("> generating/saving line number table\n")
-        generate_linenumber_table(args.soot_dir, args.javap_dir, _c.default_linenumbertable_path)
-        if args.progress:
-            sys.stderr.write("> generating/saving call trees\n")
-        call_trees_data = generate_call_trees(None, args.soot_dir, _c.default_calltree_path)
-        if args.progress:
-            sys.stderr.write("> generating/saving summary table\n")
-        generate_node_summary(_c.default_calltree_path, _c.default_summary_path,
-                call_trees_data=call_trees_data)
-    else:
-        assert False
+    if getattr(args, 'jobs', 1) < 1:
+        psr.error("--jobs should be a positive number")
+    if getattr(args, 'incremental', False) and not args.parse_cache:
+        psr.error("--incremental requires --parse-cache")
+    # signatures of the same method are shared within this indexing run, including the parse cache
+    with jp.clzmsig_interning():
+        parse_cache = None
+        if getattr(args, 'parse_cache', None):
+            parse_cache = ParseCache(args.parse_cache)
+            parse_cache.load()
+
+        if args.subcommand == 'linenumber':
+            generate_linenumber_table(args.soot_dir, args.javap_dir, args.output, jobs=args.jobs,
+                    parse_cache=parse_cache)
+        elif args.subcommand == 'calltree':
+            generate_call_trees(args.entrypointclasses, args.soot_dir, args.output, jobs=args.jobs,
+                    parse_cache=parse_cache, incremental=args.incremental)
+        elif args.subcommand == 'nodesummary':
+            generate_node_summary(args.call_tree, args.output)
+        elif args.subcommand == "all":
+            # the class table is parsed once and shared by the line-number table and call-tree stages,
+            # and the call trees are handed to the summary stage in memory
+            assert os.path.isdir(args.soot_dir)
+            if args.progress:
+                sys.stderr.write("> parsing jimp files\n")
+            class_table = read_class_table(args.soot_dir, jobs=args.jobs, parse_cache=parse_cache)
+            if args.progress:
+                sys.stderr.write("> generating/saving line number table\n")
+            generate_linenumber_table(args.soot_dir, args.javap_dir, _c.default_linenumbertable_path,
+                    class_table=class_table)
+            if args.progress:
+                sys.stderr.write("> generating/saving call trees\n")
+            reused_call_node_labels = set()
+            call_trees_data = generate_call_trees(None, args.soot_dir, _c.default_calltree_path,
+                    class_table=class_table, parse_cache=parse_cache, incremental=args.incremental,
+                    reused_call_node_labels=reused_call_node_labels)
+            del class_table
+            if args.progress:
+                if args.incremental:
+                    sys.stderr.write("> reused call nodes: %d\n" % len(reused_call_node_labels))
+                sys.stderr.write("> generating/saving summary table\n")
+            generate_node_summary(_c.default_calltree_path, _c.default_summary_path,
+                    call_trees_data=call_trees_data, parse_cache=parse_cache,
+                    reused_call_node_labels=reused_call_node_labels)
+        else:
+            assert False
+
+        if parse_cache is not None:
+            parse_cache.save()
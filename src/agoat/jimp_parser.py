@@ -1,8 +1,10 @@
 # coding: utf-8
 
+import contextlib
 import os
 import re
 import sys
+import multiprocessing
 
 from ._utilities import readline_iter
 from ._jimp_code_parser import parse_jimp_code
@@ -71,41 +73,120 @@ def _none_to_void(t):
 def _void_to_none(t):
     return t if t != 'void' else None
 
-def ClzMethodSig(clz, retv, name, params):
-    items = [clz, _none_to_void(retv), name]
-    assert None not in params
-    items.extend(params)
-    return '\t'.join(items)
+class ClzMethodSig(str):
+    """
+    A method signature with its class, represented as a tab-joined string of
+    class, return type, method name and parameter types.
+    The fields (clz, retv_str, method, params, methodsig, types, and fields,
+    the tab-separated items) are parsed once on creation and are read-only attributes
+    (a subtype of str can not have non-empty __slots__, so they are kept in the
+    instance dict). Within clzmsig_interning(), instances of the same signature are shared.
+    Plain strings of the same form (e.g. ones loaded from old index files)
+    are also accepted by the clzmsig_* functions.
+    """
+
+    def __new__(cls, clz, retv, name, params):
+        items = [clz, _none_to_void(retv), name]
+        assert None not in params
+        items.extend(params)
+        return clzmsig_from_str('\t'.join(items))
+
+    def __reduce__(self):
+        return (clzmsig_from_str, (str(self),))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ClzMethodSig is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ClzMethodSig is immutable")
+
+
+def _new_clzmsig(s):
+    clzmsig = str.__new__(ClzMethodSig, s)
+    fields = s.split('\t')
+    d = clzmsig.__dict__
+    d['fields'] = tuple(fields)
+    d['clz'] = fields[0]
+    d['retv_str'] = fields[1]
+    d['method'] = fields[2]
+    d['params'] = tuple(fields[3:])
+    d['methodsig'] = s[len(fields[0]) + 1:]
+    del fields[2]
+    d['types'] = tuple(fields)
+    return clzmsig
+
+
+_clzmsig_pool = None  # str -> ClzMethodSig, only while clzmsig_interning() is active
+
+
+@contextlib.contextmanager
+def clzmsig_interning():
+    """
+    Shares ClzMethodSig instances of the same signature while in the block
+    (e.g. building or loading an index). The pool is dropped at the end of
+    the outermost block, and the instances live as long as the data having them.
+    """
+    global _clzmsig_pool
+    outer_pool = _clzmsig_pool
+    if outer_pool is None:
+        _clzmsig_pool = {}
+    try:
+        yield
+    finally:
+        _clzmsig_pool = outer_pool
+
+
+def clzmsig_from_str(s):
+    if _clzmsig_pool is None:
+        return s if s.__class__ is ClzMethodSig else _new_clzmsig(s)
+    clzmsig = _clzmsig_pool.get(s)
+    if clzmsig is None:
+        clzmsig = s if s.__class__ is ClzMethodSig else _new_clzmsig(s)
+        _clzmsig_pool[clzmsig] = clzmsig
+    return clzmsig
+
+
+# The accessors read the parsed fields of a ClzMethodSig, and split a plain string
+# directly, not to create a ClzMethodSig on each call.
 
 def clzmsig_clz(clzmsig):
-    return clzmsig.split('\t')[0]
+    if clzmsig.__class__ is ClzMethodSig:
+        return clzmsig.clz
+    return clzmsig.split('\t', 1)[0]
 
 def clzmsig_retv(clzmsig):
-    return _void_to_none(clzmsig.split('\t')[1])
+    return _void_to_none(clzmsig_retv_str(clzmsig))
 
 def clzmsig_retv_str(clzmsig):
-    return clzmsig.split('\t')[1]
+    if clzmsig.__class__ is ClzMethodSig:
+        return clzmsig.retv_str
+    return clzmsig.split('\t', 2)[1]
 
 def clzmsig_method(clzmsig):
-    return clzmsig.split('\t')[2]
+    if clzmsig.__class__ is ClzMethodSig:
+        return clzmsig.method
+    return clzmsig.split('\t', 3)[2]
 
 def clzmsig_params(clzmsig):
-    return tuple(t for t in clzmsig.split('\t')[3:])
+    if clzmsig.__class__ is ClzMethodSig:
+        return clzmsig.params
+    return tuple(clzmsig.split('\t')[3:])
 
 def clzmsig_to_str(clzmsig):
-    return clzmsig
-
-def clzmsig_from_str(s):
-    return s
+    return str(clzmsig)
 
 def clzmsig_methodsig(clzmsig):
-    return '\t'.join(clzmsig.split('\t')[1:])
+    if clzmsig.__class__ is ClzMethodSig:
+        return clzmsig.methodsig
+    return clzmsig.split('\t', 1)[1]
 
 
 def types_in_clzmsig(clzmsig):
+    if clzmsig.__class__ is ClzMethodSig:
+        return clzmsig.types
     types = clzmsig.split('\t')
     del types[2]  # remove method name
-    return types
+    return tuple(types)
 
 
 OMITTED_PACKAGES = ["java.lang."]
@@ -274,15 +355,49 @@ def parse_jimp_lines(lines,
     return class_name, class_data
 
 
-def read_class_table_from_dir_iter(dirname):
-    files = sorted(os.listdir(dirname))
-    for f in files:
-        if f.endswith(".jimp"):
-            p = os.path.join(dirname, f)
-            lines = list(readline_iter(p))
-            r = parse_jimp_lines(lines)
-            if r is not None:
+def _parse_jimp_file_chunk(paths):
+    rs = []
+    for p in paths:
+        lines = list(readline_iter(p))
+        r = parse_jimp_lines(lines)
+        if r is not None:
+            rs.append(r)
+    return rs
+
+
+def read_class_table_from_files_iter(paths, jobs=1, chunk_size=None):
+    """
+    Parse jimp files and yield (class_name, ClassData) for each of them,
+    in the order of the given paths.
+    When jobs >= 2, files are parsed by a process pool. Each worker parses
+    a chunk of files and sends back the parsed (picklable) ClassData's.
+    """
+
+    if jobs is None or jobs <= 1 or len(paths) <= 1:
+        for r in _parse_jimp_file_chunk(paths):
+            yield r
+        return
+
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(paths) // (jobs * 4)))
+    chunks = [paths[i:i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for rs in pool.imap(_parse_jimp_file_chunk, chunks):
+            for r in rs:
                 yield r
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+def read_class_table_from_dir_iter(dirname, jobs=1):
+    files = sorted(os.listdir(dirname))
+    paths = [os.path.join(dirname, f) for f in files if f.endswith(".jimp")]
+    return read_class_table_from_files_iter(paths, jobs=jobs)
 
 
 def main(argv, out=sys.stdout):
@@ -1,11 +1,13 @@
 #coding: utf-8
 
 import argparse
+import collections
+import multiprocessing
 import os
 import sys
-import pickle
+import time
 
-from _utilities import sort_uniq, STDOUT, STDIN, open_gziped_file_when_available
+from _utilities import STDOUT, STDIN
 
 from . import _config as _c
 from . import andor_tree as at
@@ -13,76 +15,174 @@ from . import calltree as ct
 from . import calltree_summary as cs
 from . import calltree_builder as cb
 from . import calltree_query as cq
+from . import jimp_parser as jp
 from ._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_CALL_TREES, DATATAG_NODE_SUMMARY, DATATAG_LINENUMBER_TABLE
+from ._calltree_data_formatter import DATATAG_INVERTED_INDEX, DATATAG_TERM_TRIGRAMS
 from .jimp_parser import format_clzmsig
 from ._calltree_data_formatter import format_call_tree_node_compact, init_ansi_color
+from ._index_file_format import load_index_data, dumps_index_data, loads_index_data
+from ._query_protocol import encode_bytes, decode_bytes, request_query
+
+
+def gen_expander_of_call_tree_to_paths(query, deadline=None):
+    """
+    Returns a function, which enumerates lazily the paths of a call tree fulfilling the query.
+    In a path, each ORDERED_OR node is replaced with one of its alternatives, and invocations
+    not matching any query pattern are removed.
+    Branches are pruned by coverage of nodes (see extract_node_contribution), that is,
+    an alternative is not expanded when the patterns it covers, with the ones the other
+    parts of the path possibly cover, do not fulfill the query.
+    The enumeration stops when the time (time.time()) exceeds deadline, if given.
+    """
+
+    def timed_out():
+        return deadline is not None and time.time() > deadline
+
+    def repeated_call_node_positions(body):
+        # in a body, call nodes of the same label are expanded only at their first appearance.
+        # returns positions (id of list node, index) of the repeated ones.
+        positions = set()
+        if not isinstance(body, list):
+            return positions
+        labels = set()
+        stack = [[body, 1]]
+        while stack:
+            f = stack[-1]
+            node, i = f
+            if i >= len(node):
+                stack.pop()
+                continue  # while stack
+            f[1] = i + 1
+            subn = node[i]
+            if isinstance(subn, list):
+                stack.append([subn, 1])
+            elif isinstance(subn, ct.CallNode):
+                node_label = cb.callnode_label(subn)
+                if node_label in labels:
+                    positions.add((id(node), i))
+                else:
+                    labels.add(node_label)
+        return positions
 
-
-def gen_expander_of_call_tree_to_paths(query):
     def expand_call_tree_to_paths(node):
-        def expand_i(node, memo):
+        node_id_to_coverage = {}
+        cq.extract_node_contribution(node, query, node_id_to_coverage)
+
+        # A body context is a tuple (positions of repeated call nodes in the body being expanded,
+        # dict from ids of nodes in the body to whether each of the nodes has paths).
+        def new_body_context(body):
+            return repeated_call_node_positions(body), {}
+
+        def sub_nodes(node, body_cxt):
+            skipped = body_cxt[0]
+            return [subn for i, subn in enumerate(node) if i > 0 and (id(node), i) not in skipped]
+
+        def has_paths(node, body_cxt):
+            if isinstance(node, list):
+                memo = body_cxt[1]
+                r = memo.get(id(node))
+                if r is None:
+                    r = memo[id(node)] = any(has_paths(subn, body_cxt) for subn in sub_nodes(node, body_cxt))
+                return r
+            elif isinstance(node, ct.CallNode):
+                return True
+            elif isinstance(node, ct.Invoked):
+                return node_id_to_coverage[id(node)] != 0
+            return False
+
+        def invoked_key(invoked):
+            return invoked.cmd, invoked.callee, invoked.literals, invoked.locinfo
+
+        # A path is generated as a tuple (list of nodes, bitset of query patterns matched in the nodes,
+        # key of the path). The key is a hashable value equal for equal paths, to skip duplicated paths
+        # generated from alternatives of an ORDERED_OR node.
+        # Parameter outside is a bitset of query patterns possibly matched by the other parts of a path.
+        def gen_paths(node, outside, body_cxt):
+            if not query.is_fulfilled_by_mask(node_id_to_coverage[id(node)] | outside):
+                return
             if isinstance(node, list):
                 assert node
                 n0 = node[0]
+                subnodes = [subn for subn in sub_nodes(node, body_cxt) if has_paths(subn, body_cxt)]
                 if n0 == ct.ORDERED_OR:
-                    paths = []
-                    for subn in node[1:]:
-                        ps = expand_i(subn, memo)
-                        if ps is not None:
-                            paths.extend(ps)
-                    if not paths:
-                        return None
-                    paths = sort_uniq(paths)
-                    return paths
+                    generated_keys = set()
+                    for subn in subnodes:
+                        for pmk in gen_paths(subn, outside, body_cxt):
+                            if pmk[2] not in generated_keys:
+                                generated_keys.add(pmk[2])
+                                yield pmk
                 elif n0 == ct.ORDERED_AND:
-                    if len(node) == 1:
-                        return None
-                    pathssubs = []
-                    for subn in node[1:]:
-                        paths = expand_i(subn, memo)
-                        if paths is not None:
-                            pathssubs.append(paths)
-                    if not pathssubs:
-                        return None
-                    paths = [[]]
-                    for pathssub in pathssubs:
-                        new_paths = []
-                        for path in paths:
-                            for p in pathssub:
-                                new_path = path[:] + p
-                                new_paths.append(new_path)
-                        paths = new_paths
-                        #paths = [(path[:] + p) for path in paths for p in pathssub]
-                    return paths
+                    for pmk in gen_path_products(subnodes, outside, body_cxt):
+                        yield pmk
             elif isinstance(node, ct.CallNode):
-                node_label = cb.callnode_label(node)
-                paths = memo.get(node_label)
-                if paths is None:
-                    if node.body:
-                        body_paths = expand_i(node.body, {})
-                        if body_paths:
-                            paths = []
-                            for bp in body_paths:
-                                nbp = at.normalize_tree([ct.ORDERED_AND] + bp)
-                                paths.append([ct.CallNode(node.invoked, node.recursive_cxt, nbp)])
-                        else:
-                            paths = [[ct.CallNode(node.invoked, node.recursive_cxt, None)]]
-                    else:
-                        paths = [[node]]
-                    memo[node_label] = paths[:]
-                    return paths
+                invoked = node.invoked
+                mask = node_id_to_coverage[id(invoked)]
+                ik = invoked_key(invoked)
+                body = node.body
+                if body:
+                    bcxt = new_body_context(body)
+                    if has_paths(body, bcxt):
+                        for bp, bmask, bkey in gen_paths(body, outside | mask, bcxt):
+                            nbp = at.normalize_tree([ct.ORDERED_AND] + bp)
+                            yield [ct.CallNode(invoked, node.recursive_cxt, nbp)], mask | bmask, \
+                                ((ik, node.recursive_cxt, bkey),)
+                        return
+                    if query.is_fulfilled_by_mask(mask | outside):
+                        yield [ct.CallNode(invoked, node.recursive_cxt, None)], mask, ((ik, node.recursive_cxt, None),)
+                elif query.is_fulfilled_by_mask(mask | outside):
+                    yield [node], mask, ((ik, node.recursive_cxt, None),)
             elif isinstance(node, ct.Invoked):
-                if query.has_matching_pattern_in(node.callee, node.literals):
-                    return [[node]]
-                return None
+                mask = node_id_to_coverage[id(node)]
+                if mask:
+                    yield [node], mask, (invoked_key(node),)
             else:
                 assert False
 
-        paths = expand_i(node, {})
-        paths = sort_uniq(paths)
-        paths = [at.normalize_tree([ct.ORDERED_AND] + path) for path in paths]
-        paths = [path for path in paths if query.is_fulfilled_by(cs.node_summary_treecut(path))]
-        return paths
+        def gen_path_products(subnodes, outside, body_cxt):
+            # cartesian product of paths of sub-nodes, each of which has paths.
+            # enumerated as an odometer (the last sub-node changes fastest), not to keep all paths in memory.
+            if not subnodes:
+                return
+            covs = [node_id_to_coverage[id(subn)] for subn in subnodes]
+            outsides = []
+            for i in xrange(len(subnodes)):
+                o = outside
+                for j, c in enumerate(covs):
+                    if j != i:
+                        o |= c
+                outsides.append(o)
+            gens = [gen_paths(subn, o, body_cxt) for subn, o in zip(subnodes, outsides)]
+            cur = [next(g, None) for g in gens]
+            if None in cur:
+                return  # paths of some sub-node are all pruned
+            while not timed_out():
+                path = []
+                mask = 0
+                key = ()
+                for p, m, k in cur:
+                    path.extend(p)
+                    mask |= m
+                    key += k
+                if query.is_fulfilled_by_mask(mask | outside):
+                    yield path, mask, key
+                i = len(gens) - 1
+                while i >= 0:
+                    pmk = next(gens[i], None)
+                    if pmk is not None:
+                        cur[i] = pmk
+                        break  # while i
+                    gens[i] = gen_paths(subnodes[i], outsides[i], body_cxt)
+                    pmk = next(gens[i], None)
+                    if pmk is None:
+                        return  # timed out
+                    cur[i] = pmk
+                    i -= 1
+                if i < 0:
+                    return
+
+        for path, mask, _ in gen_paths(node, 0, new_body_context(None)):
+            if query.is_fulfilled_by_mask(mask):
+                yield at.normalize_tree([ct.ORDERED_AND] + path)
 
     return expand_call_tree_to_paths
 
@@ -111,20 +211,192 @@ def remove_outermost_loc_info(call_node):
             call_node.recursive_cxt, call_node.body)
 
 
-def search_in_call_trees(query, call_trees, node_summary_table, max_depth,
-        removed_nodes_becauseof_limitation_of_depth=None):
-    if removed_nodes_becauseof_limitation_of_depth:
+def _search_predicate(query, node_summary_table, inverted_index=None, term_trigram_index=None):
+    if inverted_index is not None:
+        return cq.gen_callnode_fulfills_query_predicate_w_inverted_index(query, inverted_index, term_trigram_index)
+    else:
+        return cq.gen_callnode_fulfills_query_predicate_w_memo(query, node_summary_table)
+
+
+def gen_search_results(query, call_trees, node_summary_table, max_depth,
+        removed_nodes_becauseof_limitation_of_depth=None, inverted_index=None, term_trigram_index=None):
+    """
+    Generates call nodes fulfilling the query, each as the shallowest tree cut of a lower-bound
+    call node without recursive contexts, as soon as it is found.
+    removed_nodes_becauseof_limitation_of_depth[0] is updated with count of the lower-bound call nodes
+    whose tree cuts exceed max_depth.
+    """
+
+    if removed_nodes_becauseof_limitation_of_depth is None:
         removed_nodes_becauseof_limitation_of_depth = [None]
-    pred = cq.gen_callnode_fulfills_query_predicate_w_memo(query, node_summary_table)
-    call_nodes = cq.get_lower_bound_call_nodes(call_trees, pred)
+    removed_nodes_becauseof_limitation_of_depth[0] = 0
+    pred = _search_predicate(query, node_summary_table, inverted_index, term_trigram_index)
+
+    label_to_generateds = {}
+    for call_node in cq.gen_lower_bound_call_nodes(call_trees, pred):
+        shallower = cq.extract_shallowest_treecut(call_node, query, max_depth)
+        if shallower is None:
+            removed_nodes_becauseof_limitation_of_depth[0] += 1
+            continue  # for call_node
+        contextless = remove_outermost_loc_info(remove_recursive_contexts(shallower))
+        same_labels = label_to_generateds.setdefault(cb.callnode_label(contextless), [])
+        if contextless not in same_labels:
+            same_labels.append(contextless)
+            yield contextless
 
-    shallowers = list(filter(None, (cq.extract_shallowest_treecut(call_node, query, max_depth) for call_node in call_nodes)))
-    removed_nodes_becauseof_limitation_of_depth[0] = len(call_nodes) - len(shallowers)
 
-    contextlesses = [remove_outermost_loc_info(remove_recursive_contexts(cn)) for cn in shallowers]
-    call_node_wo_rcs = sort_uniq(contextlesses, key=cb.callnode_label)
+def search_in_call_trees(query, call_trees, node_summary_table, max_depth,
+        removed_nodes_becauseof_limitation_of_depth=None, inverted_index=None, term_trigram_index=None):
+    nodes = gen_search_results(query, call_trees, node_summary_table, max_depth,
+            removed_nodes_becauseof_limitation_of_depth=removed_nodes_becauseof_limitation_of_depth,
+            inverted_index=inverted_index, term_trigram_index=term_trigram_index)
+    return sorted(nodes, key=cb.callnode_label)
+
+
+# arguments of gen_search_results_in_parallel, inherited by the forked worker processes
+_shared_search_arguments = None
+
+
+def _search_in_call_tree_shard(call_tree_indices):
+    query, call_trees, node_summary_table, max_depth, inverted_index, term_trigram_index = _shared_search_arguments
+    pred = _search_predicate(query, node_summary_table, inverted_index, term_trigram_index)
+
+    # (index of call tree, label of lower-bound call node, index of its tree cut or -1 when exceeding max_depth)
+    founds = []
+    treecuts = []
+    already_searched_call_node_labels = set()
+    for i in call_tree_indices:
+        for call_node in cq.gen_lower_bound_call_nodes([call_trees[i]], pred, already_searched_call_node_labels):
+            shallower = cq.extract_shallowest_treecut(call_node, query, max_depth)
+            if shallower is None:
+                founds.append((i, cb.callnode_label(call_node), -1))
+                continue  # for call_node
+            founds.append((i, cb.callnode_label(call_node), len(treecuts)))
+            treecuts.append(remove_outermost_loc_info(remove_recursive_contexts(shallower)))
+    # tree cuts are sent back in the index file format, which shares sub-trees and has no recursion limit
+    return founds, dumps_index_data({DATATAG_CALL_TREES: treecuts}, compress=False)
+
+
+def gen_search_results_in_parallel(query, call_trees, node_summary_table, max_depth, jobs,
+        removed_nodes_becauseof_limitation_of_depth=None, inverted_index=None, term_trigram_index=None):
+    """
+    Same as gen_search_results, but the call trees (entry points) are sharded to jobs worker processes.
+    The workers are forked, so they share the index (including mmap'ed views) with this process
+    without copying. The results are generated after all of the workers finish,
+    in the same order as gen_search_results, so they do not depend on jobs.
+    """
+
+    if jobs is None or jobs <= 1 or len(call_trees) <= 1 or not hasattr(os, 'fork'):
+        for node in gen_search_results(query, call_trees, node_summary_table, max_depth,
+                removed_nodes_becauseof_limitation_of_depth=removed_nodes_becauseof_limitation_of_depth,
+                inverted_index=inverted_index, term_trigram_index=term_trigram_index):
+            yield node
+        return
 
-    return call_node_wo_rcs
+    global _shared_search_arguments
+    if removed_nodes_becauseof_limitation_of_depth is None:
+        removed_nodes_becauseof_limitation_of_depth = [None]
+    removed_nodes_becauseof_limitation_of_depth[0] = 0
+
+    # round-robin shards, a few per worker, so that large call trees are spread over the workers
+    shard_count = min(len(call_trees), jobs * 4)
+    shards = [range(i, len(call_trees), shard_count) for i in range(shard_count)]
+    call_tree_index_to_founds = {}
+    _shared_search_arguments = (query, call_trees, node_summary_table, max_depth, inverted_index, term_trigram_index)
+    pool = multiprocessing.Pool(jobs)
+    try:
+        for founds, b in pool.imap(_search_in_call_tree_shard, shards):
+            treecuts = loads_index_data(b)[DATATAG_CALL_TREES]
+            for i, lower_label, tci in founds:
+                call_tree_index_to_founds.setdefault(i, []).append((lower_label, treecuts[tci] if tci >= 0 else None))
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _shared_search_arguments = None
+
+    # replay the search in the order of call trees. a lower-bound call node found in a call tree
+    # has been found in a former call tree, in case its label has been, as gen_lower_bound_call_nodes skips it
+    found_lower_labels = set()
+    label_to_generateds = {}
+    for i in sorted(call_tree_index_to_founds.iterkeys()):
+        for lower_label, contextless in call_tree_index_to_founds[i]:
+            if lower_label in found_lower_labels:
+                continue  # for lower_label
+            found_lower_labels.add(lower_label)
+            if contextless is None:
+                removed_nodes_becauseof_limitation_of_depth[0] += 1
+                continue  # for lower_label
+            same_labels = label_to_generateds.setdefault(cb.callnode_label(contextless), [])
+            if contextless not in same_labels:
+                same_labels.append(contextless)
+                yield contextless
+
+
+def treecut_size(node):
+    # count of invocations (call nodes and invoked nodes) in a tree cut
+    size = 0
+    work = [node]
+    while work:
+        node = work.pop()
+        if isinstance(node, list):
+            work.extend(node[1:])
+        elif isinstance(node, ct.CallNode):
+            size += 1
+            work.append(node.body)
+        elif isinstance(node, ct.Invoked):
+            size += 1
+    return size
+
+
+def search_top_in_call_trees(query, call_trees, node_summary_table, max_depth, top,
+        removed_nodes_becauseof_limitation_of_depth=None, inverted_index=None, term_trigram_index=None):
+    """
+    Returns the best top call nodes found by search_in_call_trees, ranked by depth and then
+    size of their tree cuts (smaller is better).
+    Shallowest tree cuts of the lower-bound call nodes are searched a depth at a time,
+    for all of the call nodes in parallel, and the search stops when top call nodes are found,
+    because the remaining call nodes need deeper tree cuts.
+    The depth of 1 is checked for each lower-bound call node as soon as it is generated.
+    (All of them are visited at the depth, as any of them may have the shallowest tree cut.)
+    """
+
+    if removed_nodes_becauseof_limitation_of_depth is None:
+        removed_nodes_becauseof_limitation_of_depth = [None]
+    pred = _search_predicate(query, node_summary_table, inverted_index, term_trigram_index)
+
+    found = []  # (depth, size, label, contextless call node)
+    found_count = 0
+    label_to_founds = {}
+    not_found_count = 0
+    searching = ((cn, cq.gen_treecut_depth_checks(cn, query, max_depth))
+            for cn in cq.gen_lower_bound_call_nodes(call_trees, pred))
+    while searching and found_count < top:
+        next_searching = []
+        for call_node, depth_checks in searching:
+            dc = next(depth_checks, None)
+            if dc is None:
+                not_found_count += 1
+                continue  # for call_node
+            depth, fulfilled = dc
+            if not fulfilled:
+                next_searching.append((call_node, depth_checks))
+                continue  # for call_node
+            tc = cq.treecut_with_callnode_depth(call_node, depth)
+            contextless = remove_outermost_loc_info(remove_recursive_contexts(tc))
+            label = cb.callnode_label(contextless)
+            same_labels = label_to_founds.setdefault(label, [])
+            if contextless not in same_labels:
+                same_labels.append(contextless)
+                found.append((depth, treecut_size(contextless), label, contextless))
+                found_count += 1
+        searching = next_searching
+    removed_nodes_becauseof_limitation_of_depth[0] = not_found_count
+
+    found.sort(key=lambda f: f[:3])
+    return [f[3] for f in found[:top]]
 
 
 def remove_uncontributing_nodes(node, node_id_to_cont):
@@ -156,32 +428,45 @@ def remove_uncontributing_nodes(node, node_id_to_cont):
     return remove_i(node)
 
 
-def do_search(call_tree_file, node_summary_file, query_words, ignore_case_query_words, output_file, line_number_table=None, 
-        max_depth=-1, output_form='path', fully_qualified_package_name=False, ansi_color=False,
-        show_progress=False):
-    log = sys.stderr.write if show_progress else None
-
+def build_query(query_words, ignore_case_query_words):
     cq.check_query_word_list(query_words)
     query_patterns = []
     for w in query_words:
         query_patterns.append(cq.compile_query(w))
     for w in ignore_case_query_words:
         query_patterns.append(cq.compile_query(w, ignore_case=True))
-    query = cq.Query(query_patterns)
+    return cq.Query(query_patterns)
+
+
+SearchIndex = collections.namedtuple('SearchIndex',
+        'call_trees node_summary_table inverted_index term_trigram_index clz_msig2conversion')
 
+
+def load_index(call_tree_file, node_summary_file, line_number_table=None, log=None):
+    """
+    Load index data for searching, as a SearchIndex.
+    Its inverted_index and term_trigram_index are None when the summary file does not
+    have them (that is, generated by older versions), and clz_msig2conversion is None
+    when line_number_table is not given.
+    """
+
+    # signatures are shared among the call trees, the summary table and the line-number table
+    with jp.clzmsig_interning():
+        return _load_index(call_tree_file, node_summary_file, line_number_table, log)
+
+
+def _load_index(call_tree_file, node_summary_file, line_number_table, log):
     log and log("> loading call trees\n")
-    with open_gziped_file_when_available(call_tree_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(call_tree_file)
     call_trees = data[DATATAG_CALL_TREES]
     ce = data[DATATAG_ENTRY_POINTS]
     del data
 
     log and log("> loading summary table\n")
-    with open_gziped_file_when_available(node_summary_file, "rb") as inp:
-        # data = pickle.load(inp)  # very very slow in pypy
-        data = pickle.loads(inp.read())
+    data = load_index_data(node_summary_file, lazy=True)
     node_summary_table = data[DATATAG_NODE_SUMMARY]
+    inverted_index = data.get(DATATAG_INVERTED_INDEX)
+    term_trigram_index = data.get(DATATAG_TERM_TRIGRAMS)
     ne = data[DATATAG_ENTRY_POINTS]
     del data
     if ce != ne:
@@ -189,69 +474,147 @@ def do_search(call_tree_file, node_summary_file, query_words, ignore_case_query_
 
     clz_msig2conversion = None
     if line_number_table is not None:
-        with open_gziped_file_when_available(line_number_table, "rb") as inp:
-            # data = pickle.load(inp)  # very very slow in pypy
-            data = pickle.loads(inp.read())
-            clz_msig2conversion = data[DATATAG_LINENUMBER_TABLE]
+        data = load_index_data(line_number_table)
+        clz_msig2conversion = data[DATATAG_LINENUMBER_TABLE]
         del data
 
+    return SearchIndex(call_trees, node_summary_table, inverted_index, term_trigram_index, clz_msig2conversion)
+
+
+class _OpenOutput(object):
+    # opens output, a file name, on entering. when output is a file object, just uses it.
+    def __init__(self, output):
+        self.output = output
+        self.f = None
+
+    def __enter__(self):
+        if isinstance(self.output, basestring):
+            self.f = open(self.output, "wb")
+            return self.f
+        return self.output
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.f is not None:
+            self.f.close()
+
+
+def search_and_write(query, index, output, max_depth=-1, output_form='path',
+        fully_qualified_package_name=False, ansi_color=False, log=None, warn=None,
+        max_paths=-1, timeout=None, top=None, jobs=1):
+    """
+    Search query in index, a SearchIndex returned by load_index, and write the found code to output,
+    a file name or a file object. warn is a function to show warnings (default sys.stderr.write).
+    In path output form, paths are written as soon as found, up to max_paths paths
+    (-1 for unlimited) and until timeout seconds pass (None for unlimited).
+    In case of top given, only the best top call nodes are written, in the order of
+    ranking by search_top_in_call_trees, and jobs is ignored (with a warning).
+    In case of jobs >= 2 (and top not given), the search is done by gen_search_results_in_parallel,
+    and the results are written, in the same order, after all of them are found.
+    """
+
+    clz_msig2conversion = index.clz_msig2conversion
+    warn = warn or sys.stderr.write
+
     log and log("> searching query in index\n")
     removed_nodes_becauseof_limitation_of_depth = [None]
-    nodes = search_in_call_trees(query, call_trees, node_summary_table, max_depth, 
-            removed_nodes_becauseof_limitation_of_depth=removed_nodes_becauseof_limitation_of_depth)
+    search_args = (query, index.call_trees, index.node_summary_table, max_depth)
+    search_kwargs = dict(removed_nodes_becauseof_limitation_of_depth=removed_nodes_becauseof_limitation_of_depth,
+            inverted_index=index.inverted_index, term_trigram_index=index.term_trigram_index)
+    if top is not None:
+        if jobs is not None and jobs >= 2:
+            warn("> warning: --jobs is ignored with --top.\n")
+        nodes = search_top_in_call_trees(*search_args, top=top, **search_kwargs)
+    elif jobs is not None and jobs >= 2:
+        nodes = gen_search_results_in_parallel(*search_args, jobs=jobs, **search_kwargs)
+    elif output_form == 'callnode':
+        nodes = search_in_call_trees(*search_args, **search_kwargs)
+    else:
+        nodes = gen_search_results(*search_args, **search_kwargs)  # results are written as soon as found
 
     if output_form == 'callnode':
         clzmsigs = [n.invoked.callee for n in nodes]
-        clzmsigs.sort()
-        with open(output_file, "wb") as out:
+        if top is None:
+            clzmsigs.sort()
+        with _OpenOutput(output) as out:
             for cm in clzmsigs:
                 out.write('%s\n' % format_clzmsig(cm))
         return
 
-    if not nodes:
-        if removed_nodes_becauseof_limitation_of_depth[0] > 0:
-            sys.stderr.write("> warning: all found code exceeds max call-tree depth." +
-                    " give option -d explicitly to show these code.\n")
-        return
-
-    for ni in range(len(nodes)):
-        node = nodes[ni]
-        node_id_to_cont = cq.extract_node_contribution(node, query)
-        nodes[ni] = remove_uncontributing_nodes(node, node_id_to_cont)
-
-    if output_form == 'treecut':
-        with open(output_file, "wb") as out:
-            for node in nodes:
+    assert output_form in ('treecut', 'path')
+    if output_form == 'path':
+        deadline = time.time() + timeout if timeout is not None else None
+        expand_call_tree_to_paths = gen_expander_of_call_tree_to_paths(query, deadline)
+    node_count = 0
+    path_count = 0
+    count_removed_path_becauseof_not_fulfilling_query = 0
+    output_opener = _OpenOutput(output)
+    out = None  # opened when the first result is found
+    try:
+        for node in nodes:
+            node_count += 1
+            node_id_to_cont = cq.extract_node_contribution(node, query)
+            node = remove_uncontributing_nodes(node, node_id_to_cont)
+
+            if output_form == 'treecut':
+                if out is None:
+                    out = output_opener.__enter__()
                 out.write("---\n")
                 format_call_tree_node_compact(node, out, query,
                         clz_msig2conversion=clz_msig2conversion, 
                         fully_qualified_package_name=fully_qualified_package_name, 
                         ansi_color=ansi_color)
+                out.flush()
+                continue  # for node
+
+            if node_count == 1:
+                log and log("> printing results\n")
+            found = False
+            for pn in expand_call_tree_to_paths(node):
+                found = True
+                if out is None:
+                    out = output_opener.__enter__()
+                out.write("---\n")
+                format_call_tree_node_compact(pn, out, query,
+                        clz_msig2conversion=clz_msig2conversion,
+                        fully_qualified_package_name=fully_qualified_package_name, 
+                        ansi_color=ansi_color)
+                out.flush()
+                path_count += 1
+                if 0 <= max_paths <= path_count:
+                    break  # for pn
+            if 0 <= max_paths <= path_count:
+                warn("> warning: output is limited to %d paths (--max-paths).\n" % max_paths)
+                break  # for node
+            if deadline is not None and time.time() > deadline:
+                warn("> warning: path expansion timed out (--timeout). the output may be incomplete.\n")
+                break  # for node
+            if not found:
+                count_removed_path_becauseof_not_fulfilling_query += 1
+    finally:
+        if out is not None:
+            output_opener.__exit__(None, None, None)
+
+    if node_count == 0:
+        if removed_nodes_becauseof_limitation_of_depth[0] > 0:
+            warn("> warning: all found code exceeds max call-tree depth." +
+                    " give option -d explicitly to show these code.\n")
         return
-
-    assert output_form == 'path'
-    log and log("> printing results\n")
-    expand_call_tree_to_paths = gen_expander_of_call_tree_to_paths(query)
-    path_nodes = []
-    count_removed_path_becauseof_not_fulfilling_query = 0
-    for node in nodes:
-        pns = expand_call_tree_to_paths(node)
-        if not pns:
-            count_removed_path_becauseof_not_fulfilling_query += 1
-        path_nodes.extend(pns)
-    if not path_nodes:
+    if output_form == 'path' and path_count == 0:
         if count_removed_path_becauseof_not_fulfilling_query > 0:
-            sys.stderr.write("> warning: no found paths includes all query words." +
+            warn("> warning: no found paths includes all query words." +
                     " use '-f treecut' to show them as treecut, not as path.\n")
-        return
 
-    with open(output_file, "wb") as out:
-        for pn in path_nodes:
-            out.write("---\n")
-            format_call_tree_node_compact(pn, out, query,
-                    clz_msig2conversion=clz_msig2conversion,
-                    fully_qualified_package_name=fully_qualified_package_name, 
-                    ansi_color=ansi_color)
+
+def do_search(call_tree_file, node_summary_file, query_words, ignore_case_query_words, output_file, line_number_table=None, 
+        max_depth=-1, output_form='path', fully_qualified_package_name=False, ansi_color=False,
+        show_progress=False, max_paths=-1, timeout=None, top=None, jobs=1):
+    log = sys.stderr.write if show_progress else None
+
+    query = build_query(query_words, ignore_case_query_words)
+    index = load_index(call_tree_file, node_summary_file, line_number_table, log=log)
+    search_and_write(query, index, output_file, max_depth=max_depth, output_form=output_form,
+            fully_qualified_package_name=fully_qualified_package_name, ansi_color=ansi_color, log=log,
+            max_paths=max_paths, timeout=timeout, top=top, jobs=jobs)
 
 
 def build_argument_parser(psr):
@@ -273,6 +636,18 @@ def build_argument_parser(psr):
             default=_c.default_max_depth_of_subtree)
     psr.add_argument('-f', '--output-form', choices=('callnode', 'treecut', 'path'), 
             default='treecut')
+    psr.add_argument('--max-paths', action='store', type=int,
+            help="max count of paths to output in '-f path'. -1 for unlimited. (default '-1')",
+            default=-1)
+    psr.add_argument('--timeout', action='store', type=float,
+            help="stop expanding paths in '-f path' after the seconds.",
+            default=None)
+    psr.add_argument('--top', action='store', type=int,
+            help="output only the best K results, ranked by depth and size of tree cut.",
+            metavar='K', default=None)
+    psr.add_argument('--jobs', action='store', type=int, metavar='N',
+            help="search call trees with N worker processes. not available with --top, ignored with --server. (default 1)",
+            default=1)
     color_choices=('always', 'never', 'auto')
     psr.add_argument('--color', '--colour', action='store', choices=color_choices, dest='color', 
             help="hilighting with ANSI color.",
@@ -281,6 +656,36 @@ def build_argument_parser(psr):
     psr.add_argument("--progress", action='store_true',
             help="show progress to stderr",
             default=False)
+    psr.add_argument('--server', action='store', nargs='?', const=_c.default_server_socket_path,
+            help="send query to a query server (ags.py serve) listening at the socket, instead of loading index files." +
+                " options -c, -n and -l are ignored. (default '%s')" % _c.default_server_socket_path,
+            default=None)
+
+
+def query_to_server(socket_path, query_words, ignore_case_query_words, output_file,
+        max_depth=-1, output_form='path', fully_qualified_package_name=False, ansi_color=False,
+        max_paths=-1, timeout=None, top=None):
+    request = {
+        "query_words": [encode_bytes(w) for w in query_words],
+        "ignore_case_query_words": [encode_bytes(w) for w in ignore_case_query_words],
+        "max_depth": max_depth,
+        "output_form": output_form,
+        "fully_qualified_package_name": fully_qualified_package_name,
+        "ansi_color": ansi_color,
+        "max_paths": max_paths,
+        "timeout": timeout,
+        "top": top,
+    }
+    response = request_query(socket_path, request)
+    if response["error"]:
+        raise ValueError(response["error"])
+    warnings = decode_bytes(response["warnings"])
+    if warnings:
+        sys.stderr.write(warnings)
+    output = decode_bytes(response["output"])
+    if output:
+        with open(output_file, "wb") as out:
+            out.write(output)
 
 
 def main(argv):
@@ -288,6 +693,14 @@ def main(argv):
     build_argument_parser(psr)
 
     args = psr.parse_args(argv[1:])
+    if args.jobs < 1:
+        psr.error("--jobs should be a positive number")
+    if args.max_paths < 1 and args.max_paths != -1:
+        psr.error("--max-paths should be a positive number or -1")
+    if args.top is not None and args.top < 1:
+        psr.error("--top should be a positive number")
+    if args.top is not None and args.jobs >= 2:
+        psr.error("--jobs can not be used with --top")
     line_number_table = None
     if args.line_number_table is not None:
         line_number_table = args.line_number_table
@@ -303,7 +716,14 @@ def main(argv):
         ignore_case_query_words = args.ignore_case_query_word
     if not args.queryword and not ignore_case_query_words:
         sys.exit("no query keyword given")
+    if args.server is not None:
+        query_to_server(args.server, args.queryword, ignore_case_query_words, args.output,
+                max_depth=args.max_depth, output_form=args.output_form,
+                fully_qualified_package_name=args.fully_qualified_package_name, ansi_color=ansi_color,
+                max_paths=args.max_paths, timeout=args.timeout, top=args.top)
+        return
     do_search(args.call_tree, args.node_summary, args.queryword, ignore_case_query_words, args.output,  line_number_table,
             max_depth=args.max_depth, output_form=args.output_form,
             fully_qualified_package_name=args.fully_qualified_package_name, ansi_color=ansi_color,
-            show_progress=args.progress)
+            show_progress=args.progress, max_paths=args.max_paths, timeout=args.timeout, top=args.top,
+            jobs=args.jobs)
@@ -0,0 +1,159 @@
+#coding: utf-8
+
+import argparse
+import os
+import signal
+import socket
+import sys
+import SocketServer
+from cStringIO import StringIO
+
+from . import _config as _c
+from . import keywordsearcher as ks
+from ._query_protocol import encode_bytes, decode_bytes, write_message, read_message, connect
+
+
+def index_file_mtime(filename):
+    # an index file of older versions is saved as filename + ".gz"
+    for f in (filename, filename + ".gz"):
+        if os.path.exists(f):
+            return os.path.getmtime(f)
+    return None
+
+
+class QueryServer(object):
+    """
+    Keeps index data loaded, and answers queries with it.
+    The index data is re-loaded when any of the index files is updated.
+    """
+
+    def __init__(self, call_tree_file, node_summary_file, line_number_table=None, log=None):
+        self.index_files = (call_tree_file, node_summary_file, line_number_table)
+        self.log = log
+        self.index = None
+        self.index_mtimes = None
+        self.load_index()
+
+    def _mtimes(self):
+        return [index_file_mtime(f) if f is not None else None for f in self.index_files]
+
+    def load_index(self):
+        # the index and its mtimes are replaced only when the loading succeeds,
+        # so that a failed loading (e.g. of files being re-generated) is retried later
+        mtimes = self._mtimes()
+        call_tree_file, node_summary_file, line_number_table = self.index_files
+        index = ks.load_index(call_tree_file, node_summary_file, line_number_table, log=self.log)
+        self.index, self.index_mtimes = index, mtimes
+
+    def reload_index_if_updated(self):
+        if self._mtimes() != self.index_mtimes:
+            self.log and self.log("> index files updated\n")
+            try:
+                self.load_index()
+            except Exception as e:
+                if self.index is None:
+                    raise
+                self.log and self.log("> failed to re-load index, keeping the previous one: %s\n" % e)
+
+    def handle(self, request):
+        try:
+            self.reload_index_if_updated()
+            query = ks.build_query([decode_bytes(w) for w in request["query_words"]],
+                    [decode_bytes(w) for w in request.get("ignore_case_query_words", [])])
+            out = StringIO()
+            warnings = []
+            ks.search_and_write(query, self.index, out,
+                    max_depth=request.get("max_depth", _c.default_max_depth_of_subtree),
+                    output_form=request.get("output_form", 'treecut'),
+                    fully_qualified_package_name=request.get("fully_qualified_package_name", False),
+                    ansi_color=request.get("ansi_color", False),
+                    warn=warnings.append,
+                    max_paths=request.get("max_paths", -1),
+                    timeout=request.get("timeout"),
+                    top=request.get("top"))
+            return {"output": encode_bytes(out.getvalue()), "warnings": encode_bytes(''.join(warnings)),
+                    "error": None}
+        except Exception as e:
+            self.log and self.log("> error: %s\n" % e)
+            return {"output": "", "warnings": "", "error": "%s" % e}
+
+
+def serve_stdio(server, inp, out):
+    while True:
+        request = read_message(inp)
+        if request is None:
+            break  # while True
+        write_message(out, server.handle(request))
+
+
+def serve_unix_socket(server, socket_path):
+    if os.path.exists(socket_path):
+        try:
+            connect(socket_path).close()
+        except socket.error:
+            os.remove(socket_path)  # left by a server which did not exit normally
+        else:
+            raise IOError("query server is already running: %s" % socket_path)
+
+    class RequestHandler(SocketServer.StreamRequestHandler):
+        def handle(self):
+            while True:
+                request = read_message(self.rfile)
+                if request is None:
+                    break  # while True
+                write_message(self.wfile, server.handle(request))
+
+    socket_server = SocketServer.UnixStreamServer(socket_path, RequestHandler)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # remove the socket also when killed
+    try:
+        socket_server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        socket_server.server_close()
+        os.remove(socket_path)
+
+
+def build_argument_parser(psr):
+    psr.add_argument('-c', '--call-tree', action='store',
+            help="call-tree file. (default '%s')" % _c.default_calltree_path,
+            default=_c.default_calltree_path)
+    psr.add_argument('-n', '--node-summary', action='store',
+            help="summary file. (default '%s')" % _c.default_summary_path,
+            default=_c.default_summary_path)
+    psr.add_argument('-l', '--line-number-table', action='store',
+            help="line-number table file. (default '%s')" % _c.default_linenumbertable_path,
+            default=None)
+    psr.add_argument('-s', '--socket', action='store',
+            help="unix-domain socket to accept queries. (default '%s')" % _c.default_server_socket_path,
+            default=_c.default_server_socket_path)
+    psr.add_argument('--stdio', action='store_true',
+            help="accept queries from stdin and write results to stdout, instead of socket",
+            default=False)
+    psr.add_argument("--progress", action='store_true',
+            help="show progress to stderr",
+            default=False)
+
+
+def main(argv):
+    psr = argparse.ArgumentParser(prog=argv[0], description='agoat query server')
+    build_argument_parser(psr)
+
+    args = psr.parse_args(argv[1:])
+    line_number_table = None
+    if args.line_number_table is not None:
+        line_number_table = args.line_number_table
+    else:
+        if os.path.exists(_c.default_linenumbertable_path) or os.path.exists(_c.default_linenumbertable_path + ".gz"):
+            line_number_table = _c.default_linenumbertable_path
+    log = sys.stderr.write if args.progress else None
+
+    server = QueryServer(args.call_tree, args.node_summary, line_number_table, log=log)
+    if args.stdio:
+        serve_stdio(server, sys.stdin, sys.stdout)
+    else:
+        log and log("> accepting queries at %s\n" % args.socket)
+        try:
+            serve_unix_socket(server, args.socket)
+        except IOError as e:
+            sys.exit("error: %s" % e)
@@ -8,6 +8,7 @@ import agoat.run_disasms
 import agoat.indexer
 import agoat.diagnostic
 import agoat.keywordsearcher
+import agoat.query_server
 
 
 # set up command-line completion, if argcomplete module is installed
@@ -20,12 +21,13 @@ try:
     agoat.indexer.build_argument_parser(_subpsrs.add_parser('index'))
     agoat.diagnostic.build_argument_parser(_subpsrs.add_parser('list'))
     agoat.keywordsearcher.build_argument_parser(_subpsrs.add_parser('query'))
+    agoat.query_server.build_argument_parser(_subpsrs.add_parser('serve'))
     argcomplete.autocomplete(parser)
 except:
     pass
 
 
-USAGE = "usage: %s {disasm,index,list,query} [-h|--version]\n"
+USAGE = "usage: %s {disasm,index,list,query,serve} [-h|--version]\n"
 
 
 def main(argv):
@@ -49,6 +51,8 @@ def main(argv):
         agoat.diagnostic.main(argv)
     elif cmd == 'query':
         agoat.keywordsearcher.main(argv)
+    elif cmd == 'serve':
+        agoat.query_server.main(argv)
     else:
         sys.exit("unknown command: %s" % cmd)
 
@@ -0,0 +1,79 @@
+# coding: utf-8
+
+# Benchmark of calltree_builder.extract_class_hierarchy with a synthetic class hierarchy.
+# usage: python bench_class_hierarchy.py [CLASSES [FANOUT]]
+
+import collections
+import sys
+import os.path
+import time
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.calltree_builder as cb
+
+
+class ClassDataStub(object):
+    def __init__(self, base_name, interf_names):
+        self.base_name = base_name
+        self.interf_names = interf_names
+
+
+def gen_class_table(class_count, fanout, interf_count=100):
+    class_table = {}
+    for i in xrange(interf_count):
+        interf_names = ['I%d' % ((i - 1) // 2)] if i > 0 else None
+        class_table['I%d' % i] = ClassDataStub(None, interf_names)
+    for i in xrange(class_count):
+        base_name = 'C%d' % ((i - 1) // fanout) if i > 0 else 'java.lang.Object'
+        interf_names = ['I%d' % (i % interf_count)] if i % 7 == 0 else None
+        class_table['C%d' % i] = ClassDataStub(base_name, interf_names)
+    return class_table
+
+
+def extract_class_hierarchy_fixpoint(class_table):
+    # the nested-loop fixpoint iteration, which was used before the breadth-first search
+    class_to_descendants = collections.defaultdict(dict)
+    for clz, class_data in class_table.iteritems():
+        if class_data.base_name:
+            class_to_descendants[class_data.base_name][clz] = 1
+        if class_data.interf_names:
+            for interf in class_data.interf_names:
+                class_to_descendants[interf][clz] = 1
+    while True:
+        added_dds = []
+        for clz, d_depths in class_to_descendants.iteritems():
+            for d, d_dep in d_depths.iteritems():
+                for dd, dd_dep in class_to_descendants.get(d, {}).iteritems():
+                    if dd not in d_depths:
+                        added_dds.append((clz, dd, d_dep + dd_dep))
+        if not added_dds:
+            break  # while True
+        for clz, dd, dd_dep in added_dds:
+            class_to_descendants[clz][dd] = dd_dep
+    return class_to_descendants
+
+
+def timeit(label, func):
+    t = time.time()
+    r = func()
+    sys.stdout.write("%s: %.2f sec\n" % (label, time.time() - t))
+    return r
+
+
+def main(argv):
+    class_count = int(argv[1]) if len(argv) >= 2 else 50000
+    fanout = int(argv[2]) if len(argv) >= 3 else 3
+    class_table = gen_class_table(class_count, fanout)
+    sys.stdout.write("classes: %d, fanout: %d\n" % (len(class_table), fanout))
+
+    c2d = timeit("extract_class_hierarchy", lambda: cb.extract_class_hierarchy(class_table))
+    sys.stdout.write("descendant pairs: %d\n" % sum(len(ds) for ds in c2d.itervalues()))
+    c2d_fp = timeit("fixpoint (previous implementation)", lambda: extract_class_hierarchy_fixpoint(class_table))
+
+    # distances may differ where a class is reachable via paths of different lengths
+    assert dict((c, set(ds)) for c, ds in c2d.iteritems()) == dict((c, set(ds)) for c, ds in c2d_fp.iteritems())
+
+
+if __name__ == '__main__':
+    main(sys.argv)
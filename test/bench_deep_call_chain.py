@@ -0,0 +1,68 @@
+# coding: utf-8
+
+# Stress benchmark of the call-tree walkers with a synthetic, deep call chain
+# (a method calls the next method, ..., CHAIN_LENGTH levels deep).
+# usage: python bench_deep_call_chain.py [CHAIN_LENGTH]
+
+import sys
+import os.path
+import time
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.andor_tree as at
+import agoat.jimp_parser as jp
+import agoat.calltree_builder as cb
+import agoat.calltree_summary as cs
+import agoat.calltree_query as cq
+
+PRINTLN = jp.ClzMethodSig('java.io.PrintStream', None, 'println', ('java.lang.String',))
+
+
+def gen_class_table(chain_length):
+    cd = jp.ClassData('Chain', 'java.lang.Object')
+    md = cd.gen_method(None, 'main', ('java.lang.String[]',))
+    md.code = [at.ORDERED_AND, (jp.INVOKE, jp.ClzMethodSig('Chain', None, 'm0', ()), (), 1)]
+    for i in xrange(chain_length):
+        md = cd.gen_method(None, 'm%d' % i, ())
+        code = [at.ORDERED_OR]
+        if i + 1 < chain_length:
+            code.append((jp.INVOKE, jp.ClzMethodSig('Chain', None, 'm%d' % (i + 1), ()), (), 10))
+        code.append((jp.INVOKE, PRINTLN, ('"level %d"' % i,), 11))
+        md.code = code
+    return {cd.class_name: cd}
+
+
+def timeit(label, func):
+    t = time.time()
+    r = func()
+    sys.stdout.write("%s: %.2f sec\n" % (label, time.time() - t))
+    return r
+
+
+def main(argv):
+    chain_length = int(argv[1]) if len(argv) >= 2 else 3000
+    sys.stdout.write("chain length: %d (recursion limit: %d)\n" % (chain_length, sys.getrecursionlimit()))
+    class_table = gen_class_table(chain_length)
+    entry_points = cb.find_entry_points(class_table)
+
+    call_trees = timeit("extract_call_andor_trees", lambda: cb.extract_call_andor_trees(class_table, entry_points))
+    summary_table = timeit("extract_node_summary_table", lambda: cs.extract_node_summary_table(call_trees))
+
+    query = cq.Query([cq.compile_query('"level %d' % (chain_length - 1)), cq.compile_query('println')])
+    pred = cq.gen_callnode_fulfills_query_predicate_w_memo(query, summary_table)
+    lower_bounds = timeit("get_lower_bound_call_nodes", lambda: cq.get_lower_bound_call_nodes(call_trees, pred))
+    assert len(lower_bounds) == 1
+
+    has_deeper_nodes = [False]
+    tc = timeit("treecut_with_callnode_depth", lambda: cq.treecut_with_callnode_depth(call_trees[0], chain_length + 1, has_deeper_nodes))
+    assert not has_deeper_nodes[0]
+    sumry = timeit("node_summary_treecut", lambda: cs.node_summary_treecut(tc))
+    assert query.is_fulfilled_by(sumry)
+    timeit("extract_node_contribution", lambda: cq.extract_node_contribution(tc, query))
+    stc = timeit("extract_shallowest_treecut", lambda: cq.extract_shallowest_treecut(call_trees[0], query))
+    assert stc is not None
+
+
+if __name__ == '__main__':
+    main(sys.argv)
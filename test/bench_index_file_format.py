@@ -0,0 +1,100 @@
+# coding: utf-8
+
+# Benchmark of the index file format, compared with gzip'ed pickles (protocol 1) of older versions,
+# with call trees and a node summary table of a synthetic program.
+# The node summary table is also loaded lazily from a mmap'ed, not-compressed file.
+# usage: python bench_index_file_format.py [CLASSES [METHODS_PER_CLASS]]
+
+import gzip
+import os
+import pickle
+import random
+import shutil
+import sys
+import os.path
+import tempfile
+import time
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.andor_tree as at
+import agoat.jimp_parser as jp
+import agoat.calltree_builder as cb
+import agoat.calltree_summary as cs
+from agoat._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_CALL_TREES, DATATAG_NODE_SUMMARY
+from agoat._index_file_format import save_index_data, load_index_data
+
+PRINTLN = jp.ClzMethodSig('java.io.PrintStream', None, 'println', ('java.lang.String',))
+
+
+def gen_class_table(class_count, method_count, calls_per_method=4, seed=1):
+    # class Ci has methods m0 ... and main, and a method of Ci calls methods of Cj (j > i)
+    rnd = random.Random(seed)
+    class_table = {}
+    for i in xrange(class_count):
+        cd = jp.ClassData('C%d' % i, 'java.lang.Object')
+        for m in xrange(method_count):
+            md = cd.gen_method(None, 'm%d' % m, ())
+            code = [at.ORDERED_AND]
+            for k in xrange(calls_per_method if i + 1 < class_count else 0):
+                j = rnd.randrange(i + 1, class_count)
+                called = jp.ClzMethodSig('C%d' % j, None, 'm%d' % rnd.randrange(method_count), ())
+                code.append([at.ORDERED_OR, (jp.INVOKE, called, (), 10 + k), (jp.RETURN, 20 + k)])
+            code.append((jp.INVOKE, PRINTLN, ('"C%d.m%d"' % (i, m),), 30))
+            md.code = code
+        if i % 50 == 0:
+            md = cd.gen_method(None, 'main', ('java.lang.String[]',))
+            md.code = [at.ORDERED_AND, (jp.INVOKE, jp.ClzMethodSig(cd.class_name, None, 'm0', ()), (), 1)]
+        class_table[cd.class_name] = cd
+    return class_table
+
+
+def timeit(label, func):
+    t = time.time()
+    r = func()
+    sys.stdout.write("%s: %.2f sec\n" % (label, time.time() - t))
+    return r
+
+
+def main(argv):
+    class_count = int(argv[1]) if len(argv) >= 2 else 400
+    method_count = int(argv[2]) if len(argv) >= 3 else 5
+    class_table = gen_class_table(class_count, method_count)
+    entry_points = cb.find_entry_points(class_table)
+    call_trees = cb.extract_call_andor_trees(class_table, entry_points)
+    summary_table = cs.extract_node_summary_table(call_trees)
+    sys.stdout.write("classes: %d, methods: %d, entry points: %d, summaries: %d\n" % (
+            class_count, class_count * method_count, len(entry_points), len(summary_table)))
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 100000))  # for pickle
+    work_dir = tempfile.mkdtemp()
+    try:
+        for name, data in [
+                ("call trees", {DATATAG_CALL_TREES: call_trees, DATATAG_ENTRY_POINTS: entry_points}),
+                ("node summary", {DATATAG_NODE_SUMMARY: summary_table, DATATAG_ENTRY_POINTS: entry_points})]:
+            pickle_file = os.path.join(work_dir, 'pickle')
+            with gzip.open(pickle_file + ".gz", "wb") as out:
+                pickle.dump(data, out, protocol=1)
+            index_file = os.path.join(work_dir, 'index')
+            save_index_data(index_file, data)
+            sys.stdout.write("%s: size %d bytes (gzip'ed pickle %d bytes)\n" % (
+                    name, os.path.getsize(index_file), os.path.getsize(pickle_file + ".gz")))
+
+            def load_pickle():
+                with gzip.open(pickle_file + ".gz", "rb") as inp:
+                    return pickle.loads(inp.read())
+            d_pickle = timeit("%s: load gzip'ed pickle" % name, load_pickle)
+            d_index = timeit("%s: load index file" % name, lambda: load_index_data(index_file))
+            assert d_index == d_pickle
+
+            if DATATAG_NODE_SUMMARY in data:
+                save_index_data(index_file, data, compress=False)
+                sys.stdout.write("%s: size %d bytes (not compressed)\n" % (name, os.path.getsize(index_file)))
+                d_lazy = timeit("%s: load index file (lazy)" % name, lambda: load_index_data(index_file, lazy=True))
+                assert dict(d_lazy[DATATAG_NODE_SUMMARY].iteritems()) == d_pickle[DATATAG_NODE_SUMMARY]
+    finally:
+        shutil.rmtree(work_dir)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,61 @@
+# coding: utf-8
+
+# Benchmark of path expansion (-f path) with a synthetic, dispatch-heavy call tree:
+# a method has SITES call sites in sequence, each of which dispatches to one of
+# ALTERNATIVES methods, and each of the methods prints a distinct string literal.
+# The query asks literals of the first alternatives of the first and the last sites,
+# so that most of the alternatives of these sites can not complete the query.
+# usage: python bench_path_expansion.py [SITES [ALTERNATIVES]]
+
+import sys
+import os.path
+import time
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.jimp_parser as jp
+import agoat.calltree as ct
+import agoat.calltree_query as cq
+import agoat.keywordsearcher as ks
+
+PRINTLN = jp.ClzMethodSig('java.io.PrintStream', 'void', 'println', ('java.lang.String',))
+
+
+def gen_call_tree(site_count, alternative_count):
+    body = [ct.ORDERED_AND]
+    for i in xrange(site_count):
+        site = [ct.ORDERED_OR]
+        for j in xrange(alternative_count):
+            callee = jp.ClzMethodSig('C%d' % j, 'void', 'm%d' % i, ())
+            printing = ct.Invoked(jp.INVOKE, PRINTLN, ('"s%d_%d"' % (i, j),), 'C%d\tvoid\tm%d\n1' % (j, i))
+            site.append(ct.CallNode(ct.Invoked(jp.INVOKE, callee, (), 'Main\tvoid\tmain\n%d' % (10 + i)), None,
+                    [ct.ORDERED_AND, printing]))
+        body.append(site)
+    main = jp.ClzMethodSig('Main', 'void', 'main', ('java.lang.String[]',))
+    return ct.CallNode(ct.Invoked(jp.SPECIALINVOKE, main, (), None), None, body)
+
+
+def timeit(label, func):
+    t = time.time()
+    r = func()
+    sys.stdout.write("%s: %.2f sec\n" % (label, time.time() - t))
+    return r
+
+
+def main(argv):
+    site_count = int(argv[1]) if len(argv) >= 2 else 6
+    alternative_count = int(argv[2]) if len(argv) >= 3 else 8
+    sys.stdout.write("sites: %d, alternatives: %d, paths: %d\n" % (
+            site_count, alternative_count, alternative_count ** site_count))
+    call_tree = gen_call_tree(site_count, alternative_count)
+
+    query = cq.Query([cq.compile_query('"s0_0"'), cq.compile_query('"s%d_0"' % (site_count - 1))])
+    expand_call_tree_to_paths = ks.gen_expander_of_call_tree_to_paths(query)
+    paths = timeit("expand paths", lambda: list(expand_call_tree_to_paths(call_tree)))
+    sys.stdout.write("paths fulfilling query: %d\n" % len(paths))
+    first_path = timeit("expand the first path", lambda: next(expand_call_tree_to_paths(call_tree)))
+    assert first_path is not None
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,86 @@
+# coding: utf-8
+
+# Benchmark of construction of node summary tables, compared with the older way,
+# which extends a summary with all the callees and literals of the child summaries
+# and then re-sorts them, with the bundled samples and synthetic programs
+# (the ones of bench_index_file_format.py and bench_deep_call_chain.py).
+# Construction of inverted indices, which collects all the callees and literals
+# of each summary, is also measured.
+# usage: python bench_summary_construction.py [CLASSES [CHAIN_LENGTH]]
+
+import sys
+import os.path
+import time
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.calltree_builder as cb
+import agoat.calltree_summary as cs
+
+import bench_index_file_format
+import bench_deep_call_chain
+from sootoutput_fixture import read_soot_output_class_table
+
+
+class ResortingSummaryBuilder(object):
+    # SummaryBuilder of older versions
+    def __init__(self):
+        self.callees = []
+        self.literals = []
+        self.already_appended_callnodes = set()
+
+    def append_callee(self, callee):
+        self.callees.append(callee)
+
+    def extend_callee(self, callees):
+        self.callees.extend(callees)
+
+    def append_literal(self, literal):
+        self.literals.append(literal)
+
+    def extend_literal(self, literals):
+        self.literals.extend(literals)
+
+    def append_summary(self, sumry, callnode_label=None):
+        self.callees.extend(sumry.callees)
+        self.literals.extend(sumry.literals)
+        if callnode_label is not None:
+            self.already_appended_callnodes.add(callnode_label)
+
+    def to_summary(self):
+        return cs.Summary(self.callees, self.literals)
+
+
+def timeit(label, func):
+    t = time.time()
+    r = func()
+    sys.stdout.write("%s: %.2f sec\n" % (label, time.time() - t))
+    return r
+
+
+def main(argv):
+    class_count = int(argv[1]) if len(argv) >= 2 else 1000
+    chain_length = int(argv[2]) if len(argv) >= 3 else 2000
+    for name, class_table in [
+            ("samples", read_soot_output_class_table()),
+            ("%d classes" % class_count, bench_index_file_format.gen_class_table(class_count, 5)),
+            ("call chain of %d" % chain_length, bench_deep_call_chain.gen_class_table(chain_length))]:
+        entry_points = cb.find_entry_points(class_table)
+        call_trees = cb.extract_call_andor_trees(class_table, entry_points)
+
+        st = timeit("%s: summary table" % name, lambda: cs.extract_node_summary_table(call_trees))
+        timeit("%s: inverted index" % name, lambda: cs.build_inverted_index(st))
+        summary_builder = cs.SummaryBuilder
+        cs.SummaryBuilder = ResortingSummaryBuilder
+        try:
+            st_resorting = timeit("%s: summary table (re-sorting)" % name,
+                    lambda: cs.extract_node_summary_table(call_trees))
+        finally:
+            cs.SummaryBuilder = summary_builder
+        timeit("%s: inverted index (re-sorting)" % name, lambda: cs.build_inverted_index(st_resorting))
+        assert st == st_resorting
+        sys.stdout.write("%s: summaries: %d\n" % (name, len(st)))
+        st = st_resorting = None  # not to be scanned by GC in the next measurement
+
+if __name__ == '__main__':
+    main(sys.argv)
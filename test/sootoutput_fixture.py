@@ -0,0 +1,58 @@
+# coding: utf-8
+
+# Test fixture shared by the tests (and benchmarks) using the bundled soot output files,
+# that is, their call trees and index files built from them.
+
+import shutil
+import sys
+import tempfile
+import os.path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.jimp_parser as jp
+import agoat.calltree_builder as cb
+import agoat.calltree_summary as cs
+import agoat.keywordsearcher as ks
+from agoat._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_CALL_TREES, DATATAG_NODE_SUMMARY
+from agoat._index_file_format import save_index_data
+
+SOOT_OUTPUT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sootOutput')
+
+
+def read_soot_output_class_table():
+    return cb.inss_to_tree_in_class_table(dict(jp.read_class_table_from_dir_iter(SOOT_OUTPUT_DIR)))
+
+
+def extract_soot_output_call_trees():
+    """
+    Returns (class table, entry points, call trees) of the soot output files.
+    """
+
+    class_table = read_soot_output_class_table()
+    entry_points = cb.find_entry_points(class_table)
+    call_trees = cb.extract_call_andor_trees(class_table, entry_points)
+    return class_table, entry_points, call_trees
+
+
+def save_soot_output_index(work_dir):
+    """
+    Saves a call-tree file and a (uncompressed) summary file of the soot output files
+    into work_dir, and returns their paths.
+    """
+
+    _, entry_points, call_trees = extract_soot_output_call_trees()
+    call_tree_file = os.path.join(work_dir, 'agoat.calltree')
+    summary_file = os.path.join(work_dir, 'agoat.summarytable')
+    save_index_data(call_tree_file, {DATATAG_CALL_TREES: call_trees, DATATAG_ENTRY_POINTS: entry_points})
+    save_index_data(summary_file, {DATATAG_NODE_SUMMARY: cs.extract_node_summary_table(call_trees),
+            DATATAG_ENTRY_POINTS: entry_points}, compress=False)
+    return call_tree_file, summary_file
+
+
+def load_soot_output_index():
+    work_dir = tempfile.mkdtemp()
+    try:
+        return ks.load_index(*save_soot_output_index(work_dir))
+    finally:
+        shutil.rmtree(work_dir)
@@ -12,6 +12,8 @@ import agoat.calltree as ac
 import agoat.jimp_parser as jp
 import agoat.calltree_builder as cb
 
+from sootoutput_fixture import extract_soot_output_call_trees
+
 
 class ClassDataStubOnlyBase(object):
     def __init__(self, base_name):
@@ -63,6 +65,27 @@ class CalltreeBuilderTest(unittest.TestCase):
              'B': {'C': 1}
         })
 
+    def test_extract_class_hierachy_shortest_distance(self):
+        class ClassDataStub(object):
+            def __init__(self, base_name, interf_names):
+                self.base_name = base_name
+                self.interf_names = interf_names
+        class_table = {
+            'B': ClassDataStub('A', None),
+            'C': ClassDataStub('B', None),
+            'D': ClassDataStub('C', ['I']),
+            'I': ClassDataStub(None, ['J']),
+            'A': ClassDataStub(None, ['J']),
+        }
+        class_to_descendants = cb.extract_class_hierarchy(class_table, include_indirect_decendants=True)
+        self.assertEqual(class_to_descendants, {
+             'A': {'B': 1, 'C': 2, 'D': 3},
+             'B': {'C': 1, 'D': 2},
+             'C': {'D': 1},
+             'I': {'D': 1},
+             'J': {'A': 1, 'I': 1, 'B': 2, 'C': 3, 'D': 2},
+        })
+
     def test_resolve_dispatch_noinheritance(self):
         class_to_methods = {'A': [crv('A', 'a'), crv('A', 'b')], 'M': [crv('M', 'm'), crv('M', 'n')], 'P': [crv('P', 'p'), crv('P', 'q')]}
         class_to_descendants = {}
@@ -122,6 +145,27 @@ class CalltreeBuilderTest(unittest.TestCase):
             ('P', mnamc('p')): [crv('P', 'p')]
         })
 
+    def test_resolve_dispatch_cache(self):
+        class_to_methods = {'A': [crv('A', 'a')], 'M': [crv('M', 'a')]}
+        class_table = {
+            'A': ClassDataStubOnlyMethods('A', {crv('A', 'a'): MethodDataStubOnlyCode(crv('A', 'a'), None)}),
+            'M': ClassDataStubOnlyMethods('M', {crv('M', 'a'): MethodDataStubOnlyCode(crv('M', 'a'), None)}),
+        }
+        class_to_descendants = {'A': {'M': 1}}
+        recv_method_to_defs = cb.make_dispatch_table(class_to_methods, class_to_descendants)
+        resolve_dispatch = cb.gen_method_dispatch_resolver(class_table, class_to_descendants,
+                recv_method_to_defs, cache_size=2)
+
+        r = resolve_dispatch(jp.INVOKE, crv('A', 'a'))
+        self.assertEqual(sorted(md.clzmsig for md in r), [crv('A', 'a'), crv('M', 'a')])
+        self.assertEqual(resolve_dispatch(jp.INVOKE, crv('A', 'a')), r)
+        r = resolve_dispatch(jp.SPECIALINVOKE, crv('A', 'a'))
+        self.assertEqual([md.clzmsig for md in r], [crv('A', 'a')])
+        self.assertEqual(resolve_dispatch.cache_info(), (1, 2, 2, 2))
+
+        self.assertEqual(resolve_dispatch(jp.INVOKE, crv('X', 'a')), ())
+        self.assertEqual(resolve_dispatch.cache_info(), (1, 3, 2, 1))
+
     def test_find_methods_involved_in_recursive_call_chain_direct(self):
         class_table = {
             'A': ClassDataStubOnlyMethods('A', {
@@ -186,6 +230,30 @@ class CalltreeBuilderTest(unittest.TestCase):
             include_direct_recursive_calls=False)
         self.assertEqual(methods_ircc, [crv('B', 'b'), crv('C', 'c')])
 
+    def test_find_methods_involved_in_recursive_call_chains(self):
+        def md(clzmsig, called):
+            return MethodDataStubOnlyCode(clzmsig, [at.ORDERED_AND] + [(jp.INVOKE, c) for c in called])
+        # B -> C -> B and B -> D -> C -> B are recursive call chains
+        class_table = {
+            'A': ClassDataStubOnlyMethods('A', {crv('A', 'main'): md(crv('A', 'main'), [crv('B', 'b')])}),
+            'B': ClassDataStubOnlyMethods('B', {crv('B', 'b'): md(crv('B', 'b'), [crv('C', 'c'), crv('D', 'd')])}),
+            'C': ClassDataStubOnlyMethods('C', {crv('C', 'c'): md(crv('C', 'c'), [crv('B', 'b')])}),
+            'D': ClassDataStubOnlyMethods('D', {crv('D', 'd'): md(crv('D', 'd'), [crv('C', 'c')])}),
+            'E': ClassDataStubOnlyMethods('E', {crv('E', 'main'): md(crv('E', 'main'), [crv('F', 'f')])}),
+            'F': ClassDataStubOnlyMethods('F', {crv('F', 'f'): md(crv('F', 'f'), [crv('F', 'f'), crv('D', 'd')])}),
+        }
+        recv_method_to_defs = dict(((clz, mnamc(jp.clzmsig_method(clzmsig))), [clzmsig]) \
+                for clz, cd in class_table.iteritems() for clzmsig in cd.methods)
+        resolve_dispatch = cb.gen_method_dispatch_resolver(class_table, {}, recv_method_to_defs)
+        methods_ircc = cb.find_methods_involved_in_recursive_call_chains(
+            [crv('A', 'main'), crv('E', 'main')], resolve_dispatch)
+        self.assertEqual(methods_ircc, [crv('B', 'b'), crv('C', 'c'), crv('D', 'd')])
+        methods_ircc = cb.find_methods_involved_in_recursive_call_chains(
+            [crv('E', 'main')], resolve_dispatch, include_direct_recursive_calls=True)
+        self.assertEqual(methods_ircc, [crv('B', 'b'), crv('C', 'c'), crv('D', 'd'), crv('F', 'f')])
+        with self.assertRaises(ValueError):
+            cb.find_methods_involved_in_recursive_call_chains([crv('X', 'main')], resolve_dispatch)
+
     def test_find_entry_points(self):
         cd = jp.ClassData('Sample', 'java.lang.Object')
         md_g = jp.MethodData('Sample\tvoid\tdo_greeting', cd)
@@ -230,6 +298,71 @@ class CalltreeBuilderTest(unittest.TestCase):
         self.assertTrue(isinstance(b, ac.Invoked))
         self.assertEqual(b.callee, 'java.io.PrintStream\tvoid\tprintln\tjava.lang.String')
 
+    def test_extract_call_andor_trees_incremental(self):
+        def class_data(clz, base, method_codes):
+            cd = jp.ClassData(clz, base)
+            for m, code in method_codes:
+                cd.gen_method(None, m, ()).code = code
+            return cd
+
+        println = 'java.io.PrintStream\tvoid\tprintln\tjava.lang.String'
+        cd_a = class_data('A', 'java.lang.Object', [
+            ('main', [at.ORDERED_AND, (jp.INVOKE, crv('B', 'run'), (), 10), (jp.INVOKE, crv('D', 'd'), (), 11)])
+        ])
+        cd_b = class_data('B', 'java.lang.Object', [
+            ('run', [at.ORDERED_AND, (jp.INVOKE, println, ('"b"',), 20)])
+        ])
+        cd_c = class_data('C', 'B', [
+            ('run', [at.ORDERED_AND, (jp.INVOKE, crv('C', 'helper'), (), 30)]),
+            ('helper', [at.ORDERED_AND, (jp.INVOKE, println, ('"c"',), 40)])
+        ])
+        cd_d = class_data('D', 'java.lang.Object', [
+            ('d', [at.ORDERED_AND, (jp.INVOKE, println, ('"d"',), 50)])
+        ])
+        cd_d2 = class_data('D', 'java.lang.Object', [
+            ('d', [at.ORDERED_AND, (jp.INVOKE, println, ('"d2"',), 50)])
+        ])
+        entry_points = [crv('A', 'main')]
+
+        v1 = {'A': cd_a, 'B': cd_b, 'D': cd_d}
+        trees1 = cb.extract_call_andor_trees(v1, entry_points)
+        reused = set()
+        trees = cb.extract_call_andor_trees(v1, entry_points,
+                prev_call_trees=trees1, changed_classes=set(), reused_call_node_labels=reused)
+        self.assertEqual(trees, trees1)
+        self.assertEqual(reused, set([(crv('A', 'main'), None), (crv('B', 'run'), None), (crv('D', 'd'), None)]))
+
+        # a new class overriding B.run changes the dispatch in A.main
+        v2 = {'A': cd_a, 'B': cd_b, 'C': cd_c, 'D': cd_d}
+        trees2 = cb.extract_call_andor_trees(v2, entry_points)
+        self.assertNotEqual(trees2, trees1)
+        reused = set()
+        trees = cb.extract_call_andor_trees(v2, entry_points,
+                prev_call_trees=trees1, changed_classes=set(['C']), reused_call_node_labels=reused)
+        self.assertEqual(trees, trees2)
+        self.assertEqual(reused, set([(crv('B', 'run'), None), (crv('D', 'd'), None)]))
+
+        # a modified method affects its callers
+        v3 = {'A': cd_a, 'B': cd_b, 'C': cd_c, 'D': cd_d2}
+        trees3 = cb.extract_call_andor_trees(v3, entry_points)
+        reused = set()
+        trees = cb.extract_call_andor_trees(v3, entry_points,
+                prev_call_trees=trees2, changed_classes=set(['D']), reused_call_node_labels=reused)
+        self.assertEqual(trees, trees3)
+        self.assertEqual(reused, set([(crv('B', 'run'), None), (crv('C', 'run'), None), (crv('C', 'helper'), None)]))
+
+        # removing the class restores the dispatch
+        trees = cb.extract_call_andor_trees(v1, entry_points,
+                prev_call_trees=trees2, changed_classes=set(['C']))
+        self.assertEqual(trees, trees1)
+
+    def test_extract_call_andor_trees_incremental_w_sootoutput_files(self):
+        class_table, entry_points, call_trees = extract_soot_output_call_trees()
+        for changed_classes in (set(), set(['Recursive']), set(class_table.iterkeys())):
+            trees = cb.extract_call_andor_trees(class_table, entry_points,
+                    prev_call_trees=call_trees, changed_classes=changed_classes)
+            self.assertEqual(trees, call_trees)
+
 
 stub_class_to_descendants = { 
     "A": { "B": 1, "C": 2}, 
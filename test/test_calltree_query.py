@@ -13,6 +13,7 @@ from agoat._utilities import quote
 
 import agoat.jimp_parser as jp
 import agoat.calltree as ct
+import agoat.calltree_summary as cs
 import agoat.calltree_query as cq
 
 def new_invoked(clz, msig):
@@ -145,6 +146,66 @@ class QueryTest(unittest.TestCase):
         self.assertTrue(query.is_partially_filled_by(sumry))
         self.assertTrue(query.is_fulfilled_by(sumry))
 
+    def test_matched_patterns(self):
+        qp = [cq.MethodQueryPattern("w"), cq.MethodQueryPattern("x"), cq.LiteralQueryPattern("y")]
+        query = cq.Query(qp)
+        sumry = cq.Summary(["A\tvoid\tv", "B\tvoid\tx", "C\tvoid\tz"], ['"y"'])
+        self.assertEqual([p.word for p in query.matched_patterns(sumry)], ["x", "y"])
+        self.assertEqual([p.word for p in query.unmatched_patterns(sumry)], ["w"])
+        self.assertEqual(query.summary_mask(sumry), 0b110)
+        self.assertEqual(query.callee_mask("B\tvoid\tx"), 0b010)
+        self.assertEqual(query.literal_mask('"y"'), 0b100)
+        self.assertTrue(query.has_matching_pattern_in("C\tvoid\tw", ()))
+        self.assertFalse(query.has_matching_pattern_in("C\tvoid\tz", ('"z"',)))
+
+    def test_summary_mask_of_shared_summaries(self):
+        qp = [cq.MethodQueryPattern("w"), cq.MethodQueryPattern("x"), cq.LiteralQueryPattern("y")]
+        query = cq.Query(qp)
+        child = cq.Summary(["B\tvoid\tx"], ['"y"'])
+        sb = cs.SummaryBuilder()
+        sb.append_summary(child)
+        sb.append_callee("A\tvoid\tv")
+        parent = sb.to_summary()
+        self.assertIs(parent.sub_summaries[0], child)
+        self.assertEqual(query.summary_mask(parent), 0b110)
+        sb = cs.SummaryBuilder()
+        sb.append_summary(parent)
+        sb.append_summary(child)
+        sb.append_callee("C\tvoid\tw")
+        self.assertTrue(query.is_fulfilled_by(sb.to_summary()))
+        self.assertEqual(query.summary_mask(child), 0b110)
+
+    def test_fulfilling_labels(self):
+        def cm(clz, method):
+            return jp.ClzMethodSig(clz, 'void', method, ())
+        summary_table = {
+            (cm('A', 'a'), None): cs.Summary([cm('B', 'b'), cm('C', 'c')], ['"w"', '"x"']),
+            (cm('B', 'b'), None): cs.Summary([cm('C', 'c')], ['"w"']),
+            (cm('C', 'c'), cm('C', 'c')): cs.Summary([cm('C', 'c')], ['"x"']),
+            (cm('D', 'd'), None): cs.Summary(),
+        }
+        inverted_index = cs.build_inverted_index(summary_table)
+        term_trigram_index = cs.build_term_trigram_index(inverted_index)
+        for words in [["w"], ['"w'], ["x", "c"], ["m.c", '"x'], ["t.B"], ["y"], [],
+                ["voi"], ["m.C/vo+id/c"], ["m.c/VOID"], ['"w"'], ["VOID|a"]]:
+            query = cq.Query([cq.compile_query(w) for w in words])
+            expected = set(lbl for lbl, sumry in summary_table.iteritems() if query.is_fulfilled_by(sumry))
+            self.assertEqual(query.fulfilling_labels(inverted_index), expected)
+            self.assertEqual(query.fulfilling_labels(inverted_index, term_trigram_index), expected)
+        query = cq.Query([cq.compile_query("VOI", ignore_case=True)])
+        self.assertEqual(query.fulfilling_labels(inverted_index, term_trigram_index),
+                set(lbl for lbl in summary_table if lbl[0] != cm('D', 'd')))
+
+    def test_required_trigrams(self):
+        def trigrams(word, ignore_case=False):
+            return cq.required_trigrams([re.compile(word, re.IGNORECASE if ignore_case else 0)])
+        self.assertEqual(trigrams("abcd"), set(["abc", "bcd"]))
+        self.assertEqual(trigrams("ABcd", ignore_case=True), set(["abc", "bcd"]))
+        self.assertEqual(trigrams("ab.cde"), set(["cde"]))
+        self.assertEqual(trigrams("(abc|def)"), set())
+        self.assertEqual(trigrams("x(abc)?y(def)+"), set(["def"]))
+        self.assertEqual(trigrams("a\\.bc\\.def"), set(["a.b", ".bc", "bc.", "c.d", ".de", "def"]))
+
     def test_quoted_and_unquoted(self):
         word_japanese_a = u"あ"
         l = quote(word_japanese_a)
@@ -191,6 +252,54 @@ class QueryTest(unittest.TestCase):
         self.assertEqual(cns[0].invoked, new_invoked("C", "c"))
         self.assertEqual(cns[1].invoked, new_invoked("F", "f"))
     
+    def test_extract_shallowest_treecut(self):
+        call_tree = new_callnode("A", "void\ta", 
+            [ct.ORDERED_AND,
+                new_invoked("B", "void\tb"),
+                new_callnode("C", "void\tc",
+                    [ct.ORDERED_OR,
+                        new_invoked("D", "void\td"),
+                    ]
+                ),
+                new_callnode("F", "void\tf",
+                    [ct.ORDERED_AND,
+                        new_invoked("G", "void\tg"),
+                        new_callnode("H", "void\th",
+                            [ct.ORDERED_AND,
+                            ]
+                        )
+                    ]
+                )
+            ]
+        )
+        for words, max_depth, depth in [(["m.a"], -1, 1), (["m.b", "m.c"], -1, 1), (["m.g"], -1, 2),
+                (["m.f", "m.h"], -1, 2), (["m.x"], -1, None), (["m.a", "m.g"], 2, None)]:
+            query = cq.Query([cq.compile_query(w) for w in words])
+            tc = cq.extract_shallowest_treecut(call_tree, query, max_depth)
+            if depth is None:
+                self.assertIsNone(tc)
+            else:
+                self.assertEqual(tc, cq.treecut_with_callnode_depth(call_tree, depth))
+                if depth > 1:
+                    shallower = cq.treecut_with_callnode_depth(call_tree, depth - 1)
+                    self.assertFalse(query.is_fulfilled_by(cs.node_summary_treecut(shallower)))
+
+    def test_extract_node_contribution_coverage(self):
+        d = new_invoked("D", "void\td")
+        e = ct.Invoked(jp.SPECIALINVOKE, "E\tvoid\te", ('"x"',), None)
+        or_node = [ct.ORDERED_OR, d, e]
+        c = new_callnode("C", "void\tc", or_node)
+        call_tree = new_callnode("A", "void\ta", [ct.ORDERED_AND, new_invoked("B", "void\tb"), c])
+        query = cq.Query([cq.compile_query(w) for w in ["m.c", "m.d", '"x']])
+        coverage = {}
+        node_id_to_cont = cq.extract_node_contribution(call_tree, query, coverage)
+        self.assertEqual(coverage[id(d)], 0b010)
+        self.assertEqual(coverage[id(e)], 0b100)
+        self.assertEqual(coverage[id(or_node)], 0b110)
+        self.assertEqual(coverage[id(c)], 0b111)
+        self.assertEqual(coverage[id(call_tree)], 0b111)
+        self.assertEqual(node_id_to_cont, cq.extract_node_contribution(call_tree, query))
+
     def test_treecut_with_callnode_depth(self):
         has_deeper_nodes = [False]
         tc0 = cq.treecut_with_callnode_depth(A_CALL_TREE, 0, has_deeper_nodes)
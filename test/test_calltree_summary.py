@@ -2,6 +2,7 @@
 
 import unittest
 
+import pickle
 import sys
 import os.path
 sys.path.insert(
@@ -117,6 +118,89 @@ class CalltreeSummarlizerTest(unittest.TestCase):
         }
         self.assertEqual(summary_table, expected)
 
+    def test_get_node_summary_table_hash_consing(self):
+        call_tree = new_callnode(cm('A', 'a'), (), None,
+            [ct.ORDERED_AND,
+                new_callnode(cm('U', 'u'), (), None, new_invoked(cm('T', 't'), ('"t"',))),
+                new_callnode(cm('V', 'v'), (), None, new_invoked(cm('T', 't'), ('"t"',))),
+            ]
+        )
+        summary_table = cs.extract_node_summary_table([call_tree])
+        sumry = summary_table[cm('U', 'u'), None]
+        self.assertEqual(sumry, cs.Summary([cm('T', 't')], ['"t"']))
+        self.assertIs(summary_table[cm('V', 'v'), None], sumry)
+
+        intern_table = cs.SummaryInternTable()
+        s1 = intern_table.intern(cs.Summary([cm('T', 't')], ['"t"']))
+        s2 = intern_table.intern(cs.Summary([cm('X', 'x')], ['"t"']))
+        self.assertIs(intern_table.intern(cs.Summary([cm('T', 't')], ['"t"'])), s1)
+        self.assertIsNot(s2, s1)
+        self.assertIs(s2.literals, s1.literals)
+
+    def test_summary_builder(self):
+        child = cs.Summary([cm('S', 's'), cm('T', 't')], ['"s1"', '"t"'])
+        sb = cs.SummaryBuilder()
+        sb.append_summary(child)
+        sb.append_summary(cs.Summary([cm('T', 't')], ['"t"']))
+        sb.append_callee(cm('S', 's'))
+        sumry = sb.to_summary()
+        self.assertEqual(sumry, child)
+        self.assertIs(sumry.sub_summaries[0], child)  # shared, not copied
+        self.assertEqual(sumry.own_callees, [cm('S', 's')])
+
+        sb_single = cs.SummaryBuilder()
+        sb_single.append_summary(child)
+        self.assertIs(sb_single.to_summary(), child)
+
+        sb.append_summary(cs.Summary([cm('A', 'a'), cm('U', 'u')], ['"s2"']))
+        sb.append_literal('"a"')
+        self.assertEqual(sb.to_summary(), cs.Summary([cm('A', 'a'), cm('S', 's'), cm('T', 't'), cm('U', 'u')],
+                ['"a"', '"s1"', '"s2"', '"t"']))
+
+    def test_summary_pickle(self):
+        summary_table = cs.extract_node_summary_table([SHARING_CALL_TREE])
+        asum = summary_table[cm('A', 'a'), None]
+        self.assertIs(asum.callees, asum.callees)  # merged once, and kept
+        self.assertIs(asum.literals, asum.literals)
+        for protocol in (1, pickle.HIGHEST_PROTOCOL):
+            table_cpy = pickle.loads(pickle.dumps(summary_table, protocol=protocol))
+            self.assertEqual(table_cpy, summary_table)
+            ssum_cpy = table_cpy[cm('S', 's'), None]
+            for label in [(cm('B', 'b'), None), (cm('C', 'c'), None)]:
+                self.assertTrue(any(ss is ssum_cpy for ss in table_cpy[label].iter_summaries()))
+
+        old_state = (asum.callees, asum.literals)  # pickled by an older version
+        sumry = cs.Summary.__new__(cs.Summary)
+        sumry.__setstate__(old_state)
+        self.assertEqual(sumry, asum)
+        self.assertEqual(sumry.sub_summaries, ())
+
+    def test_build_inverted_index(self):
+        summary_table = cs.extract_node_summary_table([SHARING_CALL_TREE])
+        inverted_index = cs.build_inverted_index(summary_table)
+        labels = inverted_index.labels
+        self.assertEqual(sorted(labels), sorted(summary_table.iterkeys()))
+        for callee, posting in inverted_index.callee_postings.iteritems():
+            self.assertEqual(posting, [i for i, lbl in enumerate(labels) if callee in summary_table[lbl].callees])
+        for lit, posting in inverted_index.literal_postings.iteritems():
+            self.assertEqual(posting, [i for i, lbl in enumerate(labels) if lit in summary_table[lbl].literals])
+        self.assertEqual(sorted(labels[i] for i in inverted_index.callee_postings[cm('S', 's')]),
+                [(cm('A', 'a'), None), (cm('B', 'b'), None), (cm('C', 'c'), None)])
+        self.assertEqual(sorted(labels[i] for i in inverted_index.literal_postings['"s1"']),
+                [(cm('A', 'a'), None), (cm('B', 'b'), None)])
+
+    def test_build_term_trigram_index(self):
+        summary_table = cs.extract_node_summary_table([SHARING_CALL_TREE])
+        inverted_index = cs.build_inverted_index(summary_table)
+        tti = cs.build_term_trigram_index(inverted_index)
+        self.assertEqual(cs.trigrams_of('"Abcd"'), set(['"ab', 'abc', 'bcd', 'cd"']))
+        self.assertEqual(tti.literal_trigrams['"s1'], ['"s1"'])
+        self.assertNotIn('"s', tti.literal_trigrams)
+        self.assertEqual(tti.callee_trigrams['\tvo'], sorted(inverted_index.callee_postings.iterkeys()))
+        for callee in inverted_index.callee_postings:
+            for tg in cs.trigrams_of(callee):
+                self.assertIn(callee, tti.callee_trigrams[tg])
+
 
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
@@ -0,0 +1,181 @@
+# coding: utf-8
+
+import unittest
+
+import gzip
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import os.path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.jimp_parser as jp
+import agoat.calltree as ct
+import agoat.calltree_summary as cs
+from agoat._calltree_data_formatter import DATATAG_ENTRY_POINTS, DATATAG_CALL_TREES, DATATAG_NODE_SUMMARY, \
+    DATATAG_LINENUMBER_TABLE, DATATAG_PARSE_CACHE_RUN_ID, DATATAG_INVERTED_INDEX, DATATAG_TERM_TRIGRAMS
+import agoat._index_file_format as iff
+
+from sootoutput_fixture import extract_soot_output_call_trees
+
+
+def call_node_count(call_trees):
+    # count of call nodes, where a shared call node is counted once
+    count = 0
+    visited = set()
+    stack = list(call_trees)
+    while stack:
+        node = stack.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if isinstance(node, list):
+            stack.extend(node[1:])
+        elif isinstance(node, ct.CallNode):
+            count += 1
+            if node.body is not None:
+                stack.append(node.body)
+    return count
+
+
+class IndexFileFormatTest(unittest.TestCase):
+    def setUp(self):
+        _, self.entry_points, self.call_trees = extract_soot_output_call_trees()
+        self.work_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_call_trees(self):
+        data = {DATATAG_CALL_TREES: self.call_trees, DATATAG_ENTRY_POINTS: self.entry_points,
+                DATATAG_PARSE_CACHE_RUN_ID: "0123abcd"}
+        loaded = iff.loads_index_data(iff.dumps_index_data(data))
+        self.assertEqual(loaded, data)
+        self.assertEqual(call_node_count(loaded[DATATAG_CALL_TREES]), call_node_count(self.call_trees))
+        for e in loaded[DATATAG_ENTRY_POINTS]:
+            self.assertIsInstance(e, jp.ClzMethodSig)
+        # signatures are interned while loading
+        loaded_root = loaded[DATATAG_CALL_TREES][0]
+        self.assertIs(loaded_root.invoked.callee, loaded[DATATAG_ENTRY_POINTS][0])
+
+    def test_node_summary_and_linenumber_table(self):
+        summary_table = cs.extract_node_summary_table(self.call_trees)
+        linenumber_table = {self.entry_points[0]: {10: 3, 12: 5}}
+        data = {DATATAG_NODE_SUMMARY: summary_table, DATATAG_ENTRY_POINTS: self.entry_points,
+                DATATAG_LINENUMBER_TABLE: linenumber_table}
+        loaded = iff.loads_index_data(iff.dumps_index_data(data))
+        self.assertEqual(loaded, data)
+        loaded_summaries = dict((id(s), s) for s in loaded[DATATAG_NODE_SUMMARY].itervalues())
+        for sumry in loaded[DATATAG_NODE_SUMMARY].itervalues():
+            for ss in sumry.sub_summaries:
+                self.assertIs(loaded_summaries.get(id(ss)), ss)
+
+    def test_shared_summaries(self):
+        sumry = cs.Summary([self.entry_points[0]], ['"a"'])
+        labels = [(ep, None) for ep in self.entry_points[:2]]
+        data = {DATATAG_NODE_SUMMARY: dict((lbl, sumry) for lbl in labels)}
+        b = iff.dumps_index_data(data, compress=False)
+        self.assertLess(len(b), len(iff.dumps_index_data(
+                {DATATAG_NODE_SUMMARY: dict((lbl, cs.Summary(sumry.callees, sumry.literals)) for lbl in labels)},
+                compress=False)))
+        loaded = iff.loads_index_data(b)[DATATAG_NODE_SUMMARY]
+        self.assertEqual(loaded, data[DATATAG_NODE_SUMMARY])
+        self.assertIs(loaded[labels[0]], loaded[labels[1]])
+
+    def test_load_index_data(self):
+        data = {DATATAG_CALL_TREES: self.call_trees, DATATAG_ENTRY_POINTS: self.entry_points}
+        index_file = os.path.join(self.work_dir, 'agoat.calltree')
+        iff.save_index_data(index_file, data)
+        self.assertEqual(iff.load_index_data(index_file), data)
+
+    def test_load_index_data_lazy(self):
+        summary_table = cs.extract_node_summary_table(self.call_trees)
+        data = {DATATAG_NODE_SUMMARY: summary_table, DATATAG_ENTRY_POINTS: self.entry_points}
+        for compress in (False, True):
+            index_file = os.path.join(self.work_dir, 'agoat.summary')
+            iff.save_index_data(index_file, data, compress=compress)
+            loaded = iff.load_index_data(index_file, lazy=True)
+            self.assertEqual(loaded[DATATAG_ENTRY_POINTS], self.entry_points)
+            view = loaded[DATATAG_NODE_SUMMARY]
+            self.assertIsInstance(view, iff.NodeSummaryTableView)
+            self.assertEqual(view.decoded_count(), 0)
+
+            label = sorted(summary_table.iterkeys())[len(summary_table) // 2]
+            self.assertEqual(view.get(label), summary_table[label])
+            self.assertEqual(view.decoded_count(), 1)
+            self.assertIs(view.get(label).callees[0], loaded[DATATAG_NODE_SUMMARY].get(label).callees[0])
+            self.assertIsNone(view.get((label[0], jp.clzmsig_from_str('Unknown\tvoid\tm\t()'))))
+            self.assertNotIn(('Unknown\tvoid\tm\t()', None), view)
+
+            self.assertEqual(len(view), len(summary_table))
+            self.assertEqual(dict(view.iteritems()), summary_table)
+            for lbl in summary_table:
+                self.assertIn(lbl, view)
+
+    def test_save_index_data_while_mmaped(self):
+        summary_table = cs.extract_node_summary_table(self.call_trees)
+        data = {DATATAG_NODE_SUMMARY: summary_table, DATATAG_ENTRY_POINTS: self.entry_points}
+        index_file = os.path.join(self.work_dir, 'agoat.summary')
+        iff.save_index_data(index_file, data, compress=False)
+        view = iff.load_index_data(index_file, lazy=True)[DATATAG_NODE_SUMMARY]
+
+        iff.save_index_data(index_file, {DATATAG_NODE_SUMMARY: {}, DATATAG_ENTRY_POINTS: []}, compress=False)
+        self.assertEqual(dict(view.iteritems()), summary_table)
+        self.assertEqual(len(iff.load_index_data(index_file, lazy=True)[DATATAG_NODE_SUMMARY]), 0)
+        self.assertEqual(os.listdir(self.work_dir), ['agoat.summary'])
+
+    def test_save_index_data_failure(self):
+        data = {DATATAG_ENTRY_POINTS: self.entry_points}
+        index_file = os.path.join(self.work_dir, 'agoat.summary')
+        os.mkdir(index_file)  # can not be replaced with a file
+        with self.assertRaises(OSError):
+            iff.save_index_data(index_file, data)
+        self.assertEqual(os.listdir(self.work_dir), ['agoat.summary'])  # no temporary file left
+
+    def test_inverted_index(self):
+        inverted_index = cs.build_inverted_index(cs.extract_node_summary_table(self.call_trees))
+        data = {DATATAG_INVERTED_INDEX: inverted_index, DATATAG_ENTRY_POINTS: self.entry_points}
+        self.assertEqual(iff.loads_index_data(iff.dumps_index_data(data)), data)
+
+        index_file = os.path.join(self.work_dir, 'agoat.summary')
+        iff.save_index_data(index_file, data, compress=False)
+        view = iff.load_index_data(index_file, lazy=True)[DATATAG_INVERTED_INDEX]
+        self.assertIsInstance(view, iff.InvertedIndexView)
+        self.assertEqual([view.labels[i] for i in xrange(len(view.labels))], inverted_index.labels)
+        self.assertEqual(dict(view.callee_postings.iteritems()), inverted_index.callee_postings)
+        self.assertEqual(dict(view.literal_postings.iteritems()), inverted_index.literal_postings)
+
+    def test_term_trigrams(self):
+        inverted_index = cs.build_inverted_index(cs.extract_node_summary_table(self.call_trees))
+        tti = cs.build_term_trigram_index(inverted_index)
+        data = {DATATAG_TERM_TRIGRAMS: tti, DATATAG_ENTRY_POINTS: self.entry_points}
+        self.assertEqual(iff.loads_index_data(iff.dumps_index_data(data)), data)
+
+        index_file = os.path.join(self.work_dir, 'agoat.summary')
+        iff.save_index_data(index_file, data, compress=False)
+        view = iff.load_index_data(index_file, lazy=True)[DATATAG_TERM_TRIGRAMS]
+        self.assertIsInstance(view, iff.TermTrigramIndexView)
+        self.assertEqual(dict(view.callee_trigrams.iteritems()), tti.callee_trigrams)
+        self.assertEqual(dict(view.literal_trigrams.iteritems()), tti.literal_trigrams)
+
+    def test_load_index_data_of_older_versions(self):
+        data = {DATATAG_CALL_TREES: self.call_trees, DATATAG_ENTRY_POINTS: self.entry_points}
+        index_file = os.path.join(self.work_dir, 'agoat.calltree')
+        with gzip.open(index_file + ".gz", "wb") as out:
+            pickle.dump(data, out, protocol=1)
+        self.assertEqual(iff.load_index_data(index_file), data)
+        self.assertEqual(iff.load_index_data(index_file + ".gz"), data)
+
+    def test_unsupported_version(self):
+        b = iff.dumps_index_data({DATATAG_ENTRY_POINTS: self.entry_points})
+        b = iff.MAGIC + '\xff\xff' + b[len(iff.MAGIC) + 2:]
+        with self.assertRaises(iff.InvalidIndexFile):
+            iff.loads_index_data(b)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -2,6 +2,7 @@
 
 import unittest
 
+import pickle
 import sys
 import os.path
 sys.path.insert(
@@ -9,6 +10,8 @@ sys.path.insert(
 
 import agoat.jimp_parser as jp
 
+from sootoutput_fixture import SOOT_OUTPUT_DIR
+
 helloJimpText = r"""
 public class Hello extends java.lang.Object
 {
@@ -42,6 +45,12 @@ def stub_store_jimp_method_code(mtd, line_and_linenums):
     mtd.code = zip(*line_and_linenums)[0]
 
 
+def class_data_contents(cd):
+    mds = sorted((clzmsig, md.scope_class.class_name, sorted(md.fields.items()), md.code) \
+            for clzmsig, md in cd.methods.iteritems())
+    return cd.class_name, cd.base_name, cd.interf_names, sorted(cd.fields.items()), mds
+
+
 class JimpParserTest(unittest.TestCase):
 
     def test_clzmethodsig(self):
@@ -73,6 +82,41 @@ class JimpParserTest(unittest.TestCase):
         types = jp.types_in_clzmsig(msig)
         self.assertSequenceEqual(types, ["A", "void", "int", "double", "int"])
 
+    def test_clzmsig(self):
+        msig = jp.ClzMethodSig("A", None, "hoge", ("int", "java.lang.String"))
+        self.assertEqual(msig, "A\tvoid\thoge\tint\tjava.lang.String")
+        self.assertEqual(msig, jp.ClzMethodSig("A", "void", "hoge", ("int", "java.lang.String")))
+        for protocol in (1, pickle.HIGHEST_PROTOCOL):
+            self.assertEqual(pickle.loads(pickle.dumps(msig, protocol=protocol)), msig)
+        self.assertEqual({msig: 1}.get("A\tvoid\thoge\tint\tjava.lang.String"), 1)
+        self.assertEqual((msig.clz, msig.retv_str, msig.method), ("A", "void", "hoge"))
+        self.assertEqual(msig.params, ("int", "java.lang.String"))
+        self.assertEqual(msig.methodsig, "void\thoge\tint\tjava.lang.String")
+        self.assertEqual(msig.types, ("A", "void", "int", "java.lang.String"))
+        self.assertEqual(msig.fields, ("A", "void", "hoge", "int", "java.lang.String"))
+        self.assertIs(msig.params, msig.params)  # parsed once
+        with self.assertRaises(AttributeError):
+            msig.clz = "B"
+        with self.assertRaises(AttributeError):
+            del msig.method
+        self.assertIs(jp.clzmsig_from_str(msig), msig)
+
+        with jp.clzmsig_interning():
+            imsig = jp.ClzMethodSig("A", None, "hoge", ("int", "java.lang.String"))
+            self.assertIs(imsig, jp.clzmsig_from_str("A\tvoid\thoge\tint\tjava.lang.String"))
+            for protocol in (1, pickle.HIGHEST_PROTOCOL):
+                self.assertIs(pickle.loads(pickle.dumps(imsig, protocol=protocol)), imsig)
+        self.assertIsNone(jp._clzmsig_pool)
+
+        # plain strings, e.g. ones in index files of older versions
+        s = "B\tint\tfuga"
+        self.assertEqual(jp.clzmsig_clz(s), "B")
+        self.assertEqual(jp.clzmsig_retv(s), "int")
+        self.assertEqual(jp.clzmsig_method(s), "fuga")
+        self.assertEqual(jp.clzmsig_params(s), ())
+        self.assertEqual(jp.clzmsig_methodsig(s), "int\tfuga")
+        self.assertIsNone(jp.clzmsig_retv(msig))
+
     def test_omit_trivial_package(self):
         try:
             old_op = jp.OMITTED_PACKAGES
@@ -82,6 +126,19 @@ class JimpParserTest(unittest.TestCase):
         finally:
             jp.OMITTED_PACKAGES = old_op
 
+    def test_read_class_table_from_dir_iter_parallel(self):
+        serial = [(clz, class_data_contents(cd)) for clz, cd in \
+                jp.read_class_table_from_dir_iter(SOOT_OUTPUT_DIR)]
+        self.assertTrue(serial)
+        for chunk_size in (1, 3):
+            paths = sorted(os.path.join(SOOT_OUTPUT_DIR, f) for f in os.listdir(SOOT_OUTPUT_DIR) if f.endswith(".jimp"))
+            parallel = [(clz, class_data_contents(cd)) for clz, cd in \
+                    jp.read_class_table_from_files_iter(paths, jobs=2, chunk_size=chunk_size)]
+            self.assertEqual(parallel, serial)
+        parallel = [(clz, class_data_contents(cd)) for clz, cd in \
+                jp.read_class_table_from_dir_iter(SOOT_OUTPUT_DIR, jobs=3)]
+        self.assertEqual(parallel, serial)
+
     def test_format_clzmsig(self):
         clzmsig = jp.ClzMethodSig("C", None, "m", ("int", "double"))
         self.assertEqual(jp.format_clzmsig(clzmsig), "C void m(int,double)")
@@ -0,0 +1,151 @@
+# coding: utf-8
+
+import unittest
+
+import os
+import sys
+import time
+import os.path
+from cStringIO import StringIO
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.jimp_parser as jp
+import agoat.calltree as ct
+import agoat.calltree_builder as cb
+import agoat.calltree_query as cq
+import agoat.keywordsearcher as ks
+
+from sootoutput_fixture import load_soot_output_index
+
+
+def new_invoked(clz, method, literals=()):
+    return ct.Invoked(jp.SPECIALINVOKE, '%s\tvoid\t%s' % (clz, method), literals, None)
+
+
+def new_callnode(clz, method, body):
+    return ct.CallNode(new_invoked(clz, method), None, body)
+
+
+# A calls B, then calls either of C, D (twice, as a duplicated alternative) or E,
+# then calls either of F or G.
+OR_CALL_TREE = new_callnode("A", "a",
+    [ct.ORDERED_AND,
+        new_invoked("B", "b"),
+        [ct.ORDERED_OR,
+            new_invoked("C", "c"),
+            new_invoked("D", "d"),
+            new_invoked("D", "d"),
+            new_invoked("E", "e", ('"x"',)),
+        ],
+        [ct.ORDERED_OR,
+            new_invoked("F", "f"),
+            new_invoked("G", "g"),
+        ],
+    ]
+)
+
+
+def path_callees(path):
+    # method names of the call node of a path and the invocations in its body
+    assert isinstance(path, ct.CallNode) and path.body[0] == ct.ORDERED_AND
+    return [n.callee.split('\t')[-1] for n in [path.invoked] + path.body[1:]]
+
+
+class KeywordSearcherTest(unittest.TestCase):
+    def test_expand_call_tree_to_paths(self):
+        query = cq.Query([cq.compile_query(w) for w in ["m.a|d|e", "m.f|g"]])
+        paths = list(ks.gen_expander_of_call_tree_to_paths(query)(OR_CALL_TREE))
+        self.assertEqual([path_callees(p) for p in paths],
+                [["a", "d", "f"], ["a", "d", "g"], ["a", "e", "f"], ["a", "e", "g"]])
+
+        query = cq.Query([cq.compile_query(w) for w in ['"x', "m.g"]])
+        paths = list(ks.gen_expander_of_call_tree_to_paths(query)(OR_CALL_TREE))
+        self.assertEqual([path_callees(p) for p in paths], [["a", "e", "g"]])
+
+    def test_expand_call_tree_to_paths_lazily(self):
+        query = cq.Query([cq.compile_query("m.a|b|c|f")])
+        paths = ks.gen_expander_of_call_tree_to_paths(query)(OR_CALL_TREE)
+        self.assertEqual(path_callees(next(paths)), ["a", "b", "c", "f"])
+
+        expired = ks.gen_expander_of_call_tree_to_paths(query, deadline=time.time() - 1)
+        self.assertEqual(list(expired(OR_CALL_TREE)), [])
+
+    def test_search_and_write_max_paths(self):
+        index = load_soot_output_index()
+        query = ks.build_query(["println"], [])
+        out = StringIO()
+        ks.search_and_write(query, index, out, output_form='path')
+        path_count = out.getvalue().count("---\n")
+        self.assertGreater(path_count, 1)
+
+        out = StringIO()
+        warnings = []
+        ks.search_and_write(query, index, out, output_form='path', max_paths=1, warn=warnings.append)
+        self.assertEqual(out.getvalue().count("---\n"), 1)
+        self.assertTrue(warnings)
+
+        for max_paths in ('0', '-2'):
+            with self.assertRaises(SystemExit):
+                ks.main(['agoat', '--max-paths', max_paths, 'println'])
+
+    def test_gen_search_results(self):
+        index = load_soot_output_index()
+        query = ks.build_query(["println"], [])
+        removed = [None]
+        results = ks.gen_search_results(query, index.call_trees, index.node_summary_table, -1, removed)
+        first = next(results)
+        nodes = [first] + list(results)
+        self.assertEqual(removed, [0])
+        self.assertEqual(sorted(nodes, key=cb.callnode_label),
+                ks.search_in_call_trees(query, index.call_trees, index.node_summary_table, -1, [None]))
+
+        out = StringIO()
+        ks.search_and_write(query, index, out, output_form='treecut')
+        self.assertEqual(out.getvalue().count("---\n"), len(nodes))
+
+    def test_gen_search_results_in_parallel(self):
+        index = load_soot_output_index()
+        for words, max_depth in ((["println"], -1), (['"Hello'], -1), (["println"], 1)):
+            query = ks.build_query(words, [])
+            removed = [None]
+            nodes = list(ks.gen_search_results(query, index.call_trees, index.node_summary_table, max_depth, removed))
+            self.assertTrue(nodes or removed[0])
+            for jobs in (2, 3):
+                removed_in_parallel = [None]
+                self.assertEqual(list(ks.gen_search_results_in_parallel(query, index.call_trees,
+                        index.node_summary_table, max_depth, jobs, removed_in_parallel)), nodes)
+                self.assertEqual(removed_in_parallel, removed)
+
+    def test_search_top_in_call_trees(self):
+        index = load_soot_output_index()
+        query = ks.build_query(["println"], [])
+        nodes = ks.search_in_call_trees(query, index.call_trees, index.node_summary_table, -1, [None])
+        self.assertGreater(len(nodes), 2)
+
+        ranked = ks.search_top_in_call_trees(query, index.call_trees, index.node_summary_table, -1, len(nodes) + 1)
+        self.assertEqual(sorted(cb.callnode_label(n) for n in ranked), sorted(cb.callnode_label(n) for n in nodes))
+        self.assertEqual(ks.search_top_in_call_trees(query, index.call_trees, index.node_summary_table, -1, 2),
+                ranked[:2])
+
+        out = StringIO()
+        ks.search_and_write(query, index, out, max_depth=-1, output_form='callnode', top=1)
+        self.assertEqual(out.getvalue().splitlines(), [jp.format_clzmsig(ranked[0].invoked.callee)])
+
+        for top in ('0', '-1'):
+            with self.assertRaises(SystemExit):
+                ks.main(['agoat', '--top', top, 'println'])
+        with self.assertRaises(SystemExit):
+            ks.main(['agoat', '--top', '1', '--jobs', '2', 'println'])
+
+        out = StringIO()
+        warnings = []
+        ks.search_and_write(query, index, out, max_depth=-1, output_form='callnode', top=1, jobs=2,
+                warn=warnings.append)
+        self.assertEqual(out.getvalue().splitlines(), [jp.format_clzmsig(ranked[0].invoked.callee)])
+        self.assertTrue(warnings)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,72 @@
+# coding: utf-8
+
+import unittest
+
+import os
+import shutil
+import sys
+import tempfile
+import os.path
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.jimp_parser as jp
+import agoat.calltree_builder as cb
+from agoat._parse_cache import ParseCache
+
+from sootoutput_fixture import SOOT_OUTPUT_DIR
+
+
+def method_codes(class_table):
+    return sorted((clzmsig, md.code) for cd in class_table.itervalues() for clzmsig, md in cd.methods.iteritems())
+
+
+class ParseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.soot_dir = os.path.join(self.work_dir, 'sootOutput')
+        os.mkdir(self.soot_dir)
+        for f in ('Hello.jimp', 'Ifs.jimp', 'Loops.jimp'):
+            shutil.copy(os.path.join(SOOT_OUTPUT_DIR, f), self.soot_dir)
+        self.cache_file = os.path.join(self.work_dir, 'agoat.parsecache')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def read(self):
+        pc = ParseCache(self.cache_file)
+        pc.load()
+        class_table = pc.read_class_table(self.soot_dir)
+        tree_class_table = pc.inss_to_tree_in_class_table(class_table)
+        pc.save()
+        return pc, class_table, tree_class_table
+
+    def test_reuse(self):
+        pc, class_table, tree_class_table = self.read()
+        self.assertEqual(pc.changed_classes, set(['Hello', 'Ifs', 'Loops']))
+        expected = method_codes(cb.inss_to_tree_in_class_table(class_table))
+        self.assertEqual(method_codes(tree_class_table), expected)
+
+        pc, class_table, tree_class_table = self.read()
+        self.assertEqual(pc.changed_classes, set())
+        self.assertEqual(sorted(class_table.keys()), ['Hello', 'Ifs', 'Loops'])
+        self.assertEqual(method_codes(tree_class_table), expected)
+
+    def test_modified_and_removed_files(self):
+        self.read()
+        p = os.path.join(self.soot_dir, 'Hello.jimp')
+        with open(p, "ab") as f:
+            f.write("\n")
+        os.remove(os.path.join(self.soot_dir, 'Loops.jimp'))
+
+        pc, class_table, tree_class_table = self.read()
+        self.assertEqual(pc.changed_classes, set(['Hello', 'Loops']))
+        self.assertEqual(sorted(class_table.keys()), ['Hello', 'Ifs'])
+        expected = method_codes(cb.inss_to_tree_in_class_table(
+                dict(jp.read_class_table_from_dir_iter(self.soot_dir))))
+        self.assertEqual(method_codes(tree_class_table), expected)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()
@@ -0,0 +1,85 @@
+# coding: utf-8
+
+import unittest
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import os.path
+from cStringIO import StringIO
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import agoat.keywordsearcher as ks
+import agoat.query_server as qs
+
+from sootoutput_fixture import save_soot_output_index
+
+
+class QueryServerTest(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.call_tree_file, self.summary_file = save_soot_output_index(self.work_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def test_serve_stdio(self):
+        requests = [
+            {"query_words": ["println", '"Hello'], "output_form": "treecut", "max_depth": -1},
+            {"query_words": ["println"], "output_form": "callnode"},
+            {"query_words": ["("]},
+        ]
+        inp = StringIO(''.join(json.dumps(r) + "\n" for r in requests))
+        out = StringIO()
+        server = qs.QueryServer(self.call_tree_file, self.summary_file)
+        qs.serve_stdio(server, inp, out)
+        responses = [json.loads(L) for L in out.getvalue().splitlines()]
+        self.assertEqual(len(responses), len(requests))
+
+        index = ks.load_index(self.call_tree_file, self.summary_file)
+        for req, resp in zip(requests[:2], responses[:2]):
+            self.assertIsNone(resp["error"])
+            expected = StringIO()
+            ks.search_and_write(ks.build_query(req["query_words"], []), index, expected,
+                    max_depth=req.get("max_depth", 5), output_form=req["output_form"])
+            self.assertTrue(expected.getvalue())
+            self.assertEqual(resp["output"], expected.getvalue())
+        self.assertTrue(responses[2]["error"])
+
+    def test_reload_index_if_updated(self):
+        server = qs.QueryServer(self.call_tree_file, self.summary_file)
+        index = server.index
+        server.reload_index_if_updated()
+        self.assertIs(server.index, index)
+
+        mtime = os.path.getmtime(self.call_tree_file)
+        os.utime(self.call_tree_file, (mtime + 10, mtime + 10))
+        server.reload_index_if_updated()
+        self.assertIsNot(server.index, index)
+
+    def test_reload_index_failure(self):
+        server = qs.QueryServer(self.call_tree_file, self.summary_file)
+        index = server.index
+        with open(self.call_tree_file, "rb") as inp:
+            b = inp.read()
+        with open(self.call_tree_file, "wb") as out:
+            out.write(b[:len(b) // 2])  # e.g. being re-generated
+        mtime = os.path.getmtime(self.call_tree_file)
+        os.utime(self.call_tree_file, (mtime + 10, mtime + 10))
+        resp = server.handle({"query_words": ["println"]})
+        self.assertIsNone(resp["error"])
+        self.assertIs(server.index, index)
+
+        with open(self.call_tree_file, "wb") as out:
+            out.write(b)
+        os.utime(self.call_tree_file, (mtime + 10, mtime + 10))
+        server.reload_index_if_updated()  # retried, as the files have not been loaded yet
+        self.assertIsNot(server.index, index)
+
+
+if __name__ == "__main__":
+    #import sys;sys.argv = ['', 'Test.testName']
+    unittest.main()